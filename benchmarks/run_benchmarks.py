@@ -0,0 +1,359 @@
+#!/bin/env python
+#
+# time the main limitplotter stages on synthetic signal grids
+#
+# For each grid size the synthetic limit results files and
+# harvest list (see synthetic_grid.py) are written to a
+# temporary directory and each stage is timed (best of
+# --repeat runs). The timings are written to a JSON report
+# and compared to a stored baseline report, if there is one.
+#
+# usage:
+#   python benchmarks/run_benchmarks.py                       # run and compare to benchmarks/baseline.json
+#   python benchmarks/run_benchmarks.py --write_baseline      # store this run as the baseline
+#   python benchmarks/run_benchmarks.py --sizes 100,1000 --stages fill_raw_results,make_contour
+#
+# Exits with 1 if a stage got slower than the baseline by more
+# than --tolerance (and by more than --min_delta seconds).
+# The (stage, size) pairs that were not timed are listed at the
+# end of the run with the reason. By default these are:
+#   - the stages that need ROOT, when it cannot be loaded
+#   - make_contour and make_exclusion_band above 10k points, because
+#     the NumPy triangulation grows as n^2 (see contour_engine). Raise
+#     --max_contour_points to time them at 100k points anyway.
+#
+# benchmarks/baseline.json is the report of a default run (no ROOT).
+# Timings only compare on the same machine, so CI should store its
+# own baseline from the reference commit before comparing:
+#   git checkout <reference> && python benchmarks/run_benchmarks.py --write_baseline
+#   git checkout <candidate> && python benchmarks/run_benchmarks.py
+#
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+
+sys.path.append(os.environ['LIMPLOTDIR'])
+
+import numpy as np
+
+#limitplotter
+from limitplotter.utils.lazy_root import ROOT
+from limitplotter.utils.grid_configuration import GridConfiguration
+from limitplotter.utils.limiters import Region
+from limitplotter.utils.stat_tools import get_sigma_from_pvalue, get_sigma_from_pvalues
+from limitplotter.utils.limit_results import parse_limit_results, LIMIT_RESULTS_FIELDS
+from limitplotter.utils.limit_plot_tools import compute_contour_points, arrays_to_graph, make_exclusion_band
+from limitplotter.benchmarks.synthetic_grid import make_limit_results, make_harvest_list, make_grid_points, p_value
+from limitplotter import prepare_limit_results
+
+# baselines written with another report version are refused
+REPORT_VERSION = 1
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+
+def root_available() :
+    try :
+        ROOT.load()
+    except ImportError :
+        return False
+    return True
+
+class Sample() :
+    '''
+    Synthetic inputs of one grid size, written in workdir
+    '''
+    def __init__(self, workdir, n_points, n_regions, spacing, shape) :
+        self.n_points = n_points
+        self.workdir = os.path.join(workdir, "n%d"%n_points)
+        self.regions = make_limit_results(self.workdir, n_points, n_regions, spacing, shape)
+        self.harvest_name = "synthetic_%d.root"%n_points
+        make_harvest_list(os.path.join(self.workdir, "synthetic_%d__1_harvest_list.json"%n_points), n_points, spacing, shape)
+        self.mX, self.mY = make_grid_points(n_points, spacing)
+        self.pvalues = p_value(np.linspace(-1.0, 8.0, n_points))
+
+    def make_configuration(self, engine="numpy", use_results_cache=False) :
+        '''
+        GridConfiguration of the synthetic regions, grid not yet built
+        '''
+        conf = GridConfiguration("bWN")
+        conf.channel = "sfdf"
+        conf.use_results_cache = use_results_cache
+        conf.use_contour_cache = False
+        conf.contour_engine = engine
+        conf.xlow, conf.xhigh = float(self.mX.min()), float(self.mX.max())
+        conf.ylow, conf.yhigh = float(self.mY.min()), float(self.mY.max())
+        for name, files in self.regions :
+            reg = Region(name)
+            reg.nominal_limit_results_file = files["Nominal"]
+            reg.up_limit_results_file = files["Up"]
+            reg.dn_limit_results_file = files["Down"]
+            conf.regions.append(reg)
+        return conf
+
+    def make_filled_configuration(self, engine="numpy") :
+        conf = self.make_configuration(engine)
+        conf.assign_grid()
+        conf.fill_raw_results()
+        return conf
+
+''' ---------------------- '''
+'''         Stages         '''
+''' ---------------------- '''
+# each stage takes (sample, args), does its (untimed) setup and
+# returns the function to time
+
+def stage_fill_raw_results(sample, args) :
+    def run() :
+        conf = sample.make_configuration(args.engine)
+        conf.assign_grid()
+        conf.fill_raw_results()
+    return run
+
+def stage_fill_raw_results_cached(sample, args) :
+    # build the caches first
+    conf = sample.make_configuration(args.engine, use_results_cache=True)
+    conf.assign_grid()
+    conf.fill_raw_results()
+    def run() :
+        conf = sample.make_configuration(args.engine, use_results_cache=True)
+        conf.assign_grid()
+        conf.fill_raw_results()
+    return run
+
+def stage_parse_limit_results(sample, args) :
+    text = open(sample.regions[0][1]["Nominal"], "rb").read()
+    def run() :
+        parse_limit_results(text, LIMIT_RESULTS_FIELDS)
+    return run
+
+def stage_parse_limit_results_lines(sample, args) :
+    # reference: the line by line parsing parse_limit_results replaced,
+    # the target of a 10x speed-up over it is not reached (3-3.5x at
+    # 100k points, the string to float conversion dominates, see
+    # parse_limit_results)
+    text = open(sample.regions[0][1]["Nominal"], "rb").read()
+    def run() :
+        rows = []
+        for line in text.splitlines()[1:] :
+            line = line.strip()
+            if not line : continue
+            rows.append([float(c) for c in line.split()])
+        np.array(rows, dtype=np.float64)
+    return run
+
+def stage_make_contour(sample, args) :
+    conf = sample.make_filled_configuration(args.engine)
+    region = conf.regions[0].name
+    def run() :
+        conf.contour_triangulation = None
+        compute_contour_points(conf, reg_=region, types=["exp"])
+    return run
+
+def stage_make_exclusion_band(sample, args) :
+    conf = sample.make_filled_configuration(args.engine)
+    region = conf.regions[0].name
+    points = compute_contour_points(conf, reg_=region, types=["exp", "expUp", "expDn"])
+    if any(xy is None for xy in points) :
+        raise ValueError("no expected contour at this grid size")
+    nom, up, down = [arrays_to_graph(*xy) for xy in points]
+    def run() :
+        make_exclusion_band(conf, nom, up, down)
+    return run
+
+def stage_humanize_list_files(sample, args, stream=False) :
+    out_result = os.path.join(sample.workdir, "humanized_limit_results.txt")
+    def run() :
+        prepare_limit_results.humanize_list_files(sample.workdir + "/", stream=stream,
+                    final_results_filename=sample.harvest_name, out_result=out_result)
+    return run
+
+def stage_humanize_list_files_stream(sample, args) :
+    return stage_humanize_list_files(sample, args, stream=True)
+
+def stage_get_sigma_from_pvalues(sample, args) :
+    def run() :
+        get_sigma_from_pvalues(sample.pvalues)
+    return run
+
+def stage_get_sigma_from_pvalue(sample, args) :
+    pvalues = sample.pvalues.tolist()
+    def run() :
+        for p in pvalues : get_sigma_from_pvalue(p)
+    return run
+
+# name : (stage, needs ROOT, limited by --max_contour_points)
+STAGES = [ ("fill_raw_results",            stage_fill_raw_results,             False, False),
+           ("fill_raw_results_cached",     stage_fill_raw_results_cached,      False, False),
+           ("parse_limit_results",         stage_parse_limit_results,          False, False),
+           ("parse_limit_results_lines",   stage_parse_limit_results_lines,    False, False),
+           ("make_contour",                stage_make_contour,                 False, True),
+           ("make_exclusion_band",         stage_make_exclusion_band,          True,  True),
+           ("humanize_list_files",         stage_humanize_list_files,          False, False),
+           ("humanize_list_files_stream",  stage_humanize_list_files_stream,   False, False),
+           ("get_sigma_from_pvalues",      stage_get_sigma_from_pvalues,       False, False),
+           ("get_sigma_from_pvalue",       stage_get_sigma_from_pvalue,        True,  False) ]
+
+def time_stage(stage, sample, args) :
+    '''
+    Returns the list of wall times (s) of --repeat runs of the stage
+    '''
+    run = stage(sample, args)
+    times = []
+    for i in range(args.repeat) :
+        start = time.time()
+        run()
+        times.append(time.time() - start)
+    return times
+
+''' ---------------------- '''
+'''   Report and baseline  '''
+''' ---------------------- '''
+def compare_to_baseline(report, baseline, tolerance, min_delta) :
+    '''
+    Print the timings next to the baseline ones and return the
+    (stage, size) that got slower by more than tolerance (fraction)
+    and by more than min_delta seconds
+    '''
+    regressions = []
+    print 80*"="
+    print "  %-28s %8s %12s %12s %8s"%("stage", "points", "baseline", "this run", "ratio")
+    print 80*"-"
+    for name, timings in sorted(report["stages"].items()) :
+        base_timings = baseline["stages"].get(name, {})
+        for size in sorted(timings.keys(), key=int) :
+            best = timings[size]["best"]
+            base = base_timings.get(size, {}).get("best")
+            if best is None or base is None :
+                print "  %-28s %8s %12s %12s %8s"%(name, size, "skipped" if base is None else "%.4f"%base,
+                                                   "skipped" if best is None else "%.4f"%best, "")
+                continue
+            ratio = best / base if base > 0 else float("inf")
+            flag = ""
+            if ratio > 1.0 + tolerance and best - base > min_delta :
+                flag = "  SLOWER"
+                regressions.append((name, size))
+            print "  %-28s %8s %12.4f %12.4f %8.2f%s"%(name, size, base, best, ratio, flag)
+    print 80*"="
+    return regressions
+
+def get_skipped(report) :
+    '''
+    [(stage, size, reason)] of the stages not timed in the report
+    '''
+    skipped = []
+    for name, timings in sorted(report["stages"].items()) :
+        for size in sorted(timings.keys(), key=int) :
+            if timings[size]["best"] is None :
+                skipped.append((name, size, timings[size].get("skipped", "")))
+    return skipped
+
+def print_skipped(report) :
+    skipped = get_skipped(report)
+    if not skipped : return
+    print "run_benchmarks    %d (stage, size) not timed:"%len(skipped)
+    for name, size, reason in skipped :
+        print "run_benchmarks        %-28s %8s points : %s"%(name, size, reason)
+
+###############################################################
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="comma-separated numbers of grid points")
+    parser.add_argument("--stages", default="", help="comma-separated stages to run (default: all; %s)"%", ".join(s[0] for s in STAGES))
+    parser.add_argument("--regions", type=int, default=1, help="number of regions in the synthetic grids")
+    parser.add_argument("--spacing", type=float, default=25.0, help="grid spacing (GeV)")
+    parser.add_argument("--shape", default="gaussian", help="significance surface (see synthetic_grid.SHAPES)")
+    parser.add_argument("--engine", default="numpy", help="contour engine: root or numpy")
+    parser.add_argument("--max_contour_points", type=int, default=10000, help="largest grid the contour stages are run on")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs of each stage (the best is kept)")
+    parser.add_argument("-o", "--output", default="./benchmark_report.json", help="JSON report of this run")
+    parser.add_argument("--baseline", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json"), help="baseline report to compare to")
+    parser.add_argument("--write_baseline", action="store_true", default=False, help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slow down w.r.t. the baseline (fraction)")
+    parser.add_argument("--min_delta", type=float, default=0.01, help="slow downs smaller than this (s) are ignored")
+    parser.add_argument("--workdir", default=None, help="where to write the synthetic inputs (default: a temporary directory, removed at the end)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    stages = STAGES
+    if args.stages != "" :
+        requested = args.stages.split(",")
+        unknown = [s for s in requested if s not in [st[0] for st in STAGES]]
+        if unknown :
+            print "run_benchmarks    ERROR unknown stages %s (available: %s)"%(", ".join(unknown), ", ".join(s[0] for s in STAGES))
+            sys.exit(1)
+        stages = [st for st in STAGES if st[0] in requested]
+    if args.engine not in ["root", "numpy"] :
+        print "run_benchmarks    ERROR unsupported contour engine (%s), use root or numpy"%args.engine
+        sys.exit(1)
+
+    has_root = root_available()
+    if not has_root :
+        print "run_benchmarks    ROOT is not available, skipping %s"%", ".join(s[0] for s in stages if s[2])
+    if args.engine == "root" and not has_root :
+        print "run_benchmarks    ERROR the root contour engine needs ROOT"
+        sys.exit(1)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="limitplotter_bench_")
+    report = { "version"  : REPORT_VERSION,
+               "created"  : time.strftime("%Y-%m-%d %H:%M:%S"),
+               "host"     : platform.node(),
+               "python"   : platform.python_version(),
+               "numpy"    : np.__version__,
+               "repeat"   : args.repeat,
+               "settings" : { "regions" : args.regions, "spacing" : args.spacing, "shape" : args.shape,
+                              "engine" : args.engine },
+               "stages"   : dict((s[0], {}) for s in stages) }
+    try :
+        for n_points in sizes :
+            print "run_benchmarks    %d points : writing the synthetic inputs to %s"%(n_points, workdir)
+            sample = Sample(workdir, n_points, args.regions, args.spacing, args.shape)
+            for name, stage, needs_root, contour_limited in stages :
+                result = { "best" : None, "runs" : [] }
+                if needs_root and not has_root :
+                    result["skipped"] = "ROOT not available"
+                elif contour_limited and n_points > args.max_contour_points :
+                    result["skipped"] = "more than --max_contour_points (%d) points"%args.max_contour_points
+                else :
+                    try :
+                        result["runs"] = time_stage(stage, sample, args)
+                        result["best"] = min(result["runs"])
+                    except ValueError, e :
+                        result["skipped"] = str(e)
+                report["stages"][name][str(n_points)] = result
+                if result["best"] is None :
+                    print "run_benchmarks    %-28s %8d points : skipped (%s)"%(name, n_points, result["skipped"])
+                else :
+                    print "run_benchmarks    %-28s %8d points : %.4f s"%(name, n_points, result["best"])
+    finally :
+        if args.workdir is None : shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w") as ofile :
+        json.dump(report, ofile, indent=2, sort_keys=True)
+    print "run_benchmarks    report written to %s"%args.output
+    print_skipped(report)
+
+    if args.write_baseline :
+        shutil.copyfile(args.output, args.baseline)
+        print "run_benchmarks    baseline written to %s"%args.baseline
+        sys.exit(0)
+
+    if not os.path.isfile(args.baseline) :
+        print "run_benchmarks    no baseline (%s) to compare to, store one with --write_baseline"%args.baseline
+        sys.exit(0)
+    baseline = json.load(open(args.baseline))
+    if baseline.get("version") != REPORT_VERSION :
+        print "run_benchmarks    ERROR baseline %s has an incompatible version, store a new one with --write_baseline"%args.baseline
+        sys.exit(1)
+    if baseline.get("settings") != report["settings"] :
+        print "run_benchmarks    WARNING baseline settings %s differ from this run's %s"%(baseline.get("settings"), report["settings"])
+    regressions = compare_to_baseline(report, baseline, args.tolerance, args.min_delta)
+    if regressions :
+        print "run_benchmarks    %d stage(s) slower than the baseline: %s"%(len(regressions), ", ".join("%s (%s points)"%r for r in regressions))
+        sys.exit(1)
+    print "run_benchmarks    no regressions w.r.t. %s"%args.baseline
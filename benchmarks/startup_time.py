@@ -0,0 +1,124 @@
+#!/bin/env python
+#
+# startup time of the limitplotter modules and scripts
+#
+# Each module is imported (each configuration loaded, and each
+# script run with --help) in a fresh python process, timing the
+# whole process. The modules and configurations must not import
+# ROOT on their own: that is left to the steps that draw or merge
+# (see utils/lazy_root.py).
+#
+# usage: python benchmarks/startup_time.py [--max_time 1.0] [--repeat 3]
+#
+# Exits with 1 if anything takes longer than --max_time seconds
+# or if a module imports ROOT.
+#
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+# modules whose import must stay fast and ROOT-free
+MODULES = [ "limitplotter.utils.lazy_root",
+            "limitplotter.utils.file_tools",
+            "limitplotter.utils.signal_grid",
+            "limitplotter.utils.limiters",
+            "limitplotter.utils.limit_results",
+            "limitplotter.utils.stat_tools",
+            "limitplotter.utils.contour_engine",
+            "limitplotter.utils.contour_cache",
+            "limitplotter.utils.reference_contours",
+            "limitplotter.utils.harvest_tools",
+            "limitplotter.utils.merge_tools",
+            "limitplotter.utils.instrumentation",
+            "limitplotter.utils.log_tools",
+            "limitplotter.utils.xsec_tools",
+            "limitplotter.utils.label_tools",
+            "limitplotter.utils.export_tools",
+            "limitplotter.utils.watch_tools",
+            "limitplotter.utils.grid_configuration",
+            "limitplotter.utils.limit_plot_tools" ]
+
+# scripts (relative to the limitplotter directory) run with --help
+SCRIPTS = [ "draw_limits.py",
+            "prepare_limit_results.py" ]
+
+# configurations (grid, file relative to the limitplotter directory)
+# loaded as draw_limits does, they must not import ROOT either
+CONFIGS = [ ("bWN", "config/SRwt_sfdf.py") ]
+
+IMPORT_CHECK = "import sys; import %s; sys.exit(2 if 'ROOT' in sys.modules else 0)"
+CONFIG_CHECK = ("import sys; from limitplotter.utils.grid_configuration import GridConfiguration; "
+                "gridConf = GridConfiguration('%s'); gridConf.channel = 'sfdf'; execfile('%s'); "
+                "sys.exit(2 if 'ROOT' in sys.modules else 0)")
+
+def get_child_env() :
+    '''
+    Environment of the timed processes: LIMPLOTDIR (holding the
+    limitplotter package) is put in front of PYTHONPATH so that
+    "import limitplotter..." works in the python -c checks
+    '''
+    path = [os.environ["LIMPLOTDIR"]]
+    if os.environ.get("PYTHONPATH", "") != "" : path.append(os.environ["PYTHONPATH"])
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(path))
+
+def time_command(cmd, cwd, repeat) :
+    '''
+    Best wall time (s) of running cmd repeat times, and its last exit code
+    '''
+    best = None
+    code = 0
+    env = get_child_env()
+    with open(os.devnull, "w") as devnull :
+        for i in range(repeat) :
+            start = time.time()
+            code = subprocess.call(cmd, cwd=cwd, env=env, stdout=devnull, stderr=devnull)
+            elapsed = time.time() - start
+            if best is None or elapsed < best : best = elapsed
+    return best, code
+
+###############################################################
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max_time", type=float, default=1.0, help="maximum allowed startup time (s)")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs of each command (the best is kept)")
+    args = parser.parse_args()
+
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if "LIMPLOTDIR" not in os.environ :
+        print "startup_time    ERROR environment 'LIMPLOTDIR' is not set. Exiting."
+        sys.exit(1)
+
+    results = []
+    for module in MODULES :
+        elapsed, code = time_command([sys.executable, "-c", IMPORT_CHECK%module], package_dir, args.repeat)
+        status = "OK"
+        if code == 2 : status = "IMPORTS ROOT"
+        elif code != 0 : status = "FAILED"
+        elif elapsed > args.max_time : status = "SLOW"
+        results.append(("import %s"%module, elapsed, status))
+    for grid, config in CONFIGS :
+        elapsed, code = time_command([sys.executable, "-c", CONFIG_CHECK%(grid, config)], package_dir, args.repeat)
+        status = "OK"
+        if code == 2 : status = "IMPORTS ROOT"
+        elif code != 0 : status = "FAILED"
+        elif elapsed > args.max_time : status = "SLOW"
+        results.append(("load %s"%config, elapsed, status))
+    for script in SCRIPTS :
+        elapsed, code = time_command([sys.executable, script, "--help"], package_dir, args.repeat)
+        status = "OK"
+        if code != 0 : status = "FAILED"
+        elif elapsed > args.max_time : status = "SLOW"
+        results.append(("%s --help"%script, elapsed, status))
+
+    print 72*"="
+    print "  startup time (best of %d, limit %.2f s)"%(args.repeat, args.max_time)
+    print 72*"-"
+    for name, elapsed, status in results :
+        print "  %-52s %7.3f s  %s"%(name, elapsed, status)
+    print 72*"="
+
+    if any(status != "OK" for name, elapsed, status in results) :
+        sys.exit(1)
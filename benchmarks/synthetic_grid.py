@@ -0,0 +1,178 @@
+#!/bin/env python
+#
+# synthetic signal grids for the benchmarks
+#
+# Builds a triangular (mX, mY) grid with a given number of
+# points and spacing, puts a significance surface on it and
+# writes it out either as limit results files (the input of
+# draw_limits) or as a harvest list JSON (the input of
+# prepare_limit_results.humanize_list_files).
+#
+# usage: python benchmarks/synthetic_grid.py -n 10000 -o ./synthetic/ [--regions 2] [--shape gaussian]
+#
+
+import os
+import sys
+import json
+import math
+import argparse
+
+sys.path.append(os.environ['LIMPLOTDIR'])
+
+import numpy as np
+
+#limitplotter
+from limitplotter.utils.limit_results import LIMIT_RESULTS_FIELDS
+from limitplotter.utils.stat_tools import get_sigma_from_pvalues
+
+# significance surfaces, functions of the grid coordinates
+# scaled to [0, 1] (u along mX, v along mY - mX)
+SHAPES = {
+    # falls off linearly with mX
+    "linear"   : lambda u, v : 4.0 * (1.0 - u),
+    # a single bump at low mX
+    "gaussian" : lambda u, v : 4.5 * np.exp(-((u - 0.2) ** 2 + (v - 0.3) ** 2) / 0.15),
+    # sensitive along a band of mass splitting, falling with mX
+    "ridge"    : lambda u, v : 4.0 * (1.0 - u) * np.exp(-((v - 0.4) ** 2) / 0.05),
+}
+
+def make_grid_points(n_points, spacing=25.0, x0=200.0, y0=0.0) :
+    '''
+    First n_points points of a triangular grid (mY <= mX - x0 + y0)
+    with the given spacing, filled column by column in mX.
+    Returns the (mX, mY) float64 arrays.
+    '''
+    # smallest triangle (k columns) with at least n_points points
+    k = int(math.ceil((math.sqrt(8.0 * n_points + 1.0) - 1.0) / 2.0))
+    cols = np.repeat(np.arange(k), np.arange(1, k + 1))
+    rows = np.concatenate([np.arange(i + 1) for i in range(k)])
+    mX = x0 + spacing * cols[:n_points]
+    mY = y0 + spacing * rows[:n_points]
+    return mX.astype(np.float64), mY.astype(np.float64)
+
+def p_value(sigma) :
+    '''
+    One-sided p-value of the significances sigma
+    '''
+    erfc = np.frompyfunc(math.erfc, 1, 1)
+    return 0.5 * erfc(np.asarray(sigma, dtype=np.float64) / math.sqrt(2.0)).astype(np.float64)
+
+def make_significances(mX, mY, shape="gaussian", seed=1234, noise=0.1, offset=0.0) :
+    '''
+    Expected (and +-1 sigma) and observed significances of the
+    grid points for the given surface shape. offset shifts the
+    whole surface (e.g. to mimic a different region).
+    Returns { limit results field : values } for the CLs and
+    significance columns.
+    '''
+    if shape not in SHAPES :
+        raise ValueError("make_significances    unknown shape %s (available: %s)"%(shape, ", ".join(sorted(SHAPES.keys()))))
+    u = (mX - mX.min()) / max(mX.max() - mX.min(), 1e-300)
+    dm = mX - mY
+    v = (dm - dm.min()) / max(dm.max() - dm.min(), 1e-300)
+    rnd = np.random.RandomState(seed)
+
+    exp_sig = np.clip(SHAPES[shape](u, v) + offset, 0.0, None)
+    obs_sig = np.clip(exp_sig + noise * rnd.standard_normal(exp_sig.shape[0]), 0.0, None)
+    exp_up  = exp_sig + 0.5
+    exp_dn  = np.clip(exp_sig - 0.5, 0.0, None)
+
+    columns = { "CLs"       : p_value(obs_sig),
+                "CLsexp"    : p_value(exp_sig),
+                "clsu1s"    : p_value(exp_up),
+                "clsd1s"    : p_value(exp_dn) }
+    # as humanize_list_files computes them
+    for cls, sig in [("CLs", "ObsSig"), ("CLsexp", "ExpSig"), ("clsu1s", "ExpSigUp1s"), ("clsd1s", "ExpSigDn1s")] :
+        columns[sig] = np.round(get_sigma_from_pvalues(columns[cls]), 2)
+    return columns
+
+def write_limit_results(filename, mX, mY, columns) :
+    '''
+    Write a limit results file (same layout as humanize_list_files)
+    '''
+    columns = dict(columns, mX=mX, mY=mY)
+    table = np.column_stack([columns[f] for f in LIMIT_RESULTS_FIELDS])
+    with open(filename, "w") as ofile :
+        ofile.write("\t".join(LIMIT_RESULTS_FIELDS) + "\n")
+        np.savetxt(ofile, table, fmt="%.10g", delimiter="\t")
+
+def write_harvest_list(filename, mX, mY, columns) :
+    '''
+    Write a harvest list JSON with one record per point, with the
+    keys read by humanize_list_files and a few of the others that
+    CollectAndWriteHypoTestResults produces
+    '''
+    records = []
+    for i in range(mX.shape[0]) :
+        records.append({ "mC1"                : float(mX[i]),
+                         "mN1"                : float(mY[i]),
+                         "CLs"                : float(columns["CLs"][i]),
+                         "CLsexp"             : float(columns["CLsexp"][i]),
+                         "clsu1s"             : float(columns["clsu1s"][i]),
+                         "clsd1s"             : float(columns["clsd1s"][i]),
+                         "p0"                 : 0.5,
+                         "p0exp"              : 0.5,
+                         "upperLimit"         : -1.0,
+                         "expectedUpperLimit" : -1.0,
+                         "fitstatus"          : 0,
+                         "failedstatus"       : 0 })
+    with open(filename, "w") as ofile :
+        json.dump(records, ofile, indent=4)
+
+def get_limit_results_names(outdir, region, channel, grid) :
+    '''
+    Names of the Nominal, Up and Down limit results files of a
+    region, laid out as in the limit_results directory
+    '''
+    region_dir = os.path.join(outdir, "%s_%s_%s"%(region, channel, grid))
+    return dict((syst, os.path.join(region_dir, "%s_%s_%s_%s_limit_results.txt"%(region, channel, grid, syst)))
+                    for syst in ["Nominal", "Up", "Down"])
+
+def make_limit_results(outdir, n_points, n_regions=1, spacing=25.0, shape="gaussian", channel="sfdf", grid="bWN", seed=1234) :
+    '''
+    Write the Nominal/Up/Down limit results files of n_regions
+    synthetic regions (SR0, SR1, ...) of the same grid.
+    Returns [ (region, { syst : filename }) ].
+    '''
+    mX, mY = make_grid_points(n_points, spacing)
+    out = []
+    for ireg in range(n_regions) :
+        region = "SR%d"%ireg
+        names = get_limit_results_names(outdir, region, channel, grid)
+        region_dir = os.path.dirname(names["Nominal"])
+        if not os.path.isdir(region_dir) : os.makedirs(region_dir)
+        # Up/Down: the signal xsec +-1 sigma_theory moves the observed values
+        for isyst, (syst, offset) in enumerate([("Nominal", 0.0), ("Up", 0.3), ("Down", -0.3)]) :
+            columns = make_significances(mX, mY, shape=shape, seed=seed + 10 * ireg + isyst, offset=offset - 0.2 * ireg)
+            write_limit_results(names[syst], mX, mY, columns)
+        out.append((region, names))
+    return out
+
+def make_harvest_list(filename, n_points, spacing=25.0, shape="gaussian", seed=1234) :
+    '''
+    Write the harvest list JSON of a synthetic grid
+    '''
+    mX, mY = make_grid_points(n_points, spacing)
+    write_harvest_list(filename, mX, mY, make_significances(mX, mY, shape=shape, seed=seed))
+
+###############################################################
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--n_points", type=int, default=1000, help="number of grid points")
+    parser.add_argument("-o", "--outdir", default="./synthetic/", help="output directory")
+    parser.add_argument("--regions", type=int, default=1, help="number of regions")
+    parser.add_argument("--spacing", type=float, default=25.0, help="grid spacing (GeV)")
+    parser.add_argument("--shape", default="gaussian", help="significance surface (%s)"%", ".join(sorted(SHAPES.keys())))
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    if args.shape not in SHAPES :
+        print "synthetic_grid    ERROR unknown shape %s (available: %s)"%(args.shape, ", ".join(sorted(SHAPES.keys())))
+        sys.exit(1)
+
+    for region, names in make_limit_results(args.outdir, args.n_points, args.regions, args.spacing, args.shape, seed=args.seed) :
+        for syst in ["Nominal", "Up", "Down"] :
+            print "synthetic_grid    %s %s : %s"%(region, syst, names[syst])
+    harvest_name = os.path.join(args.outdir, "synthetic_%d__1_harvest_list.json"%args.n_points)
+    make_harvest_list(harvest_name, args.n_points, args.spacing, args.shape, seed=args.seed)
+    print "synthetic_grid    harvest list : %s"%harvest_name
@@ -5,8 +5,6 @@
 # July 12
 #
 
-import ROOT
-
 import os
 import sys
 sys.path.append(os.environ['LIMPLOTDIR'])
@@ -31,11 +29,14 @@ conf.proper_names = proper_names
 ##########################################
 # region colors and styles
 ##########################################
-region_colors = [ROOT.kRed, ROOT.kBlue, ROOT.kGreen]
+# names of ROOT colors/marker styles (e.g. "kOrange-3") or plain
+# numbers, resolved when drawing so that loading the configuration
+# does not import ROOT (see limit_plot_tools.root_constant)
+region_colors = ["kRed", "kBlue", "kGreen"]
 # 20 : filled circle
 # 21 : filled square
 # 22 : filled upward triangle
-region_marker_styles = [ROOT.kFullCircle, ROOT.kFullSquare, ROOT.kFullTriangleUp]
+region_marker_styles = ["kFullCircle", "kFullSquare", "kFullTriangleUp"]
 
 #########################################
 # location of HF results directory
@@ -96,8 +97,16 @@ conf.show_obs_cls = False
 conf.show_obs_sig = False
 conf.show_exp_sig = True
 
+## per-point labels: skip overlapping labels and keep the legend clear
+conf.label_mode = "overlap"
+conf.label_exclusion_boxes = [(0.55, 0.72, 0.89, 0.91)]
+
 ## xsec upper limit
 conf.do_xsec_plot = False
+# reference cross-sections: "mass [GeV]  xsec [pb]" per line, needed
+# for do_xsec_plot (no table is shipped, point this to the stop pair
+# production cross-sections to use)
+conf.xsec_file = ""
 
 
 ########################################
@@ -110,6 +119,10 @@ conf.previous_contours["wwlike"] = "obs_nominal"
 conf.previous_contours["stop1l"] = "stop1lobs"
 conf.previous_contours["stop2l"] = "stop2lobs"
 
+## 13 TeV (ICHEP) observed contour
+conf.ichep_result_file = "ichep_contour_obs.root"
+conf.ichep_contour = "Graph"
+
 
 #######################################
 # file the regions
@@ -7,23 +7,30 @@
 # July 2016
 #
 
-import ROOT
-ROOT.PyConfig.IgnoreCommandLineOptions = True
-ROOT.gROOT.SetBatch(True)
-ROOT.gStyle.SetOptStat(False)
-ROOT.gROOT.ProcessLine( "gErrorIgnoreLevel = 3001;" )
-
 import os
 import sys
 sys.path.append(os.environ['LIMPLOTDIR'])
 
+# ROOT is only imported once something is drawn (see lazy_root)
+from limitplotter.utils.lazy_root import ROOT
+def setup_root(root) :
+    root.gStyle.SetOptStat(False)
+    root.gROOT.ProcessLine( "gErrorIgnoreLevel = 3001;" )
+ROOT.on_load(setup_root)
+
 from optparse import OptionParser
 import glob
+import time
 import operator # itemgetter
 
+import numpy as np
+
 # limitplotter
 from limitplotter.utils.grid_configuration import *
 from limitplotter.utils.limit_plot_tools import *
+from limitplotter.utils.instrumentation import stage, instrumented, instrumentation
+from limitplotter.utils.export_tools import export_canvas, check_formats
+from limitplotter.utils.watch_tools import ChangeWatcher
 
 def get_configuration(grid) :
     configuration_file = ""
@@ -36,13 +43,118 @@ def get_configuration(grid) :
     print "get_configuration    grabbing configuration file (%s)"%configuration_file
     return configuration_file
 
+def get_best_sr_output_name(conf) :
+    outname = "bestSR_%s_"%conf.grid
+    if conf.channel != "" : outname += "%s_"%conf.channel
+    outname += "expSig"
+    return outname
+
+def save_plot(conf, c, base_name) :
+    '''
+    Write the canvas as base_name.<format> for each of the
+    conf.output_formats (and the png preview, if asked for),
+    returns the files written
+    '''
+    preview_scale = conf.preview_scale if conf.make_preview else 0.0
+    with stage("SaveAs") :
+        written = export_canvas(c, base_name, conf.output_formats, conf.n_export_workers, preview_scale)
+    for name in written :
+        print " >>> Saved %s"%name
+    return written
+
+@instrumented()
 def make_best_sr_plot(conf) :
-    print "make_best_sr_plot    THIS METHOD IS NOT IMPLEMENTED"
-    sys.exit()
+    '''
+    Draw the region with the largest expected significance at
+    each grid point (markers in the region color and shape) with
+    the best-region-per-point (PWC) 95% CL contours on top
+    '''
+    print "make_best_sr_plot..."
+    grid = conf.signal_grid
+    if (grid.bestRegion < 0).all() :
+        find_best_SR_per_point(conf)
+
+    c = conf.best_sr_canvas
+    c.Clear()
+    c.cd()
+
+    frame = make_frame(conf)
+    frame.Draw("axis")
+    frame.GetXaxis().SetTitle(conf.x_title)
+    frame.GetYaxis().SetTitle(conf.y_title)
+    c.Update()
+
+    n_regions = len(grid.region_names)
+    n_rows = min(n_regions + 3, 12)
+    leg = make_default_legend(0.55, 0.91 - 0.032 * n_rows, 0.89, 0.91)
+    if n_regions > 9 : leg.SetNColumns(2 if n_regions <= 18 else 3)
+
+    ################################
+    # best region markers
+    ################################
+    markers = []
+    for reg in conf.regions :
+        col = grid.region_column(reg.name)
+        best_here = grid.bestRegion == col
+        if not best_here.any() : continue
+        g = arrays_to_graph(grid.mX[best_here], grid.mY[best_here])
+        # regions without a configured color/shape get one from the palette
+        color = root_constant(reg.color)
+        if color is None : color = ROOT.gStyle.GetColorPalette(int(254 * col / max(1, n_regions - 1)))
+        g.SetMarkerColor(color)
+        g.SetMarkerStyle(root_constant(reg.shape) if reg.shape is not None else ROOT.kFullCircle)
+        g.SetMarkerSize(1.1)
+        g.Draw("P")
+        leg.AddEntry(g, getattr(conf, "proper_names", {}).get(reg.name, reg.name), "p")
+        markers.append(g)
+
+    no_best = grid.bestRegion < 0
+    if no_best.any() :
+        g = arrays_to_graph(grid.mX[no_best], grid.mY[no_best])
+        g.SetMarkerColor(ROOT.kGray+1)
+        g.SetMarkerStyle(ROOT.kOpenCircle)
+        g.SetMarkerSize(1.1)
+        g.Draw("P")
+        leg.AddEntry(g, "No result", "p")
+        markers.append(g)
+    c.Update()
+
+    ################################
+    # PWC contours
+    ################################
+    contours = make_contours(conf, types=["exp", "obs"], pwc=True)
+    g_exp, g_obs = contours["exp"], contours["obs"]
+    if g_exp :
+        g_exp.SetLineColor(ROOT.TColor.GetColor( c_Expected ))
+        g_exp.SetLineStyle(7)
+        g_exp.SetLineWidth(2)
+        g_exp.Draw("C")
+        leg.AddEntry(g_exp, "Expected limit (best SR)", "l")
+    if g_obs :
+        g_obs.SetLineColor(ROOT.TColor.GetColor( c_Observed ))
+        g_obs.SetLineStyle(1)
+        g_obs.SetLineWidth(3)
+        g_obs.Draw("C")
+        leg.AddEntry(g_obs, "Observed limit (best SR)", "l")
+    c.Update()
+
+    #####################################
+    # labels and legend
+    #####################################
+    draw_top_left_label(get_atlas_label(),  (0.0 + 1.3*ROOT.gPad.GetLeftMargin()), (1.0-1.6*ROOT.gPad.GetTopMargin()), font=72)
+    draw_top_left_label("Preliminary", (0.125 + 1.3*ROOT.gPad.GetLeftMargin()), (1.0-1.6*ROOT.gPad.GetTopMargin()))
+    draw_top_left_label(get_lumi_label(),   (0.0 + 1.3*ROOT.gPad.GetLeftMargin()), (1.0-2.7*ROOT.gPad.GetTopMargin()))
+    draw_top_left_label(conf.decay_process, (0.0 + 1.3*ROOT.gPad.GetLeftMargin()), (1.0-3.65*ROOT.gPad.GetTopMargin()))
+    draw_text(0.96,0.38,ROOT.kBlack,"Best SR per point (expected significance)",angle=90.0, size=0.03)
+    leg.Draw()
+    c.Update()
+
+    save_name = get_best_sr_output_name(conf)
+    print " >>> Saving best SR plot to %s.{%s}"%(save_name, ",".join(conf.output_formats))
+    return save_plot(conf, c, save_name)
 
 def draw_sig_or_cls(conf, reg_="", pwc=False) :
 
-    print "draw_sig_or_cls    NEED TO HANDLE PWC CASE"
     c = conf.limit_canvas
     c.cd()
 
@@ -50,25 +162,27 @@ def draw_sig_or_cls(conf, reg_="", pwc=False) :
     tex.SetTextFont(42)
     tex.SetTextSize(0.35 * tex.GetTextSize())
     #tex.SetTextSize(0.5 * tex.GetTextSize())
-    markers = []
-    for s in conf.signals :
-        val, x, y = 0.0, 0.0, 0.0
-        x = float(s.mX)
-        y = float(s.mY)
-        if x > 450 : continue
-        if y > 365 : continue
-        if conf.show_exp_cls :
-            val = float(s.expectedCLs[reg_])
-        elif conf.show_obs_cls :
-            val = float(s.observedCLs[reg_])
-        elif conf.show_obs_sig :
-            val = float(s.observedSig[reg_])
-        elif conf.show_exp_sig :
-            val = float(s.expectedSig[reg_])
-
-        #if "SRwt" in reg_ and y > 300 : continue
-        if val < 0 : val = 0
-        tex.DrawLatex(x, y, "%.2f"%float(val))
+    signal_grid = conf.signal_grid
+    quantity = ""
+    if conf.show_exp_cls :
+        quantity = "expectedCLs"
+    elif conf.show_obs_cls :
+        quantity = "observedCLs"
+    elif conf.show_obs_sig :
+        quantity = "observedSig"
+    elif conf.show_exp_sig :
+        quantity = "expectedSig"
+    if pwc :
+        # values in the best region of each point
+        vals = np.array(getattr(signal_grid, best_quantity(quantity)))
+        vals[signal_grid.missing[best_quantity(quantity)]] = 0
+    else :
+        vals = np.array(signal_grid.values(quantity, reg_))
+        vals[signal_grid.missing_values(quantity, reg_)] = 0
+    vals[vals < 0] = 0
+
+    #if "SRwt" in reg_ and y > 300 : continue
+    draw_point_labels(conf, tex, signal_grid.mX, signal_grid.mY, vals, "%.2f")
 
     z_title = ""
     if   conf.show_exp_cls : z_title = "Numbers give the expected CL_{s} values"
@@ -80,13 +194,49 @@ def draw_sig_or_cls(conf, reg_="", pwc=False) :
     #draw_text(0.96,0.44,ROOT.kBlack,z_title,angle=90.0, size=0.03)
     c.Update()
 
-def draw_upperlimit_xsec(conf) :
-    print "draw_upperlimit_xsec    THIS METHOD IS NOT IMPLEMENTED"
+def get_excluded_xsec(conf, reg_="") :
+    '''
+    95% CL excluded cross-section [fb] of each grid point of region
+    reg_: the observed upper limit on mu_SIG times the reference
+    cross-section at the point's mX. Returns the (n_points,) array,
+    NaN where there is no upper limit or reference cross-section.
+    '''
+    grid = conf.signal_grid
+    mu_ul = np.array(grid.values("observedULMu", reg_))
+    mu_ul[grid.missing_values("observedULMu", reg_)] = np.nan
+    return 1000. * mu_ul * conf.get_reference_xsec(grid.mX)
+
+def draw_upperlimit_xsec(conf, reg_="") :
+    '''
+    Write the excluded cross-section (see get_excluded_xsec) at each
+    grid point inside of the frame of the limit plot
+    '''
+    c = conf.limit_canvas
+    c.cd()
+
+    grid = conf.signal_grid
+    if grid.missing_values("observedULMu", reg_).all() :
+        print "draw_upperlimit_xsec    ERROR no upper limits on mu_SIG for region %s (run prepare_limit_results.py -u). Exiting."%reg_
+        sys.exit()
+    xsec_ul = get_excluded_xsec(conf, reg_)
+    show = np.isfinite(xsec_ul)
+    n_no_xsec = int((~np.isfinite(xsec_ul) & ~grid.missing_values("observedULMu", reg_)).sum())
+    if n_no_xsec and conf.xsec_file != "" :
+        print "draw_upperlimit_xsec    WARNING %d points outside of the cross-section table (%s) are not shown"%(n_no_xsec, conf.xsec_file)
+
+    tex = ROOT.TLatex(0.0,0.0,"")
+    tex.SetTextFont(42)
+    tex.SetTextSize(0.35 * tex.GetTextSize())
+    tex.SetTextAlign(22)
+    draw_point_labels(conf, tex, grid.mX[show], grid.mY[show], xsec_ul[show], "%.3g")
+
+    draw_text(0.96,0.38,ROOT.kBlack,"Numbers give 95% CL excluded model cross sections [fb]",angle=90.0, size=0.03)
+    c.Update()
 
-def get_limit_output_name(conf) :
+def get_limit_output_name(conf, reg_="") :
     outname = ""
     outname += "limplot_"
-    outname += conf.base_region
+    outname += conf.base_region if reg_ == "" else reg_
     outname += "_"
     outname += conf.grid
     outname += "_"
@@ -98,7 +248,6 @@ def get_limit_output_name(conf) :
     elif conf.show_obs_cls : outname += "obsCLs"
     elif conf.show_exp_sig : outname += "expSig"
     elif conf.show_obs_sig : outname += "obsSig" 
-    outname += ".pdf"
     return outname
 
 def get_forbiddenlines(conf) :
@@ -150,10 +299,25 @@ def get_forbiddenlines(conf) :
     return out_lines
 
 
-def make_limit_plot(conf) :
+def compute_limit_contours(conf, reg_) :
+    '''
+    Compute the 95% CL contours drawn on the limit plot of
+    region reg_, returns { type : TGraph }
+    '''
+    return make_contours(conf, reg_=reg_, types=["obs", "obsUp", "obsDn", "exp", "expUp", "expDn"], pwc=False)
+
+@instrumented()
+def make_limit_plot(conf, reg_="", contours=None) :
+    '''
+    Draw and save the limit plot for region reg_ (default: the last
+    region of the configuration). The contours are computed unless
+    they are given (see compute_limit_contours).
+    '''
     print "make_limit_plot..."
+    if reg_ == "" : reg_ = region
 
     c = conf.limit_canvas
+    c.Clear()
     c.cd()
 
     ################################
@@ -173,44 +337,36 @@ def make_limit_plot(conf) :
     ######################################
     # draw previous results
     ######################################
+    prev = {}
     if conf.show_previous_8TeV_result :
-        rfile = ROOT.TFile(conf.previous_result_file)
-        prev_wwlike = rfile.Get(conf.previous_contours["wwlike"])
-        prev_stop1l = rfile.Get(conf.previous_contours["stop1l"])
-        prev_stop2l = rfile.Get(conf.previous_contours["stop2l"])
-
-
+        graphs = get_reference_contours(conf, conf.previous_result_file, conf.previous_contours.values())
+        for key, name in conf.previous_contours.items() :
+            if graphs[name] is not None : prev[key] = graphs[name]
 
-        #prev_wwlike.SetLineColor(ROOT.TColor.GetColor("#FF4444"))
-        #prev_stop1l.SetLineColor(ROOT.TColor.GetColor("#F685E4"))
-        #prev_stop2l.SetLineColor(ROOT.TColor.GetColor("#B93B8F"))
+        #prev["wwlike"].SetLineColor(ROOT.TColor.GetColor("#FF4444"))
+        #prev["stop1l"].SetLineColor(ROOT.TColor.GetColor("#F685E4"))
+        #prev["stop2l"].SetLineColor(ROOT.TColor.GetColor("#B93B8F"))
 
-        prev_wwlike.SetLineColor((ROOT.kAzure+6)+1)
-        prev_stop1l.SetLineColor((ROOT.kSpring-5)-1)
-        prev_stop2l.SetLineColor((ROOT.kOrange-3)-2)
+        # key : (line color, fill color, fill alpha)
+        prev_styles = { "wwlike" : ((ROOT.kAzure+6)+1,  ROOT.kAzure+6,  0.65),
+                        "stop1l" : ((ROOT.kSpring-5)-1, ROOT.kSpring-5, 1.00),
+                        "stop2l" : ((ROOT.kOrange-3)-2, ROOT.kOrange-3, 0.65) }
+        for key, g in prev.items() :
+            if key not in prev_styles : continue
+            line_color, fill_color, alpha = prev_styles[key]
+            g.SetLineColor(line_color)
+            g.SetFillColorAlpha(fill_color, alpha)
+            g.SetLineWidth(3)
 
+        #prev["wwlike"].SetFillStyle( 1001 )
+        #prev["wwlike"].SetFillStyle( 3005 )
+        #prev["wwlike"].SetFillColorAlpha(ROOT.TColor.GetColor("#FF4444"), 0.1)
 
-        prev_wwlike.SetFillColorAlpha(ROOT.kAzure+6, 0.65)
-        prev_stop1l.SetFillColorAlpha(ROOT.kSpring-5, 1.00)
-        prev_stop2l.SetFillColorAlpha(ROOT.kOrange-3,0.65)
+        for key in ["stop1l", "stop2l", "wwlike"] :
+            if key in prev : prev[key].Draw("same F")
 
-        prev_wwlike.SetLineWidth(3)
-        prev_stop1l.SetLineWidth(3)
-        prev_stop2l.SetLineWidth(3)
-
-
-        #prev_wwlike.SetFillStyle( 1001 )
-        #prev_wwlike.SetFillStyle( 3005 )
-        #prev_wwlike.SetFillColorAlpha(ROOT.TColor.GetColor("#FF4444"), 0.1)
-
-        prev_stop1l.Draw("same F")
-        prev_stop2l.Draw("same F")
-        prev_wwlike.Draw("same F")
-
-
-        prev_stop1l.Draw("same")
-        prev_stop2l.Draw("same")
-        prev_wwlike.Draw("same")
+        for key in ["stop1l", "stop2l", "wwlike"] :
+            if key in prev : prev[key].Draw("same")
 
 
 
@@ -219,18 +375,21 @@ def make_limit_plot(conf) :
     # grab the 95% CL contours
     ################################
 
+    if contours is None :
+        contours = compute_limit_contours(conf, reg_)
+
     # obs
-    g_obs       = make_contour(conf, reg_=region, type="obs", pwc=False)
+    g_obs       = contours["obs"]
     print "make_limit_plot   NOT GRABBING UP/DOWN OBSERVED CONTOURS"
     #g_obsUp = None
     #g_obsDn = None
-    g_obsUp     = make_contour(conf, reg_=region, type="obsUp", pwc=False)
-    g_obsDn     = make_contour(conf, reg_=region, type="obsDn", pwc=False)
+    g_obsUp     = contours["obsUp"]
+    g_obsDn     = contours["obsDn"]
 
     # exp
-    g_exp       = make_contour(conf, reg_=region, type="exp", pwc=False)
-    g_expUp     = make_contour(conf, reg_=region, type="expUp", pwc=False)
-    g_expDn     = make_contour(conf, reg_=region, type="expDn", pwc=False)
+    g_exp       = contours["exp"]
+    g_expUp     = contours["expUp"]
+    g_expDn     = contours["expDn"]
 
    # g_obs.SetName("stop2l_3body_observed")
    # g_obs.SaveAs("observed_contour.root")
@@ -276,7 +435,7 @@ def make_limit_plot(conf) :
     draw_top_left_label("Preliminary", (0.125 + 1.3*ROOT.gPad.GetLeftMargin()), (1.0-1.6*ROOT.gPad.GetTopMargin()))
     draw_top_left_label(get_lumi_label(),   (0.0 + 1.3*ROOT.gPad.GetLeftMargin()), (1.0-2.7*ROOT.gPad.GetTopMargin()))
     draw_top_left_label(conf.decay_process, (0.0 + 1.3*ROOT.gPad.GetLeftMargin()), (1.0-3.65*ROOT.gPad.GetTopMargin()))
-    if grid=="bWN" and region=="SRwt" :
+    if grid=="bWN" and reg_=="SRwt" :
         region_label = "SR_{W}^{3-body} + SR_{t}^{3-body}" 
         draw_top_left_label(region_label, (0.0 + 1.3*ROOT.gPad.GetLeftMargin()), (1.0-4.7*ROOT.gPad.GetTopMargin()))  
     c.Update()
@@ -304,18 +463,17 @@ def make_limit_plot(conf) :
     # ICHEP CONTOURS
     ################################################
     #ichep_contour_exp.root  ichep_contour_obs.root
-    prev_ichep_file = ROOT.TFile("ichep_contour_obs.root")
-    prev_ichep = prev_ichep_file.Get("Graph")
-    prev_ichep.SetLineColor(ROOT.kBlue)
-    prev_ichep.SetLineStyle(4)
-    prev_ichep.SetLineWidth(3)
-    prev_ichep.Draw("same")
-    leg.AddEntry(prev_ichep, "ATLAS-CONF 13 TeV (Stop-2L)", "l")
+    prev_ichep = get_reference_contours(conf, conf.ichep_result_file, [conf.ichep_contour])[conf.ichep_contour]
+    if prev_ichep is not None :
+        prev_ichep.SetLineColor(ROOT.kBlue)
+        prev_ichep.SetLineStyle(4)
+        prev_ichep.SetLineWidth(3)
+        prev_ichep.Draw("same")
+        leg.AddEntry(prev_ichep, "ATLAS-CONF 13 TeV (Stop-2L)", "l")
 
     # add previous (Run-1)
-    leg.AddEntry(prev_wwlike, "ATLAS 8 TeV (WW-like)","f")
-    leg.AddEntry(prev_stop2l, "ATLAS 8 TeV (Stop-2L)","f")
-    leg.AddEntry(prev_stop1l, "ATLAS 8 TeV (Stop-1L)","f")
+    for key, title in [("wwlike", "ATLAS 8 TeV (WW-like)"), ("stop2l", "ATLAS 8 TeV (Stop-2L)"), ("stop1l", "ATLAS 8 TeV (Stop-1L)")] :
+        if key in prev : leg.AddEntry(prev[key], title, "f")
 
     # now that we have all the contours, draw the legend
     leg.Draw()
@@ -349,7 +507,7 @@ def make_limit_plot(conf) :
     # draw CLs on plot
     ######################################
     if(conf.show_exp_cls or conf.show_obs_cls or conf.show_exp_sig or conf.show_obs_sig) and not conf.do_xsec_plot :
-        draw_sig_or_cls(conf, reg_=region)
+        draw_sig_or_cls(conf, reg_=reg_)
 
     
     ######################################
@@ -357,16 +515,125 @@ def make_limit_plot(conf) :
     # for each point
     ######################################
     if conf.do_xsec_plot :
-        draw_upperlimit_xsec(conf)
+        draw_upperlimit_xsec(conf, reg_=reg_)
 
 
     ########################################
     # save
     ########################################
-    save_name = get_limit_output_name(conf)
-    print " >>> Saving limit plot to %s"%save_name
-    c.SaveAs(save_name)
+    save_name = get_limit_output_name(conf, reg_)
+    print " >>> Saving limit plot to %s.{%s}"%(save_name, ",".join(conf.output_formats))
+    return save_plot(conf, c, save_name)
+
+
+# plot variant --> (show_exp_cls, show_obs_cls, show_exp_sig, show_obs_sig, do_xsec_plot)
+PLOT_VARIANTS = {   "expCLs" : (True,  False, False, False, False),
+                    "obsCLs" : (False, True,  False, False, False),
+                    "expSig" : (False, False, True,  False, False),
+                    "obsSig" : (False, False, False, True,  False),
+                    "exclXS" : (False, False, False, False, True ) }
+
+def set_plot_variant(conf, variant) :
+    '''
+    Set the configuration flags that select what is drawn on top
+    of the contours (see PLOT_VARIANTS)
+    '''
+    conf.show_exp_cls, conf.show_obs_cls, conf.show_exp_sig, conf.show_obs_sig, conf.do_xsec_plot = PLOT_VARIANTS[variant]
+
+def make_batch_plots(conf, regions, variants) :
+    '''
+    Make every requested plot variant for every requested region,
+    computing the contours of each region only once
+    '''
+    saved = []
+    for reg_ in regions :
+        print "make_batch_plots    %s : computing contours"%reg_
+        with stage("compute_limit_contours %s"%reg_) :
+            contours = compute_limit_contours(conf, reg_)
+        for variant in variants :
+            print "make_batch_plots    %s : drawing %s"%(reg_, variant)
+            set_plot_variant(conf, variant)
+            saved += make_limit_plot(conf, reg_=reg_, contours=contours)
+
+    print "make_batch_plots    saved %d plots:"%len(saved)
+    for name in saved :
+        print "make_batch_plots     > %s"%name
+    return saved
+
+def make_plots(conf, batch_regions=None, batch_variants=None, changed_regions=None) :
+    '''
+    Make the requested plots: the best-SR plot if set in the
+    configuration, then every variant for every region in batch mode
+    (batch_regions/batch_variants given), else the limit plot as set
+    in the configuration. With changed_regions (watch mode) only the
+    plots depending on the results of these regions are made again.
+    '''
+    def changed(reg_) :
+        return changed_regions is None or reg_ in changed_regions
+
+    # find the best SR per point and draw it (if doing PWC), it depends on every region
+    if conf.do_best_sr_per_point and (changed_regions is None or changed_regions) :
+        find_best_SR_per_point(conf)
+        make_best_sr_plot(conf)
+
+    if batch_regions is not None :
+        regions = [reg_ for reg_ in batch_regions if changed(reg_)]
+        if regions : make_batch_plots(conf, regions, batch_variants)
+        return
 
+    # make the limit plot
+    if (conf.do_limit_plot or conf.do_xsec_plot) and changed(conf.base_region) :
+        make_limit_plot(conf)
+
+def watch_limit_results(conf, poll_interval=10.0, debounce=30.0, batch_regions=None, batch_variants=None) :
+    '''
+    Poll the limit_results/<region>_<channel>_<grid>/ directories of
+    the regions every poll_interval seconds, picking up the results
+    files that appear, and once changed (or new) files have not been
+    touched for debounce seconds (i.e. are done being written), reload
+    only those and make again the plots depending on them (contours of
+    unchanged results are taken from the contour cache). Files that
+    cannot be read are tried again on the next poll. Runs until
+    interrupted (Ctrl-C).
+    '''
+    conf.exit_on_bad_results = False
+    files = conf.get_results_files()
+    file_info = dict((filename, (reg_, syst)) for filename, reg_, syst in files)
+    watcher = ChangeWatcher(file_info.keys(), debounce)
+    print "watch_limit_results    watching %d limit results files (poll every %.0f s, debounce %.0f s), Ctrl-C to stop"%(len(files), poll_interval, debounce)
+    try :
+        while True :
+            time.sleep(poll_interval)
+            for filename, reg_, syst in conf.update_results_files() :
+                print "watch_limit_results    new %s %s results file %s"%(reg_, syst, filename)
+                file_info[filename] = (reg_, syst)
+                watcher.add(filename)
+            changed_files = watcher.poll()
+            if not changed_files : continue
+            print "watch_limit_results    %s : %d files changed"%(time.strftime("%H:%M:%S"), len(changed_files))
+            for filename in sorted(changed_files) :
+                print "watch_limit_results     > %s"%filename
+            with stage("watch_update") :
+                try :
+                    with stage("reload_results") :
+                        changed_regions = conf.reload_results([file_info[f] for f in changed_files])
+                except (ValueError, IOError, OSError), e :
+                    print "watch_limit_results    WARNING unable to read the changed files (%s), trying again on the next poll"%e
+                    watcher.retry(changed_files)
+                    continue
+                make_plots(conf, batch_regions, batch_variants, changed_regions)
+            print "watch_limit_results    plots updated, watching..."
+    except KeyboardInterrupt :
+        print "watch_limit_results    stopped"
+
+def finish_instrumentation(options) :
+    '''
+    Print/write the per-stage records if asked for (--timing, --trace)
+    '''
+    if options.timing or options.profile != "" :
+        instrumentation.print_summary("draw_limits stage summary")
+    if options.trace != "" :
+        instrumentation.write_trace(options.trace, grid=options.grid, channel=options.channel)
 
 #######################################################
 if __name__ == "__main__" :
@@ -376,11 +643,31 @@ if __name__ == "__main__" :
     parser = OptionParser()
     parser.add_option("-c", "--channel", default="")
     parser.add_option("-g", "--grid", default="")
+    parser.add_option("-b", "--batch", action="store_true", default=False, help="make every requested variant (--variants) for every requested region (--regions) in one go, and the best-SR plot if set in the configuration")
+    parser.add_option("--variants", default="expCLs,obsCLs,expSig,obsSig", help="comma-separated plot variants for --batch (%s)"%",".join(sorted(PLOT_VARIANTS.keys())))
+    parser.add_option("--regions", default="", help="comma-separated regions for --batch (default: all configured regions)")
+    parser.add_option("-j", "--workers", default=None, type="int", help="number of processes used to compute the contours")
+    parser.add_option("-e", "--engine", default=None, help="contour engine: root or numpy")
+    parser.add_option("--no-cache", action="store_true", default=False, help="do not use the binary caches of the limit results files")
+    parser.add_option("--no-contour-cache", action="store_true", default=False, help="do not store/reuse the contours on disk")
+    parser.add_option("--labels", default=None, help="which per-point labels to draw: all, overlap or spacing")
+    parser.add_option("-f", "--formats", default=None, help="comma-separated output formats (e.g. pdf,png,eps,root,C)")
+    parser.add_option("--export-workers", default=None, type="int", help="number of processes writing the output formats")
+    parser.add_option("--preview", action="store_true", default=False, help="also write a low-resolution png preview of each plot")
+    parser.add_option("-w", "--watch", action="store_true", default=False, help="keep running, re-making the plots as the limit results files change")
+    parser.add_option("--poll-interval", default=10.0, type="float", help="seconds between checks of the limit results files in --watch mode")
+    parser.add_option("--debounce", default=30.0, type="float", help="seconds the changed files must stay untouched before the plots are re-made in --watch mode")
+    parser.add_option("--timing", action="store_true", default=False, help="print the wall/CPU time and peak memory of each stage")
+    parser.add_option("--trace", default="", help="write the per-stage timing/memory records to this JSON file")
+    parser.add_option("--profile", default="", help="comma-separated stages to run under cProfile (statistics in ./profiles/)")
     (options, args) = parser.parse_args()
 
     channel     = options.channel
     grid        = options.grid
 
+    if options.timing or options.trace != "" or options.profile != "" :
+        instrumentation.enable(profile_stages=[s for s in options.profile.split(",") if s])
+
     if channel=="" or grid=="" :
         print "ERROR input options are empty (channel: %s, grid: %s)"%(channel, grid)
         sys.exit()
@@ -391,6 +678,42 @@ if __name__ == "__main__" :
     gridConf.name = gridConf
     gridConf.channel = channel
     execfile("./config/%s"%conf_file)
+    if options.no_cache : gridConf.use_results_cache = False
+    if options.no_contour_cache : gridConf.use_contour_cache = False
+    if options.workers : gridConf.n_contour_workers = options.workers
+    if options.engine :
+        if options.engine not in ["root", "numpy"] :
+            print "ERROR unsupported contour engine (%s), use root or numpy"%options.engine
+            sys.exit()
+        gridConf.contour_engine = options.engine
+    if options.labels :
+        if options.labels not in LABEL_MODES :
+            print "ERROR unsupported label mode (%s), use %s"%(options.labels, ", ".join(LABEL_MODES))
+            sys.exit()
+        gridConf.label_mode = options.labels
+    if options.formats : gridConf.output_formats = options.formats.split(",")
+    if options.export_workers : gridConf.n_export_workers = options.export_workers
+    if options.preview : gridConf.make_preview = True
+    try :
+        check_formats(gridConf.output_formats)
+    except ValueError, e :
+        print "ERROR %s"%e
+        sys.exit()
+
+    batch_regions, batch_variants = None, None
+    if options.batch :
+        configured = [r.name for r in gridConf.regions]
+        batch_regions = configured
+        if options.regions != "" : batch_regions = options.regions.split(",")
+        unknown = [r for r in batch_regions if r not in configured]
+        if unknown :
+            print "ERROR unknown regions %s (configured in %s: %s)"%(", ".join(unknown), conf_file, ", ".join(configured))
+            sys.exit()
+        batch_variants = options.variants.split(",")
+        for variant in batch_variants :
+            if variant not in PLOT_VARIANTS :
+                print "ERROR unknown plot variant %s (available: %s)"%(variant, ", ".join(sorted(PLOT_VARIANTS.keys())))
+                sys.exit()
 
     # have now loaded everything
     print "=================================="
@@ -408,30 +731,36 @@ if __name__ == "__main__" :
     print " do best SR plot:     %s          "%gridConf.do_best_sr_per_point
     print " do xsec plot:        %s          "%gridConf.do_xsec_plot
     print " show previous limit: %s          "%gridConf.show_previous_8TeV_result
+    print " use results cache:   %s          "%gridConf.use_results_cache
+    print " contour engine:      %s          "%gridConf.contour_engine
+    print " use contour cache:   %s          "%gridConf.use_contour_cache
+    print " contour workers:     %s          "%gridConf.n_contour_workers
+    print " output formats:      %s          "%",".join(gridConf.output_formats)
     print "=================================="
 
 
     # collect limit result files
-    gridConf.collect_limit_result_files()
+    with stage("collect_limit_result_files") :
+        gridConf.collect_limit_result_files()
 
     # build the grid
-    gridConf.assign_grid()
+    with stage("assign_grid") :
+        gridConf.assign_grid()
 
     # fill the 'raw' limit results
-    gridConf.fill_raw_results()
+    with stage("fill_raw_results") :
+        gridConf.fill_raw_results()
+
+    # and the upper limits on mu_SIG, if any
+    with stage("fill_upperlimit_results") :
+        gridConf.fill_upperlimit_results()
 
     for s in gridConf.signals :
         print "(%.1f,%.1f)"%(float(s.mX), float(s.mY))
 
+    make_plots(gridConf, batch_regions, batch_variants)
 
-    # find the best SR per point (if doing PWC)
-    #find_best_SR_per_point(gridConf)
-
-    if gridConf.do_best_sr_per_point :
-        make_best_sr_plot(gridConf)
-
-    # make the limit plot
-    if gridConf.do_limit_plot or gridConf.do_xsec_plot :
-        make_limit_plot(gridConf)
-
+    if options.watch :
+        watch_limit_results(gridConf, options.poll_interval, options.debounce, batch_regions, batch_variants)
 
+    finish_instrumentation(options)
@@ -25,10 +25,6 @@
 # July 2016
 #
 
-import ROOT
-ROOT.PyConfig.IgnoreCommandLineOptions = True
-ROOT.gROOT.SetBatch(True)
-
 import os
 import sys
 sys.path.append(os.environ['LIMPLOTDIR'])
@@ -38,12 +34,27 @@ import json
 import subprocess
 import argparse
 import glob
+import multiprocessing
+import time
+import traceback
 
 #limitplotter
+from limitplotter.utils.lazy_root import ROOT
 from limitplotter.utils.stat_tools import *
+from limitplotter.utils.harvest_tools import *
+from limitplotter.utils.merge_tools import *
+from limitplotter.utils.log_tools import *
+from limitplotter.utils.file_tools import atomic_write
+from limitplotter.utils.instrumentation import stage, instrumented, instrumentation
 
-#HistFitter
-ROOT.gSystem.Load("libSusyFitter.so")
+def load_susyfitter() :
+    '''
+    Load HistFitter's libSusyFitter.so (and ROOT), only done
+    by the steps that need it
+    '''
+    if ROOT.gSystem.Load("libSusyFitter.so") < 0 :
+        print "load_susyfitter    ERROR unable to load libSusyFitter.so, did you call setup.sh in your HistFitter area? Exiting."
+        sys.exit()
 
 
 def get_final_name() :
@@ -72,24 +83,46 @@ def get_final_name() :
         sys.exit()
 
 
-def hadd_workspace_files() :
+def get_workspace_files() :
+    '''
+    Return the per-point workspace hypotest files for the requested
+    region, channel, grid, and signal uncertainty (syst)
+    '''
+    return sorted(glob.glob("%s%s_%s_%s*Output_fixSigXSec%s_hypotest.root"%(results_dir, region, channel, grid, syst)))
+
+@instrumented()
+def hadd_workspace_files(inputs=None, final_results_filename=None) :
     '''
     Concatenate the workspace hypotests for the requested
     region, channel, grid, and signal uncertainty (syst).
     Puts the final file in the same results directory
-    as the workspace files (user-provided: results_dir)
+    as the workspace files (user-provided: results_dir).
+    By default all of the workspace files are concatenated
+    into the file named by get_final_name.
+
+    The files are merged in-process as a tree over merge_workers
+    processes (see merge_tools.tree_merge), and the merge is skipped
+    if the final file is newer than every workspace file.
     '''
 
-    final_results_filename = get_final_name()
+    if final_results_filename is None : final_results_filename = get_final_name()
+    if inputs is None : inputs = get_workspace_files()
 
     if grid == "bWN" and syst != "Nominal" :
         print "ERROR currently we only handle the nom case for your grid (%s)"%grid
     #cmd = "hadd -f %s%s %s%s_%s_%s*Output_hypotest.root"%(results_dir, final_results_filename, results_dir, region, channel, grid)
-    cmd = "hadd -f %s%s %s%s_%s_%s*Output_fixSigXSec%s_hypotest.root"%(results_dir, final_results_filename, results_dir, region, channel, grid, syst)
-    print "hadd_workspace_files    calling %s"%cmd
-    subprocess.call(cmd, shell=True)
+    #cmd = "hadd -f %s%s %s%s_%s_%s*Output_fixSigXSec%s_hypotest.root"%(results_dir, final_results_filename, results_dir, region, channel, grid, syst)
+    target = "%s%s"%(results_dir, final_results_filename)
+    if is_up_to_date(target, inputs) :
+        print "hadd_workspace_files    %s is newer than its %d inputs, skipping merge"%(target, len(inputs))
+        return
+    print "hadd_workspace_files    merging %d files into %s (%d workers)"%(len(inputs), target, merge_workers)
+    if not tree_merge(inputs, target, n_workers=merge_workers, fan_in=merge_fan_in) :
+        print "hadd_workspace_files    ERROR merge failed. Exiting."
+        sys.exit()
 
-def make_harvest_list_files() :
+@instrumented()
+def make_harvest_list_files(final_results_filename=None) :
     # CollectAndWriteHypoTestResults --> HistFitter/src/toy_utils.cxx
     formatting = ""
     if grid == "bWN" :
@@ -99,24 +132,74 @@ def make_harvest_list_files() :
         sys.exit()
     cut_string = "1"
 
-    inputfile = "%s%s"%(results_dir, get_final_name())
+    if final_results_filename is None : final_results_filename = get_final_name()
+    inputfile = "%s%s"%(results_dir, final_results_filename)
     print "inputfile: %s"%inputfile
+    load_susyfitter()
     outputfile = ROOT.CollectAndWriteHypoTestResults(inputfile, formatting, "mC1:mN1", cut_string)
 
-def move_list_files() :
+@instrumented()
+def move_list_files(final_results_filename=None) :
+    '''
+    Move the harvest list files made from the final_results_filename
+    (default: get_final_name) workspace file to the list_files directory
+    '''
     #listdir = "./list_files/%s_%s_%s/"%(region, channel, grid)
     listdir = "./list_files/%s_%s_%s_%s/"%(region, channel, grid, syst)
 
     cmd = "mkdir -p %s"%listdir
     print "Moving list files to %s"%listdir
     subprocess.call(cmd, shell=True)
-    mv_cmd = "mv *harvest_list* %s"%listdir
+    # only move our own files, other region/syst chains may be running
+    if final_results_filename is None : final_results_filename = get_final_name()
+    #mv_cmd = "mv *harvest_list* %s"%listdir
+    mv_cmd = "mv %s*harvest_list* %s"%(final_results_filename[:-len(".root")], listdir)
     subprocess.call(mv_cmd, shell=True)
     #mv_cmd = "mv *tree_description* %s"%listdir
     #subprocess.call(mv_cmd, shell=True)
     return listdir
 
-def humanize_list_files(listdir) :
+def write_limit_result_lines(ofile, signal_points) :
+    '''
+    Write one limit results line per signal point (harvest list
+    record), converting the CLs columns of all of the points
+    into significances in one go
+    '''
+    sigmas = {}
+    for key in ['CLs', 'CLsexp', 'clsu1s', 'clsd1s'] :
+        sigmas[key] = get_sigma_from_pvalues([float(signal_point[key]) for signal_point in signal_points])
+
+    for i, signal_point in enumerate(signal_points) :
+        mx          = str(signal_point['mC1'])
+        my          = str(signal_point['mN1'])
+        cls         = str(signal_point['CLs'])
+        clsexp      = str(signal_point['CLsexp'])
+        clsexp_u1s  = str(signal_point['clsu1s'])
+        clsexp_d1s  = str(signal_point['clsd1s'])
+
+        obsSig = "%.2f"%sigmas['CLs'][i]
+        expSig = "%.2f"%sigmas['CLsexp'][i]
+        expSigUp1s = "%.2f"%sigmas['clsu1s'][i]
+        expSigDn1s = "%.2f"%sigmas['clsd1s'][i]
+
+        out_line = "%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n"%(mx, my, cls, clsexp, clsexp_u1s, clsexp_d1s, obsSig, expSig, expSigUp1s, expSigDn1s)  
+        ofile.write(out_line)
+
+def get_limit_results_name() :
+    '''
+    Return the name of the limit results file for the requested
+    region, channel, grid, and signal uncertainty (syst), creating
+    its directory if needed
+    '''
+    limit_result_dir = "./limit_results_Apr6/%s_%s_%s/"%(region, channel, grid)
+    mk_limresult = "mkdir -p %s"%(limit_result_dir)
+    subprocess.call(mk_limresult, shell=True)
+    out_result = "%s%s_%s_%s_%s_limit_results.txt"%(limit_result_dir, region, channel, grid, syst)
+    #out_result = "%s%s_%s_%s_limit_results.txt"%(limit_result_dir, region, channel, grid, syst)
+    return out_result
+
+@instrumented()
+def humanize_list_files(listdir, stream=False, batch_size=10000, final_results_filename=None, out_result=None) :
     '''
     From the produced harvest list json file make a
     more readable limit results file that will
@@ -131,76 +214,274 @@ def humanize_list_files(listdir) :
         - expected CLs +1 sigma - significance  : StatTools::GetSigma(clsu1s)
         - expected CLs -1 sigma                 : clsd1s
         - expected CLs -1 sigma - significance  : StatTools::GetSigma(clsd1s)
+
+    (the significances are computed with stat_tools.get_sigma_from_pvalues,
+    which follows StatTools::GetSigma)
+
+    With stream the harvest list is parsed one signal point at a
+    time and converted/written in batches of batch_size points, so
+    that the memory used does not grow with the size of the list.
+    The output is the same in both modes.
+
+    By default the harvest list of the get_final_name file is
+    written to the get_limit_results_name file.
     '''
 
 
-    in_list = "%stest_%s_%s_%s_Output_fixSigXSec%s_hypotest__1_harvest_list.json"%(listdir, region, channel, grid, syst)
+    if final_results_filename is None : final_results_filename = get_final_name()
+    in_list = "%s%s__1_harvest_list.json"%(listdir, final_results_filename[:-len(".root")])
+    #in_list = "%stest_%s_%s_%s_Output_fixSigXSec%s_hypotest__1_harvest_list.json"%(listdir, region, channel, grid, syst)
     #in_list = "%stest_%s_%s_%s_%s_Output_hypotest__1_harvest_list.json"%(listdir, region, channel, grid, syst)
-    limit_result_dir = "./limit_results_Apr6/%s_%s_%s/"%(region, channel, grid)
-    mk_limresult = "mkdir -p %s"%(limit_result_dir)
-    subprocess.call(mk_limresult, shell=True)
-    out_result = "%s%s_%s_%s_%s_limit_results.txt"%(limit_result_dir, region, channel, grid, syst)
-    #out_result = "%s%s_%s_%s_limit_results.txt"%(limit_result_dir, region, channel, grid, syst)
+    if out_result is None : out_result = get_limit_results_name()
 
     outfile_template = "mX\tmY\tCLs\tCLsexp\tclsu1s\tclsd1s\tObsSig\tExpSig\tExpSigUp1s\tExpSigDn1s\n"
 
-    ofile = open(out_result, "w")
+    ofile = open(out_result, "w", 1<<20)
     ofile.write(outfile_template)
 
     with open(in_list) as data_file :
-       data = json.load(data_file)
-       for signal_point in data :
-           mx          = str(signal_point['mC1'])
-           my          = str(signal_point['mN1'])
-           cls         = str(signal_point['CLs'])
-           clsexp      = str(signal_point['CLsexp'])
-           clsexp_u1s  = str(signal_point['clsu1s'])
-           clsexp_d1s  = str(signal_point['clsd1s'])
-
-           obsSig = "%.2f"%ROOT.StatTools.GetSigma(float(cls))
-           expSig = "%.2f"%ROOT.StatTools.GetSigma(float(clsexp))
-           expSigUp1s = "%.2f"%ROOT.StatTools.GetSigma(float(clsexp_u1s))
-           expSigDn1s = "%.2f"%ROOT.StatTools.GetSigma(float(clsexp_d1s))
-
-           out_line = "%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n"%(mx, my, cls, clsexp, clsexp_u1s, clsexp_d1s, obsSig, expSig, expSigUp1s, expSigDn1s)  
-           ofile.write(out_line)
+        if stream :
+            for signal_points in iter_batches(iter_json_array(data_file), batch_size) :
+                write_limit_result_lines(ofile, signal_points)
+        else :
+            data = json.load(data_file)
+            write_limit_result_lines(ofile, data)
 
     print "Writing humanized limit results to %s"%out_result
-    ofile.closed
+    ofile.close()
 
-def gather_upperlimit_results() :
-    print "gatther_upperlimit_results    THIS METHOD IS NOT IMPLEMENTED YET"
+def get_manifest_name() :
+    '''
+    Return the name of the manifest of the workspace files already
+    harvested into the limit results file for the requested region,
+    channel, grid, and signal uncertainty (syst)
+    '''
+    return "./list_files/%s_%s_%s_%s/harvest_manifest.json"%(region, channel, grid, syst)
 
+def file_signature(filename) :
+    st = os.stat(filename)
+    return [st.st_size, st.st_mtime]
 
-###############################################################
-if __name__=="__main__" :
-    parser = argparse.ArgumentParser()
-    parser.add_argument("-r", "--region")
-    parser.add_argument("-c", "--channel")
-    parser.add_argument("-g", "--grid")
-    parser.add_argument("-s", "--syst", help="Up, Down, or Nominal")
-    parser.add_argument("-u", "--upperlimit", action="store_true", default = False)
-    parser.add_argument("-d", "--results_dir", required=True)
-    args = parser.parse_args()
+def load_manifest(manifest_name) :
+    '''
+    Return { workspace file : [size, mtime] } of the files already
+    harvested (empty if there is no manifest yet)
+    '''
+    if not os.path.isfile(manifest_name) : return {}
+    with open(manifest_name) as manifest_file :
+        return json.load(manifest_file)
 
-    global region, channel, grid, syst, upperlimit, results_dir
-    region = args.region
-    channel = args.channel
-    grid = args.grid
-    syst = args.syst
-    upperlimit = args.upperlimit
-    results_dir = args.results_dir
-    
+def get_manifest(files) :
+    '''
+    { workspace file : [size, mtime] } of the files, to be taken
+    before they are harvested so that a file changed meanwhile is
+    harvested again on the next --incremental run
+    '''
+    return dict((f, file_signature(f)) for f in files)
 
-    # check that the results directory exists
-    if not os.path.isdir(args.results_dir) :
-        print "ERROR    Results directory (%s) does not exits. Exiting."%args.results_dir
+@instrumented()
+def save_manifest(manifest_name, manifest) :
+    with atomic_write(manifest_name) as manifest_file :
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+    print "save_manifest    %d workspace files recorded in %s"%(len(manifest), manifest_name)
+
+@instrumented()
+def merge_limit_results(out_result, delta_result) :
+    '''
+    Merge the lines of the delta limit results file into the limit
+    results file: points already present are replaced in place and
+    new points are appended
+    '''
+    def point(line) :
+        cols = line.split()
+        return (float(cols[0]), float(cols[1]))
+
+    lines = open(out_result).readlines()
+    header, lines = lines[0], [l for l in lines[1:] if l.strip()]
+    delta = [l for l in open(delta_result).readlines()[1:] if l.strip()]
+
+    index = dict((point(l), i) for i, l in enumerate(lines))
+    n_replaced, n_added = 0, 0
+    for line in delta :
+        key = point(line)
+        if key in index :
+            lines[index[key]] = line
+            n_replaced += 1
+        else :
+            index[key] = len(lines)
+            lines.append(line)
+            n_added += 1
+
+    with atomic_write(out_result) as ofile :
+        ofile.write(header)
+        ofile.writelines(lines)
+    print "merge_limit_results    %s : %d points updated, %d points added"%(out_result, n_replaced, n_added)
+
+@instrumented()
+def incremental_harvest(stream=False, batch_size=10000) :
+    '''
+    Harvest only the workspace files that are new or changed (size
+    or mtime) with respect to the manifest of the already harvested
+    files, and merge their results into the existing limit results
+    file. Falls back to the full hadd/harvest/humanize chain if
+    there are no previous results.
+    '''
+    manifest_name = get_manifest_name()
+    manifest = load_manifest(manifest_name)
+    out_result = get_limit_results_name()
+    inputs = get_workspace_files()
+    harvested = get_manifest(inputs)
+
+    if not manifest or not os.path.isfile(out_result) :
+        print "incremental_harvest    no previous results for %s, harvesting all %d files"%(out_result, len(inputs))
+        hadd_workspace_files(inputs)
+        make_harvest_list_files()
+        list_file_dir = move_list_files()
+        humanize_list_files(list_file_dir, stream=stream, batch_size=batch_size)
+        save_manifest(manifest_name, harvested)
+        return
+
+    changed = [f for f in inputs if manifest.get(f) != harvested[f]]
+    if not changed :
+        print "incremental_harvest    all %d workspace files already harvested into %s"%(len(inputs), out_result)
+        return
+    print "incremental_harvest    harvesting %d new or changed workspace files (of %d)"%(len(changed), len(inputs))
+
+    delta_name = get_final_name().replace(".root", "_delta.root")
+    delta_result = out_result.replace(".txt", ".delta.txt")
+    hadd_workspace_files(changed, delta_name)
+    make_harvest_list_files(delta_name)
+    list_file_dir = move_list_files(delta_name)
+    humanize_list_files(list_file_dir, stream=stream, batch_size=batch_size, final_results_filename=delta_name, out_result=delta_result)
+    merge_limit_results(out_result, delta_result)
+    os.remove(delta_result)
+    os.remove("%s%s"%(results_dir, delta_name))
+    save_manifest(manifest_name, harvested)
+
+def get_upperlimit_logs() :
+    '''
+    Return the per-point mu_SIG upper limit logs for the requested
+    region, channel, and grid (user-provided: log_dir, ul_suffix)
+    '''
+    return sorted(glob.glob("%s%s_%s_%s*%s"%(log_dir, region, channel, grid, ul_suffix)))
+
+def get_upperlimit_results_name() :
+    '''
+    Return the name of the upper limit results file for the requested
+    region, channel, and grid, next to the limit results files (the
+    upper limits do not depend on the signal uncertainty)
+    '''
+    limit_result_dir = os.path.dirname(get_limit_results_name())
+    return "%s/%s_%s_%s_upperlimit_results.txt"%(limit_result_dir, region, channel, grid)
+
+def get_log_cache_name() :
+    '''
+    Return the name of the cache of the values already extracted
+    from the upper limit logs
+    '''
+    return "./list_files/%s_%s_%s/upperlimit_log_cache.json"%(region, channel, grid)
+
+def load_log_cache(cache_name) :
+    '''
+    Return { log : { "signature" : [size, mtime], "values" : { field : value } or None } }
+    of the logs already scanned (empty if there is no usable cache)
+    '''
+    if not os.path.isfile(cache_name) : return {}
+    try :
+        with open(cache_name) as cache_file :
+            return json.load(cache_file)
+    except ValueError, e :
+        print "load_log_cache    WARNING unable to read %s, all logs will be scanned (%s)"%(cache_name, e)
+        return {}
+
+def save_log_cache(cache_name, cache) :
+    with atomic_write(cache_name) as cache_file :
+        json.dump(cache, cache_file, indent=1, sort_keys=True)
+
+@instrumented()
+def gather_upperlimit_results(n_workers=1) :
+    '''
+    Scan the upper limit logs (see get_upperlimit_logs) for the
+    observed and expected (+-1 sigma) upper limits on mu_SIG of
+    each signal point and write them to the upper limit results
+    file (columns: log_tools.UPPERLIMIT_FIELDS).
+
+    The logs are read line by line by a pool of n_workers processes.
+    The values of each log are cached along with its size and mtime
+    (see get_log_cache_name) so that only new or changed logs are
+    read again on later calls.
+    '''
+    logs = get_upperlimit_logs()
+    if not logs :
+        print "gather_upperlimit_results    ERROR no logs found (%s%s_%s_%s*%s). Exiting."%(log_dir, region, channel, grid, ul_suffix)
         sys.exit()
-    if not results_dir.endswith("/") : results_dir += "/"
 
-    if not upperlimit :
+    cache_name = get_log_cache_name()
+    cache = load_log_cache(cache_name)
+    tasks = [(f, grid) for f in logs if f not in cache or cache[f]["signature"] != file_signature(f)]
+    print "gather_upperlimit_results    %d logs, %d new or changed"%(len(logs), len(tasks))
+
+    n_workers = max(1, min(int(n_workers), len(tasks)))
+    if n_workers > 1 :
+        pool = multiprocessing.Pool(n_workers)
+        try :
+            scanned = list(pool.imap_unordered(scan_upperlimit_log, tasks, chunksize=max(1, len(tasks) // (4 * n_workers))))
+        finally :
+            pool.close()
+            pool.join()
+    else :
+        scanned = [scan_upperlimit_log(task) for task in tasks]
+    for filename, signature, values in scanned :
+        if signature is None :
+            cache.pop(filename, None)
+            continue
+        cache[filename] = { "signature" : signature, "values" : values }
+
+    # forget the logs that are gone
+    cache = dict((f, cache[f]) for f in logs if f in cache)
+    save_log_cache(cache_name, cache)
+
+    points = {}
+    n_incomplete, n_duplicates = 0, 0
+    for f in logs :
+        values = cache[f]["values"] if f in cache else None
+        if values is None :
+            n_incomplete += 1
+            continue
+        key = (values["mX"], values["mY"])
+        if key in points : n_duplicates += 1
+        points[key] = values
+
+    out_result = get_upperlimit_results_name()
+    with atomic_write(out_result) as ofile :
+        ofile.write("\t".join(UPPERLIMIT_FIELDS) + "\n")
+        for key in sorted(points.keys()) :
+            ofile.write("\t".join(str(points[key][field]) for field in UPPERLIMIT_FIELDS) + "\n")
+
+    print "gather_upperlimit_results    %d points written to %s"%(len(points), out_result)
+    if n_incomplete :
+        print "gather_upperlimit_results    WARNING %d logs without (all of) the upper limits or a signal point in their name were ignored"%n_incomplete
+    if n_duplicates :
+        print "gather_upperlimit_results    WARNING %d signal points found in more than one log (last log used)"%n_duplicates
+
+
+def run_hypotest_chain(args) :
+    '''
+    hadd --> harvest --> humanize chain for the current region,
+    channel, grid, and signal uncertainty (syst)
+    '''
+    if args.incremental :
+        # only harvest what is new since the last run
+        incremental_harvest(stream=args.stream, batch_size=args.batch_size)
+
+    else :
+        # the files harvested, listed before the merge: files arriving
+        # later are left to the next (incremental) run
+        inputs = get_workspace_files()
+        harvested = get_manifest(inputs)
+
         # concatenate (hadd) all results
-        hadd_workspace_files()
+        hadd_workspace_files(inputs)
 
         # get the interprtation (sets axes on the TH2's and is based
         # on the workspace filename structure
@@ -221,11 +502,145 @@ if __name__=="__main__" :
 
         # produce human readable limit results
         #list_file_dir = "/data/uclhc/uci/user/dantrim/n0225val/limitplotter/list_files/SRwt_sfdf_bWN/"
-        humanize_list_files(list_file_dir)
+        humanize_list_files(list_file_dir, stream=args.stream, batch_size=args.batch_size)
 
+        # record what has been harvested for later --incremental runs
+        save_manifest(get_manifest_name(), harvested)
+
+def run_hypotest_job(job, args) :
+    '''
+    Run the chain for one (region, syst) in a worker process,
+    its exit code tells whether it succeeded
+    '''
+    global region, syst
+    region, syst = job
+    # only record this job's stages
+    instrumentation.reset()
+    ok = False
+    try :
+        run_hypotest_chain(args)
+        ok = True
+    except SystemExit :
+        pass
+    except Exception :
+        traceback.print_exc()
+    finish_instrumentation(args, "%s_%s"%job)
+    sys.stdout.flush()
+    os._exit(0 if ok else 1)
+
+def run_hypotest_jobs(jobs, args, n_jobs) :
+    '''
+    Run the chains of several (region, syst) in at most n_jobs
+    concurrent processes and print a summary at the end. Each
+    process loads ROOT and libSusyFitter.so only once, since
+    they are inherited from this process.
+    '''
+    load_susyfitter()
+    pending = list(jobs)
+    running = {}
+    results = []
+    while pending or running :
+        while pending and len(running) < n_jobs :
+            job = pending.pop(0)
+            proc = multiprocessing.Process(target=run_hypotest_job, args=(job, args))
+            proc.start()
+            running[proc] = (job, time.time())
+        for proc in list(running.keys()) :
+            if proc.is_alive() : continue
+            proc.join()
+            job, start = running.pop(proc)
+            results.append((job, proc.exitcode == 0, time.time() - start))
+        if running : time.sleep(0.2)
+
+    print 60*"="
+    print "  prepare_limit_results summary (%s, %s)"%(channel, grid)
+    print 60*"-"
+    for (reg, sys_), ok, elapsed in results :
+        print "  %-20s %-10s %-8s %8.1f s"%(reg, sys_, "OK" if ok else "FAILED", elapsed)
+    print 60*"="
+    return all(ok for job, ok, elapsed in results)
+
+def finish_instrumentation(args, job="") :
+    '''
+    Print/write the per-stage records if asked for (--timing, --trace).
+    The trace of a job run in its own process (see run_hypotest_job)
+    is written next to --trace, with the job appended to its name.
+    '''
+    title = "prepare_limit_results stage summary"
+    if job != "" : title += " (%s)"%job
+    if args.timing or args.profile != "" :
+        instrumentation.print_summary(title)
+    if args.trace != "" :
+        trace_name = args.trace
+        if job != "" : trace_name = "%s_%s%s"%(os.path.splitext(trace_name)[0], job, os.path.splitext(trace_name)[1])
+        instrumentation.write_trace(trace_name, region=region, channel=channel, grid=grid, syst=syst)
+
+###############################################################
+if __name__=="__main__" :
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--region", nargs="+", help="one or more regions")
+    parser.add_argument("-c", "--channel")
+    parser.add_argument("-g", "--grid")
+    parser.add_argument("-s", "--syst", nargs="+", help="one or more of Up, Down, or Nominal")
+    parser.add_argument("-j", "--jobs", type=int, default=3, help="maximum number of region/syst chains run concurrently")
+    parser.add_argument("-u", "--upperlimit", action="store_true", default = False)
+    parser.add_argument("-d", "--results_dir", required=True)
+    parser.add_argument("--merge_workers", type=int, default=1, help="number of processes merging the workspace files")
+    parser.add_argument("--merge_fan_in", type=int, default=16, help="maximum number of files merged at once")
+    parser.add_argument("-i", "--incremental", action="store_true", default=False, help="only harvest new or changed workspace files")
+    parser.add_argument("--stream", action="store_true", default=False, help="stream the harvest list instead of loading it at once")
+    parser.add_argument("--batch_size", type=int, default=10000, help="number of signal points converted at a time with --stream")
+    parser.add_argument("--log_dir", default="", help="directory of the upper limit logs (with -u)")
+    parser.add_argument("--ul_suffix", default="_limitOnMu.log", help="filename suffix of the upper limit logs")
+    parser.add_argument("--log_workers", type=int, default=4, help="number of processes reading the upper limit logs")
+    parser.add_argument("--timing", action="store_true", default=False, help="print the wall/CPU time and peak memory of each stage")
+    parser.add_argument("--trace", default="", help="write the per-stage timing/memory records to this JSON file")
+    parser.add_argument("--profile", default="", help="comma-separated stages to run under cProfile (statistics in ./profiles/)")
+    args = parser.parse_args()
+
+    global region, channel, grid, syst, upperlimit, results_dir, merge_workers, merge_fan_in, log_dir, ul_suffix
+    region = args.region[0] if args.region else None
+    channel = args.channel
+    grid = args.grid
+    syst = args.syst[0] if args.syst else None
+    upperlimit = args.upperlimit
+    results_dir = args.results_dir
+    merge_workers = args.merge_workers
+    merge_fan_in = args.merge_fan_in
+    log_dir = args.log_dir
+    ul_suffix = args.ul_suffix
+
+    if args.timing or args.trace != "" or args.profile != "" :
+        instrumentation.enable(profile_stages=[s for s in args.profile.split(",") if s])
+    
+
+    # check that the results directory exists
+    if not os.path.isdir(args.results_dir) :
+        print "ERROR    Results directory (%s) does not exits. Exiting."%args.results_dir
+        sys.exit()
+    if not results_dir.endswith("/") : results_dir += "/"
+    if upperlimit :
+        if not os.path.isdir(log_dir) :
+            print "ERROR    Upper limit log directory (--log_dir %s) does not exist. Exiting."%log_dir
+            sys.exit()
+        if not log_dir.endswith("/") : log_dir += "/"
+
+    jobs = [(reg, sys_) for reg in (args.region or [None]) for sys_ in (args.syst or [None])]
+
+    if not upperlimit and len(jobs) == 1 :
+        run_hypotest_chain(args)
+
+    elif not upperlimit :
+        # several regions/systematics: run their chains concurrently
+        if not run_hypotest_jobs(jobs, args, max(1, args.jobs)) :
+            sys.exit(1)
 
     if upperlimit :
         # gatter the upper limit on mu_SIG results
         # this does scan of the logs that were made
         # when running the limit on the workspace
-        gather_upperlimit_results()
+        # (once per region, the upper limits do not depend on syst)
+        for region in (args.region or [None]) :
+            gather_upperlimit_results(n_workers=args.log_workers)
+
+    finish_instrumentation(args)
@@ -0,0 +1,89 @@
+#
+# tests of the ROOT-free contour engine
+#
+# run from the directory above the limitplotter checkout with
+#   LIMPLOTDIR=$PWD python -m unittest discover -s limitplotter/tests -t .
+#
+
+import os
+import sys
+import unittest
+sys.path.append(os.environ['LIMPLOTDIR'])
+
+import numpy as np
+
+#limitplotter
+from limitplotter.utils.contour_engine import delaunay_triangulation, circumcircles, \
+        interpolation_weights, bin_centers, interpolate
+
+def convex_hull(x, y) :
+    '''
+    (x, y) of the convex hull vertices, counter-clockwise
+    (monotone chain, collinear points excluded)
+    '''
+    points = sorted(zip(x.tolist(), y.tolist()))
+    def cross(o, a, b) :
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+    def half(points) :
+        chain = []
+        for p in points :
+            while len(chain) >= 2 and cross(chain[-2], chain[-1], p) <= 0 : chain.pop()
+            chain.append(p)
+        return chain[:-1]
+    return np.array(half(points) + half(points[::-1]))
+
+def triangle_areas(x, y, tris) :
+    ax, ay = x[tris[:, 0]], y[tris[:, 0]]
+    return 0.5 * np.abs((x[tris[:, 1]] - ax) * (y[tris[:, 2]] - ay) - (y[tris[:, 1]] - ay) * (x[tris[:, 2]] - ax))
+
+def bwn_like_grid() :
+    '''
+    (m_stop, m_lsp) grid along the diagonal, denser near it, as the bWN grids
+    '''
+    x, y = [], []
+    for mx in range(200, 700, 10) :
+        for dm in range(80, 180, 10) + range(180, mx, 50) :
+            x.append(mx)
+            y.append(mx - dm)
+    return np.array(x, dtype=np.float64), np.array(y, dtype=np.float64)
+
+class TestTriangulation(unittest.TestCase) :
+
+    def test_irregular_grid(self) :
+        rs = np.random.RandomState(42)
+        x, y = rs.uniform(0, 1, 500), rs.uniform(0, 1, 500)
+        # already in the unit square, where the in-circle tests are made
+        x = (x - x.min()) / (x.max() - x.min())
+        y = (y - y.min()) / (y.max() - y.min())
+        tris = delaunay_triangulation(x, y)
+        self.assertEqual(tris.shape[0], 2 * x.shape[0] - convex_hull(x, y).shape[0] - 2)
+        ux, uy, r2 = circumcircles(x, y, tris)
+        d2 = (ux[:, None] - x[None, :]) ** 2 + (uy[:, None] - y[None, :]) ** 2
+        self.assertFalse((d2 < r2[:, None] * (1 - 1e-6)).any())
+
+    def test_bwn_like_grid(self) :
+        # the triangles cover the whole convex hull, flat ones along its edges included
+        x, y = bwn_like_grid()
+        tris = delaunay_triangulation(x, y)
+        hull = convex_hull(x, y)
+        hx, hy = hull[:, 0], hull[:, 1]
+        hull_area = 0.5 * (hx * np.roll(hy, -1) - np.roll(hx, -1) * hy).sum()
+        self.assertAlmostEqual(triangle_areas(x, y, tris).sum(), hull_area, places=3)
+
+    def test_hull_nodes_interpolated(self) :
+        # a linear surface is interpolated exactly everywhere inside the hull
+        x, y = bwn_like_grid()
+        tris = delaunay_triangulation(x, y)
+        xc, yc = bin_centers(100, 195, 705), bin_centers(100, 0, 700)
+        vertices, weights = interpolation_weights(x, y, tris, xc, yc)
+        h = interpolate(2.0 * x - y + 1000.0, vertices, weights)
+        gx, gy = np.meshgrid(xc, yc)
+        hull = convex_hull(x, y)
+        inside = np.ones(gx.shape, dtype=bool)
+        for (ax, ay), (bx, by) in zip(hull, np.roll(hull, -1, axis=0)) :
+            inside &= (bx - ax) * (gy - ay) - (by - ay) * (gx - ax) > 1e-6
+        self.assertTrue(inside.sum() > 1000)
+        self.assertTrue(np.allclose(h[inside], (2.0 * gx - gy + 1000.0)[inside]))
+
+if __name__ == "__main__" :
+    unittest.main()
@@ -0,0 +1,44 @@
+#
+# tests of the Signal accessors of the SignalGrid
+#
+# run from the directory above the limitplotter checkout with
+#   LIMPLOTDIR=$PWD python -m unittest discover -s limitplotter/tests -t .
+#
+
+import os
+import sys
+import unittest
+sys.path.append(os.environ['LIMPLOTDIR'])
+
+#limitplotter
+from limitplotter.utils.signal_grid import SignalGrid
+from limitplotter.utils.limiters import Signal
+
+class TestSignal(unittest.TestCase) :
+
+    def setUp(self) :
+        self.grid = SignalGrid([300., 400., 500.], [100., 200., 300.], ["SRA", "SRB"])
+
+    def test_best_value_setter(self) :
+        signal = Signal(self.grid, 1)
+        self.assertTrue(self.grid.missing["bestExpectedSig"][1])
+        signal.bestExpectedSig = 2.5
+        self.assertEqual(self.grid.bestExpectedSig[1], 2.5)
+        self.assertFalse(self.grid.missing["bestExpectedSig"][1])
+        self.assertTrue(self.grid.missing["bestExpectedSig"][0])
+        self.assertEqual(Signal(self.grid, 1).bestExpectedSig, 2.5)
+
+    def test_region_value_setter(self) :
+        signal = Signal(self.grid, 2)
+        signal.expectedSig["SRA"] = 1.0
+        signal.expectedSig["SRB"] = 3.0
+        self.assertEqual(self.grid.values("expectedSig", "SRB")[2], 3.0)
+        self.assertEqual(signal.expectedSig.keys(), ["SRA", "SRB"])
+        self.assertEqual(self.grid.find_best_regions("expectedSig"), 1)
+        self.assertEqual(signal.bestRegion, "SRB")
+        self.assertEqual(signal.bestExpectedSig, 3.0)
+        self.assertFalse(self.grid.missing["bestExpectedSig"][2])
+        self.assertEqual(self.grid.best_region_counts(), { "SRA" : 0, "SRB" : 1 })
+
+if __name__ == "__main__" :
+    unittest.main()
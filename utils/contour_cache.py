@@ -0,0 +1,94 @@
+#
+# on-disk cache of the 95% CL contour points
+#
+
+import os
+import sys
+import hashlib
+sys.path.append(os.environ['LIMPLOTDIR'])
+
+import numpy as np
+
+#limitplotter
+from limitplotter.utils.file_tools import atomic_write
+
+def contour_key(x, y, z, binning, smoothing, level, engine) :
+    '''
+    Hash of everything a contour depends on: the grid points (x, y),
+    the z-field values, the interpolation binning, the smoothing
+    settings, the CL level and the contour engine
+    '''
+    h = hashlib.sha1()
+    for a in [x, y, z] :
+        a = np.ascontiguousarray(a, dtype=np.float64)
+        h.update(str(a.shape[0]).encode("ascii"))
+        h.update(a.tobytes())
+    h.update(repr((tuple(binning), smoothing, float(level), engine)).encode("ascii"))
+    return h.hexdigest()
+
+class ContourCache() :
+    '''
+    Contour points stored by key (see contour_key) in a single
+    compressed .npz file. Each entry is either the (x, y) arrays of
+    a contour or None (no contour at that level). Only the entries
+    used in this session plus the most recent max_entries older ones
+    are kept when saving.
+    '''
+    def __init__(self, filename, max_entries=64) :
+        self.filename = filename
+        self.max_entries = max_entries
+        self.entries = {}   # key : (x, y) or None
+        self.order = []     # keys, least recently used first
+        self.used = set()
+        self.dirty = False
+        self.load()
+
+    def load(self) :
+        if not os.path.isfile(self.filename) : return
+        try :
+            with np.load(self.filename) as cache :
+                self.order = [str(k) for k in cache["order"]]
+                for key in self.order :
+                    if ("%s_none"%key) in cache.files :
+                        self.entries[key] = None
+                    else :
+                        self.entries[key] = (cache["%s_x"%key], cache["%s_y"%key])
+        except Exception, e :
+            print "ContourCache    WARNING unable to read %s (%s), starting a new cache"%(self.filename, e)
+            self.entries, self.order = {}, []
+
+    def get(self, key) :
+        '''
+        Returns (found, points) where points is (x, y) or None
+        '''
+        if key not in self.entries : return False, None
+        self.touch(key)
+        return True, self.entries[key]
+
+    def put(self, key, points) :
+        self.entries[key] = points
+        self.touch(key)
+        self.dirty = True
+
+    def touch(self, key) :
+        if key in self.order : self.order.remove(key)
+        self.order.append(key)
+        self.used.add(key)
+
+    def save(self) :
+        if not self.dirty : return
+        old = [k for k in self.order if k not in self.used]
+        keep = old[max(0, len(old) - self.max_entries):] + [k for k in self.order if k in self.used]
+        arrays = { "order" : np.array(keep) }
+        for key in keep :
+            points = self.entries[key]
+            if points is None :
+                arrays["%s_none"%key] = np.zeros(0)
+            else :
+                arrays["%s_x"%key], arrays["%s_y"%key] = points
+        try :
+            with atomic_write(self.filename, "wb") as tmp :
+                np.savez_compressed(tmp, **arrays)
+            self.dirty = False
+        except (IOError, OSError), e :
+            print "ContourCache    WARNING unable to write %s (%s)"%(self.filename, e)
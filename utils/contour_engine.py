@@ -0,0 +1,404 @@
+#
+# ROOT-free extraction of the contours of a significance surface
+# sampled on the (irregular) signal grid:
+#   Delaunay triangulation --> linear interpolation on a regular
+#   grid --> TH2::Smooth-like smoothing --> marching squares
+#
+# Mirrors what make_contour does with TGraph2D, TH2F::Smooth and
+# Draw("CONT LIST"), but works only on NumPy arrays.
+#
+
+import os
+import sys
+sys.path.append(os.environ['LIMPLOTDIR'])
+
+import numpy as np
+
+#limitplotter
+from limitplotter.utils.stat_tools import norm_quantile
+
+# TH2::Smooth default kernel ("k5a")
+K5A = np.array([[0, 0, 1, 0, 0],
+                [0, 2, 2, 2, 0],
+                [1, 2, 5, 2, 1],
+                [0, 2, 2, 2, 0],
+                [0, 0, 1, 0, 0]], dtype=np.float64)
+
+''' ---------------------- '''
+'''     Triangulation      '''
+''' ---------------------- '''
+def circumcircles(px, py, tris) :
+    '''
+    Centers and squared radii of the circumcircles of the triangles
+    (n, 3) whose vertices are in px, py
+    '''
+    ax, ay = px[tris[:, 0]], py[tris[:, 0]]
+    bx, by = px[tris[:, 1]], py[tris[:, 1]]
+    cx, cy = px[tris[:, 2]], py[tris[:, 2]]
+    d = 2.0 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+    a2, b2, c2 = ax * ax + ay * ay, bx * bx + by * by, cx * cx + cy * cy
+    ux = (a2 * (by - cy) + b2 * (cy - ay) + c2 * (ay - by)) / d
+    uy = (a2 * (cx - bx) + b2 * (ax - cx) + c2 * (bx - ax)) / d
+    return ux, uy, (ax - ux) ** 2 + (ay - uy) ** 2
+
+def orientation(px, py, a, b, c) :
+    '''
+    Twice the signed area of the triangles (a, b, c): > 0 if
+    counter-clockwise, < 0 if clockwise
+    '''
+    return (px[b] - px[a]) * (py[c] - py[a]) - (py[b] - py[a]) * (px[c] - px[a])
+
+def in_circumcircle(px, py, tris, ip) :
+    '''
+    Whether the point ip lies inside the circumcircles of the
+    counter-clockwise triangles (n, 3), from the in-circle determinant:
+    slower than comparing to the circle center and radius, but
+    stable for the flat triangles found along the edges of regular grids
+    '''
+    adx, ady = px[tris[:, 0]] - px[ip], py[tris[:, 0]] - py[ip]
+    bdx, bdy = px[tris[:, 1]] - px[ip], py[tris[:, 1]] - py[ip]
+    cdx, cdy = px[tris[:, 2]] - px[ip], py[tris[:, 2]] - py[ip]
+    det = ((adx * adx + ady * ady) * (bdx * cdy - cdx * bdy) +
+           (bdx * bdx + bdy * bdy) * (cdx * ady - adx * cdy) +
+           (cdx * cdx + cdy * cdy) * (adx * bdy - bdx * ady))
+    return det > 0
+
+def delaunay_triangulation(x, y) :
+    '''
+    Delaunay triangulation (Bowyer-Watson) of the points x, y.
+    As TGraphDelaunay does, the coordinates are first scaled
+    to the unit square so that both axes weigh the same.
+    Returns an (n_triangles, 3) array of indices into x, y,
+    covering the whole convex hull (2n - h - 2 triangles for
+    h points on the hull). Duplicate points must be removed
+    beforehand.
+
+    Instead of a finite super-triangle, whose vertices fall inside
+    the (very large) circumcircles of the flat triangles along the
+    hull and so lose them, the hull edges are closed by "ghost"
+    triangles sharing a vertex at infinity: a point is in conflict
+    with a ghost triangle when it lies outside of its hull edge.
+
+    Each insertion tests every triangle, so the cost grows as n^2:
+    about 1 s for 3k points and 8 s for 10k; 100k points are out of
+    reach, grids that large should go through TGraph2D.
+    '''
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = x.shape[0]
+    if n < 3 : return np.zeros((0, 3), dtype=np.int64)
+
+    xs = (x - x.min()) / max(x.max() - x.min(), 1e-300)
+    ys = (y - y.min()) / max(y.max() - y.min(), 1e-300)
+    # break the exact co-circularity (and collinearity) of regular grids so
+    # that the in-circle tests are never ambiguous (fixed seed: reproducible)
+    jitter = np.random.RandomState(1234).uniform(-1e-9, 1e-9, size=(2, n))
+    px = np.concatenate([xs + jitter[0], [0.0]])
+    py = np.concatenate([ys + jitter[1], [0.0]])
+    ghost = n   # the vertex at infinity, its coordinates are never used
+
+    # first triangle: points 0, 1 and the point farthest from their line
+    area = orientation(px, py, np.zeros(n, dtype=np.int64), np.ones(n, dtype=np.int64), np.arange(n))
+    third = int(np.argmax(np.abs(area)))
+    if area[third] == 0 : return np.zeros((0, 3), dtype=np.int64)
+    a, b, c = (0, 1, third) if area[third] > 0 else (1, 0, third)
+    # all triangles counter-clockwise, ghost vertex last: (a, b, ghost) closes
+    # the hull edge a -> b, the outside of the hull being on its left
+    tris = np.array([[a, b, c], [b, a, ghost], [c, b, ghost], [a, c, ghost]], dtype=np.int64)
+    is_ghost = tris[:, 2] == ghost
+    ux, uy, r2 = circumcircles(px, py, tris[:1])
+    ux, uy, r2 = np.resize(ux, 4), np.resize(uy, 4), np.concatenate([r2, -np.ones(3)])
+    # flat triangles (circumcircle larger than the unit square) and
+    # ghost triangles are tested exactly, see in_circumcircle
+    flat = r2 > 1.0
+
+    order = [i for i in range(n) if i not in (a, b, c)]
+    settings = np.seterr(divide="ignore", invalid="ignore")
+    for ip in order :
+        bad = (ux - px[ip]) ** 2 + (uy - py[ip]) ** 2 < r2
+        iflat, ighost = np.nonzero(flat)[0], np.nonzero(is_ghost)[0]
+        bad[iflat] = in_circumcircle(px, py, tris[iflat], ip)
+        bad[ighost] = orientation(px, py, tris[ighost, 0], tris[ighost, 1], ip) > 0
+        # the cavity boundary: edges of the bad triangles not shared by two of them
+        edges = tris[bad][:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+        keys = np.sort(edges, axis=1)
+        keys = keys[:, 0] * (n + 1) + keys[:, 1]
+        uniq, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        boundary = edges[counts[inverse] == 1]
+        new_tris = np.column_stack([boundary, np.full(boundary.shape[0], ip, dtype=np.int64)])
+        # keep the ghost vertex last: (a, ghost, p) -> (p, a, ghost), (ghost, b, p) -> (b, p, ghost)
+        new_tris[new_tris[:, 1] == ghost] = new_tris[new_tris[:, 1] == ghost][:, [2, 0, 1]]
+        new_tris[new_tris[:, 0] == ghost] = new_tris[new_tris[:, 0] == ghost][:, [1, 2, 0]]
+        new_ghost = new_tris[:, 2] == ghost
+        nux, nuy, nr2 = np.zeros(new_tris.shape[0]), np.zeros(new_tris.shape[0]), -np.ones(new_tris.shape[0])
+        nux[~new_ghost], nuy[~new_ghost], nr2[~new_ghost] = circumcircles(px, py, new_tris[~new_ghost])
+        keep = ~bad
+        tris = np.concatenate([tris[keep], new_tris])
+        is_ghost = np.concatenate([is_ghost[keep], new_ghost])
+        flat = np.concatenate([flat[keep], ~new_ghost & ~(nr2 <= 1.0)])
+        ux = np.concatenate([ux[keep], nux])
+        uy = np.concatenate([uy[keep], nuy])
+        r2 = np.concatenate([r2[keep], nr2])
+    np.seterr(**settings)
+
+    return tris[~is_ghost]
+
+''' ---------------------- '''
+'''     Interpolation      '''
+''' ---------------------- '''
+def bin_centers(nbins, low, high) :
+    width = (high - low) / float(nbins)
+    return low + (np.arange(nbins) + 0.5) * width
+
+def interpolation_weights(x, y, tris, xc, yc, chunk_size=1 << 21) :
+    '''
+    For every node of the regular grid xc (nx,) x yc (ny,), find the
+    triangle that contains it and its barycentric weights.
+    Returns (vertices, weights), both (ny, nx, 3); nodes outside of
+    the triangulation have all weights 0 (the TGraph2D convention
+    of interpolating to 0 outside of the convex hull).
+    The (triangle, node) candidates, the nodes in the bounding box
+    of each triangle, are tested in blocks of about chunk_size.
+    '''
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    nx, ny = xc.shape[0], yc.shape[0]
+    vertices = np.zeros((ny * nx, 3), dtype=np.int64)
+    weights = np.zeros((ny * nx, 3), dtype=np.float64)
+    found = np.zeros(ny * nx, dtype=bool)
+    eps = 1e-10
+    if tris.shape[0] == 0 : return vertices.reshape(ny, nx, 3), weights.reshape(ny, nx, 3)
+
+    tx, ty = x[tris], y[tris]
+    ix0 = np.searchsorted(xc, tx.min(axis=1), side="left")
+    ix1 = np.searchsorted(xc, tx.max(axis=1), side="right")
+    iy0 = np.searchsorted(yc, ty.min(axis=1), side="left")
+    iy1 = np.searchsorted(yc, ty.max(axis=1), side="right")
+    det = (ty[:, 1] - ty[:, 2]) * (tx[:, 0] - tx[:, 2]) + (tx[:, 2] - tx[:, 1]) * (ty[:, 0] - ty[:, 2])
+    width = np.maximum(ix1 - ix0, 0)
+    counts = width * np.maximum(iy1 - iy0, 0)
+    counts[det == 0] = 0
+
+    # the earliest triangle containing a node wins, as blocks and candidates follow the triangle order
+    block = np.cumsum(counts) // chunk_size
+    for ib in np.unique(block[counts > 0]).tolist() :
+        itri = np.nonzero((block == ib) & (counts > 0))[0]
+        t = np.repeat(itri, counts[itri])
+        starts = np.cumsum(counts[itri]) - counts[itri]
+        k = np.arange(t.shape[0]) - np.repeat(starts, counts[itri])
+        gi = ix0[t] + k % width[t]
+        gj = iy0[t] + k // width[t]
+        gx, gy = xc[gi], yc[gj]
+        w0 = ((ty[t, 1] - ty[t, 2]) * (gx - tx[t, 2]) + (tx[t, 2] - tx[t, 1]) * (gy - ty[t, 2])) / det[t]
+        w1 = ((ty[t, 2] - ty[t, 0]) * (gx - tx[t, 2]) + (tx[t, 0] - tx[t, 2]) * (gy - ty[t, 2])) / det[t]
+        w2 = 1.0 - w0 - w1
+        node = gj * nx + gi
+        inside = np.nonzero((w0 >= -eps) & (w1 >= -eps) & (w2 >= -eps) & ~found[node])[0]
+        nodes, first = np.unique(node[inside], return_index=True)
+        inside = inside[first]
+        vertices[nodes] = tris[t[inside]]
+        weights[nodes] = np.column_stack([w0[inside], w1[inside], w2[inside]])
+        found[nodes] = True
+
+    return vertices.reshape(ny, nx, 3), weights.reshape(ny, nx, 3)
+
+def interpolate(z, vertices, weights) :
+    '''
+    Interpolate the values z at the grid points onto the regular
+    grid described by (vertices, weights) (see interpolation_weights)
+    '''
+    z = np.asarray(z, dtype=np.float64)
+    return (z[vertices] * weights).sum(axis=-1)
+
+''' ---------------------- '''
+'''       Smoothing        '''
+''' ---------------------- '''
+def smooth(h, kernel=K5A) :
+    '''
+    Smooth the (..., ny, nx) array h as TH2::Smooth does: each bin is
+    replaced by the kernel-weighted mean of its neighbours, with
+    the weights normalized to the neighbours inside the histogram
+    '''
+    ky, kx = kernel.shape
+    py, px = ky // 2, kx // 2
+    ny, nx = h.shape[-2:]
+    pad = [(0, 0)] * (h.ndim - 2) + [(py, py), (px, px)]
+    padded = np.pad(h.astype(np.float64), pad, mode="constant")
+    inside = np.pad(np.ones((ny, nx), dtype=np.float64), [(py, py), (px, px)], mode="constant")
+    content = np.zeros(h.shape, dtype=np.float64)
+    norm = np.zeros((ny, nx), dtype=np.float64)
+    for j in range(ky) :
+        for i in range(kx) :
+            k = kernel[j, i]
+            if k == 0 : continue
+            content += k * padded[..., j:j + ny, i:i + nx]
+            norm += k * inside[j:j + ny, i:i + nx]
+    return content / norm
+
+''' ---------------------- '''
+'''    Marching squares    '''
+''' ---------------------- '''
+
+# cell corners: 1 = bottom-left, 2 = bottom-right, 4 = top-right, 8 = top-left
+# cell edges:   0 = bottom, 1 = right, 2 = top, 3 = left
+# segments (pairs of crossed edges) per cell case, saddles (5, 10) are
+# resolved by the value at the cell center, see marching_squares
+CASE_SEGMENTS = {
+     1 : [(3, 0)],   2 : [(0, 1)],   3 : [(3, 1)],   4 : [(1, 2)],
+     6 : [(0, 2)],   7 : [(3, 2)],   8 : [(2, 3)],   9 : [(0, 2)],
+    11 : [(1, 2)],  12 : [(3, 1)],  13 : [(0, 1)],  14 : [(3, 0)],
+}
+SADDLE_SEGMENTS = {
+    # (case, center above level) : segments
+    (5, True)   : [(0, 1), (2, 3)],
+    (5, False)  : [(3, 0), (1, 2)],
+    (10, True)  : [(3, 0), (1, 2)],
+    (10, False) : [(0, 1), (2, 3)],
+}
+
+def marching_squares(h, xc, yc, level) :
+    '''
+    Find the iso-lines of the (ny, nx) array h, sampled at xc (nx,)
+    and yc (ny,), at 'level'. Returns a list of (x, y) arrays, one
+    per connected line, longest first.
+    '''
+    ny, nx = h.shape
+    if nx < 2 or ny < 2 : return []
+    above = h > level
+    case = (above[:-1, :-1] * 1 + above[:-1, 1:] * 2 +
+            above[1:, 1:] * 4 + above[1:, :-1] * 8)
+    n_h = ny * (nx - 1)     # horizontal edges, id = j * (nx-1) + i
+    def edge_id(j, i, edge) :
+        if edge == 0 : return j * (nx - 1) + i
+        if edge == 2 : return (j + 1) * (nx - 1) + i
+        if edge == 3 : return n_h + j * nx + i
+        return n_h + j * nx + i + 1
+
+    # segments as pairs of edge ids
+    segments = []
+    cj, ci = np.nonzero((case != 0) & (case != 15))
+    for j, i in zip(cj.tolist(), ci.tolist()) :
+        c = int(case[j, i])
+        if c in (5, 10) :
+            center = 0.25 * (h[j, i] + h[j, i + 1] + h[j + 1, i] + h[j + 1, i + 1])
+            pairs = SADDLE_SEGMENTS[(c, center > level)]
+        else :
+            pairs = CASE_SEGMENTS[c]
+        for e0, e1 in pairs :
+            segments.append((edge_id(j, i, e0), edge_id(j, i, e1)))
+    if not segments : return []
+
+    # crossing point on every edge used
+    edges = np.unique(np.array(segments, dtype=np.int64).ravel())
+    horizontal = edges < n_h
+    ex, ey = np.zeros(edges.shape), np.zeros(edges.shape)
+    hj, hi = np.divmod(edges[horizontal], nx - 1)
+    t = (level - h[hj, hi]) / (h[hj, hi + 1] - h[hj, hi])
+    ex[horizontal] = xc[hi] + t * (xc[hi + 1] - xc[hi])
+    ey[horizontal] = yc[hj]
+    vj, vi = np.divmod(edges[~horizontal] - n_h, nx)
+    t = (level - h[vj, vi]) / (h[vj + 1, vi] - h[vj, vi])
+    ex[~horizontal] = xc[vi]
+    ey[~horizontal] = yc[vj] + t * (yc[vj + 1] - yc[vj])
+    position = dict((e, k) for k, e in enumerate(edges.tolist()))
+
+    # join the segments into lines: every edge is shared by at most two segments
+    neighbours = {}
+    for a, b in segments :
+        neighbours.setdefault(a, []).append(b)
+        neighbours.setdefault(b, []).append(a)
+    visited = set()
+    lines = []
+    # open lines (ending on the boundary) first, then closed loops
+    starts = [e for e in neighbours if len(neighbours[e]) == 1] + list(neighbours.keys())
+    for start in starts :
+        if start in visited : continue
+        line = [start]
+        visited.add(start)
+        current = start
+        while True :
+            nxt = [e for e in neighbours[current] if e not in visited]
+            if not nxt : break
+            current = nxt[0]
+            visited.add(current)
+            line.append(current)
+        if len(neighbours[start]) == 2 and start in neighbours[line[-1]] and len(line) > 2 :
+            line.append(start) # close the loop
+        if len(line) < 2 : continue
+        k = np.array([position[e] for e in line], dtype=np.int64)
+        lines.append((ex[k], ey[k]))
+    lines.sort(key=lambda xy : -xy[0].shape[0])
+    return lines
+
+''' ---------------------- '''
+'''        Contours        '''
+''' ---------------------- '''
+def contour_level(pvalue=0.05) :
+    '''
+    Significance corresponding to the exclusion at 1-pvalue CL
+    (TMath::NormQuantile(1-pvalue))
+    '''
+    return float(norm_quantile(1.0 - pvalue))
+
+class GridTriangulation() :
+    '''
+    Delaunay triangulation of the signal grid points and the
+    interpolation weights of the (nbins_x x nbins_y) histogram
+    bin centers, computed once and shared by every z-field
+    (observed, expected, +-1 sigma, other regions, ...) drawn
+    on the same grid
+    '''
+    def __init__(self, x, y, nbins_x, xlow, xhigh, nbins_y, ylow, yhigh) :
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.n_points = x.shape[0]
+        # duplicate points are ignored by the triangulation
+        xy, self.unique_points = np.unique(np.column_stack([x, y]), axis=0, return_index=True)
+        self.x, self.y = x[self.unique_points], y[self.unique_points]
+        self.binning = (nbins_x, xlow, xhigh, nbins_y, ylow, yhigh)
+        self.xc = bin_centers(nbins_x, xlow, xhigh)
+        self.yc = bin_centers(nbins_y, ylow, yhigh)
+        self.triangles = delaunay_triangulation(self.x, self.y)
+        self.vertices, self.weights = interpolation_weights(self.x, self.y, self.triangles, self.xc, self.yc)
+
+    def interpolate(self, fields) :
+        '''
+        Interpolate the (n_fields, n_points) values at the grid points
+        onto the histogram bins in one go, returns (n_fields, ny, nx).
+        As for a TH2F, the contents are kept in single precision.
+        '''
+        fields = np.asarray(fields, dtype=np.float64).reshape(-1, self.n_points)
+        z = fields[:, self.unique_points]
+        h = (z[:, self.vertices] * self.weights).sum(axis=-1)
+        return h.astype(np.float32).astype(np.float64)
+
+    def find_contours(self, fields, level, smoothing=True) :
+        '''
+        Contours at 'level' of each of the (n_fields, n_points) fields.
+        Returns one list of (x, y) lines per field, longest first
+        (empty if the field never reaches 'level').
+        '''
+        fields = np.asarray(fields, dtype=np.float64).reshape(-1, self.n_points)
+        reaching = fields.max(axis=1) >= level if self.n_points else np.zeros(fields.shape[0], dtype=bool)
+        out = [[] for i in range(fields.shape[0])]
+        if not reaching.any() : return out
+        h = self.interpolate(fields[reaching])
+        if smoothing :
+            h = smooth(h).astype(np.float32).astype(np.float64)
+        for k, ifield in enumerate(np.nonzero(reaching)[0].tolist()) :
+            out[ifield] = marching_squares(h[k], self.xc, self.yc, level)
+        return out
+
+def find_contours(x, y, z, nbins_x, xlow, xhigh, nbins_y, ylow, yhigh, level, smoothing=True) :
+    '''
+    Contours at 'level' of the surface z(x, y) known at the grid
+    points x, y, interpolated onto an (nbins_x x nbins_y) histogram
+    spanning [xlow, xhigh] x [ylow, yhigh]. Returns the list of
+    contour lines as (x, y) arrays, longest first (empty if the
+    surface never reaches 'level'). To draw several surfaces on the
+    same grid, use GridTriangulation directly.
+    '''
+    z = np.asarray(z, dtype=np.float64)
+    if z.shape[0] == 0 or z.max() < level : return []
+    triangulation = GridTriangulation(x, y, nbins_x, xlow, xhigh, nbins_y, ylow, yhigh)
+    return triangulation.find_contours(z, level, smoothing=smoothing)[0]
@@ -0,0 +1,115 @@
+#
+# writing the plots in several formats
+#
+# The canvas is drawn once. If more than one format is asked
+# for (and n_workers > 1) it is serialized to a ROOT file and
+# each format is written by a worker process from that file.
+#
+
+import os
+import sys
+import multiprocessing
+
+sys.path.append(os.environ['LIMPLOTDIR'])
+
+#limitplotter
+from limitplotter.utils.lazy_root import ROOT
+
+# formats TCanvas::SaveAs knows about that we allow
+EXPORT_FORMATS = ["pdf", "eps", "ps", "png", "gif", "jpg", "svg", "root", "C"]
+
+def check_formats(formats) :
+    '''
+    Raise a ValueError if any of the formats is not supported
+    '''
+    for fmt in formats :
+        if fmt not in EXPORT_FORMATS :
+            raise ValueError("check_formats    unsupported output format %s (available: %s)"%(fmt, ", ".join(EXPORT_FORMATS)))
+
+def get_preview_name(base_name) :
+    return "%s_preview.png"%base_name
+
+def save_canvas(canvas, filename, scale=1.0) :
+    '''
+    SaveAs the canvas to filename. With scale != 1 the canvas is
+    first resized by scale (e.g. a low-resolution png preview, text
+    and marker sizes being relative to the pad size) and then put back.
+    Returns True if the file was written.
+    '''
+    if scale != 1.0 :
+        w, h = canvas.GetWw(), canvas.GetWh()
+        canvas.SetCanvasSize(max(1, int(w * scale)), max(1, int(h * scale)))
+        canvas.SaveAs(filename)
+        canvas.SetCanvasSize(w, h)
+    else :
+        canvas.SaveAs(filename)
+    return os.path.isfile(filename)
+
+def export_from_file(args) :
+    '''
+    Read the canvas canvas_name back from the ROOT file source
+    and save it as filename, args = (source, canvas_name, filename, scale).
+    Returns (filename, ok).
+    '''
+    source, canvas_name, filename, scale = args
+    rfile = ROOT.TFile.Open(source)
+    if not rfile or rfile.IsZombie() :
+        print "export_from_file    ERROR unable to open %s"%source
+        return filename, False
+    canvas = rfile.Get(canvas_name)
+    if not canvas :
+        print "export_from_file    ERROR canvas %s not found in %s"%(canvas_name, source)
+        rfile.Close()
+        return filename, False
+    canvas.Draw()
+    ok = save_canvas(canvas, filename, scale)
+    rfile.Close()
+    return filename, ok
+
+def export_canvas(canvas, base_name, formats=["pdf"], n_workers=1, preview_scale=0.0) :
+    '''
+    Write the canvas as base_name.<format> for each of the formats
+    and, if preview_scale > 0, as a base_name_preview.png scaled
+    down by preview_scale. With more than one output and n_workers > 1
+    the canvas is written once to a ROOT file (base_name.root if
+    "root" is one of the formats, else a temporary file) and the other
+    outputs are made from it concurrently.
+    Returns the list of files written.
+    '''
+    check_formats(formats)
+    jobs = [("%s.%s"%(base_name, fmt), 1.0) for fmt in formats]
+    if preview_scale > 0 : jobs.append((get_preview_name(base_name), preview_scale))
+
+    n_workers = min(max(1, int(n_workers)), len(jobs))
+    if n_workers == 1 :
+        written = []
+        for filename, scale in jobs :
+            if save_canvas(canvas, filename, scale) : written.append(filename)
+            else : print "export_canvas    WARNING failed to write %s"%filename
+        return written
+
+    # serialize the canvas once, the ROOT output (if any) doubles as the source
+    source = "%s.root"%base_name
+    temporary = "root" not in formats
+    if temporary :
+        source_dir, source_name = os.path.split(source)
+        source = os.path.join(source_dir, ".tmp_export_%d_%s"%(os.getpid(), source_name))
+    canvas.SaveAs(source)
+    if not os.path.isfile(source) :
+        print "export_canvas    ERROR unable to serialize canvas %s to %s"%(canvas.GetName(), source)
+        return []
+    jobs = [(source, canvas.GetName(), filename, scale) for filename, scale in jobs if filename != source]
+
+    pool = multiprocessing.Pool(n_workers)
+    try :
+        results = pool.map(export_from_file, jobs)
+    finally :
+        pool.close()
+        pool.join()
+        if temporary and os.path.exists(source) : os.remove(source)
+
+    written = [] if temporary else [source]
+    for filename, ok in results :
+        if ok : written.append(filename)
+        else : print "export_canvas    WARNING failed to write %s"%filename
+    return written
@@ -0,0 +1,25 @@
+#
+# helpers for writing the results and cache files
+#
+
+import os
+import contextlib
+
+@contextlib.contextmanager
+def atomic_write(filename, mode="w") :
+    '''
+    Yield a temporary file next to filename, renamed to filename once
+    the block completes, so that readers never see a partially written
+    file. On error the temporary file is removed and the error raised
+    again. Missing directories are created.
+    '''
+    directory = os.path.dirname(filename)
+    if directory and not os.path.isdir(directory) : os.makedirs(directory)
+    tmp_name = "%s.tmp%d"%(filename, os.getpid())
+    try :
+        with open(tmp_name, mode) as tmp :
+            yield tmp
+        os.rename(tmp_name, filename)
+    except :
+        if os.path.exists(tmp_name) : os.remove(tmp_name)
+        raise
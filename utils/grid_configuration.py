@@ -5,15 +5,48 @@
 # July 2016
 #
 
-import ROOT
 import os
 import glob
 
 import sys
 sys.path.append(os.environ['LIMPLOTDIR'])
 
+import numpy as np
+
 #limitplotter
+from limitplotter.utils.lazy_root import ROOT
 from limitplotter.utils.limiters import *
+from limitplotter.utils.signal_grid import *
+from limitplotter.utils.limit_results import *
+from limitplotter.utils.log_tools import UPPERLIMIT_FIELDS
+from limitplotter.utils.xsec_tools import *
+
+# SignalGrid quantity <-- limit results column, for each systematic file
+NOMINAL_RESULTS = [ ("observedCLs",     "CLs"),
+                    ("expectedCLs",     "CLsexp"),
+                    ("expectedCLsUp1s", "clsu1s"),
+                    ("expectedCLsDn1s", "clsd1s"),
+                    ("observedSig",     "ObsSig"),
+                    ("expectedSig",     "ExpSig"),
+                    ("expectedSigUp1s", "ExpSigUp1s"),
+                    ("expectedSigDn1s", "ExpSigDn1s") ]
+# signal xsec +1 sigma_theory
+UP_RESULTS      = [ ("observedCLsUp1s", "CLs"),
+                    ("observedSigUp1s", "ObsSig") ]
+# signal xsec -1 sigma_theory
+DOWN_RESULTS    = [ ("observedCLsDn1s", "CLs"),
+                    ("observedSigDn1s", "ObsSig") ]
+# upper limits on mu_SIG (columns: log_tools.UPPERLIMIT_FIELDS)
+UPPERLIMIT_RESULTS = [ ("observedULMu",     "obsUL"),
+                       ("expectedULMu",     "expUL"),
+                       ("expectedULMuUp1s", "expULUp1s"),
+                       ("expectedULMuDn1s", "expULDn1s") ]
+
+# systematic --> Region attribute holding its results file
+RESULTS_FILE_ATTRIBUTES = [ ("Nominal", "nominal_limit_results_file"),
+                            ("Up",      "up_limit_results_file"),
+                            ("Down",    "dn_limit_results_file"),
+                            ("UL",      "upperlimit_results_file") ]
 
 class GridConfiguration() :
     def __init__(self, grid_) :
@@ -28,11 +61,46 @@ class GridConfiguration() :
 
         self.regions = []
 
-        # container for the signal grid
+        # columnar store of the signal grid results (SignalGrid),
+        # built in assign_grid
+        self.signal_grid = None
+        # Signal views of each point in the grid
         self.signals = []
+        # (mX, mY) --> row in the signal grid, built in assign_grid
+        self.signal_index = {}
+
+        # columns read from the limit results files (picked by name from their header)
+        self.limit_results_fields = list(LIMIT_RESULTS_FIELDS)
+        # whether to load/store the parsed limit results files in binary caches
+        self.use_results_cache = True
+        # tables read by assign_grid, handed over to fill_raw_results
+        # so that the nominal file is only read once (see read_limit_results_table)
+        self.results_tables = {}
+        # whether a limit results file that cannot be parsed ends the
+        # run, or raises a ValueError (e.g. in the draw_limits watch mode)
+        self.exit_on_bad_results = True
+
+        # canvases, created on first use (see get_canvas)
+        self.canvases = {}
+
+        # formats each plot is written in (see export_tools), the
+        # number of processes writing them and whether to also write a
+        # low-resolution png preview (scaled down by preview_scale)
+        self.output_formats = ["pdf"]
+        self.n_export_workers = 1
+        self.make_preview = False
+        self.preview_scale = 0.35
+
+        # which per-point labels (CLs, significance, xsec) to draw:
+        # "all" (every point in the frame), "overlap" (skip labels that
+        # would overlap one already drawn) or "spacing" (keep labels at
+        # least label_spacing = (dx, dy) [GeV] apart), never inside of
+        # the label_exclusion_boxes (NDC x1, y1, x2, y2, e.g. the legend)
+        self.label_mode = "overlap"
+        self.label_spacing = (25., 25.)
+        self.label_exclusion_boxes = []
 
-        # canvas for limit plot
-        self.limit_canvas = ROOT.TCanvas("c_limit", "", 768, 768)
+        # canvas for limit plot: limit_canvas
         self.do_limit_plot = True
         self.show_obs_cls = False
         self.show_exp_cls = True
@@ -40,45 +108,126 @@ class GridConfiguration() :
         self.show_exp_sig = False
 
         # whether or not to make the best-sr-per-point plot
+        # (canvas: best_sr_canvas)
         self.do_best_sr_per_point = False
-        self.best_sr_canvas = ROOT.TCanvas("c_bestSR", "", 768, 768)
 
         # whether or not to make the upperlimit-xsec-per-point plot
+        # (canvas: xsec_canvas)
         self.do_xsec_plot = False
-        self.xsec_canvas = ROOT.TCanvas("c_upXS", "", 768, 768)
+        # signal reference cross-section table (mass [GeV], xsec [pb]),
+        # loaded once on first use (see get_reference_xsec)
+        self.xsec_file = ""
+        self.xsec_table = None
 
-        # whether or not to plot previous 8 TeV results
+        # how to extract the contours: "root" (TGraph2D + CONT LIST)
+        # or "numpy" (see contour_engine)
+        self.contour_engine = "root"
+        # triangulation of the grid shared by the "numpy" engine contours
+        self.contour_triangulation = None
+
+        # binning (in x and y) of the histogram the contours are
+        # interpolated onto, and whether it is smoothed
+        self.contour_nbins = 500
+        self.contour_smoothing = True
+
+        # whether to store/reuse the contour points on disk, one
+        # file per region in contour_cache_dir
+        self.use_contour_cache = True
+        self.contour_cache_dir = "./contour_cache/"
+        self.contour_caches = {}
+
+        # number of worker processes used to compute the contours
+        self.n_contour_workers = 1
+
+        # whether or not to plot previous 8 TeV results, taken from
+        # the graphs previous_contours ({ "wwlike"/"stop1l"/"stop2l" : name })
+        # of previous_result_file
         self.show_previous_8TeV_result = False
+        self.previous_result_file = ""
+        self.previous_contours = {}
+        # previous 13 TeV (ICHEP) observed contour, drawn if a file is given
+        self.ichep_result_file = ""
+        self.ichep_contour = "Graph"
 
-    def collect_region_limit_result_files(self, r) :
+        # whether to store the points of the reference contours above
+        # in reference_cache_dir, instead of opening their files each run
+        # (see limit_plot_tools.get_reference_contours)
+        self.use_reference_cache = True
+        self.reference_cache_dir = "./reference_contours/"
+        self.reference_contours = {}
+
+    def get_canvas(self, name) :
+        '''
+        Return the 768x768 canvas called name, creating it
+        (and importing ROOT) the first time it is asked for
+        '''
+        if name not in self.canvases :
+            self.canvases[name] = ROOT.TCanvas(name, "", 768, 768)
+        return self.canvases[name]
+
+    limit_canvas    = property(lambda self : self.get_canvas("c_limit"))
+    best_sr_canvas  = property(lambda self : self.get_canvas("c_bestSR"))
+    xsec_canvas     = property(lambda self : self.get_canvas("c_upXS"))
+
+    def get_region_results_dir(self, r) :
         lim_results_dir = str(os.environ['LIMPLOTDIR'])
         if not lim_results_dir.endswith("/") : lim_results_dir += "/"
         lim_results_dir += "limitplotter/limit_results/"
+        return "%s%s_%s_%s/"%(lim_results_dir, r.name, self.channel, self.grid)
 
-        if self.channel != "" :
-            in_lim_dir = "%s_%s_%s/"%(r.name, self.channel, self.grid)
+    def glob_region_results_files(self, r) :
+        '''
+        Return { systematic : [files] } of the limit results files
+        (Nominal, Up, Down) and upper limit results file (UL) in the
+        limit_results/<region>_<channel>_<grid>/ directory of region r
+        '''
+        region_dir = self.get_region_results_dir(r)
+        return { "Nominal"  : glob.glob("%s*Nominal_limit_results.txt"%region_dir),
+                 "Up"       : glob.glob("%s*Up_limit_results.txt"%region_dir),
+                 "Down"     : glob.glob("%s*Down_limit_results.txt"%region_dir),
+                 "UL"       : glob.glob("%s%s_%s_%s_upperlimit_results.txt"%(region_dir, r.name, self.channel, self.grid)) }
 
-            nom = glob.glob("%s%s*Nominal_limit_results.txt"%(lim_results_dir, in_lim_dir))
-            up  = glob.glob("%s%s*Up_limit_results.txt"%(lim_results_dir, in_lim_dir))
-            dn  = glob.glob("%s%s*Down_limit_results.txt"%(lim_results_dir, in_lim_dir))
+    def update_results_files(self) :
+        '''
+        Look again for the results files of the regions and pick up
+        the ones that were not there before (or changed name), returns
+        [ (filename, region name, systematic) ] of these
+        '''
+        new = []
+        for r in self.regions :
+            found = self.glob_region_results_files(r)
+            for syst, attribute in RESULTS_FILE_ATTRIBUTES :
+                if len(found[syst]) != 1 or found[syst][0] == getattr(r, attribute) : continue
+                setattr(r, attribute, found[syst][0])
+                new.append((found[syst][0], r.name, syst))
+        return new
+
+    def collect_region_limit_result_files(self, r) :
+        if self.channel != "" :
+            region_dir = self.get_region_results_dir(r)
+            found = self.glob_region_results_files(r)
+            nom, up, dn, ul = found["Nominal"], found["Up"], found["Down"], found["UL"]
 
             if len(nom) > 0 and len(nom) == 1 :
                 print "collect_region_limit_result_files    nominal limit results file: %s"%nom[0]
                 r.nominal_limit_results_file = nom[0]
             else :
-                print "collect_region_limit_result_files    ERROR nominal limit results file (%s%s*Nominal_limit_results.txt) not found"%(lim_results_dir, in_lim_dir)
+                print "collect_region_limit_result_files    ERROR nominal limit results file (%s*Nominal_limit_results.txt) not found"%region_dir
                 sys.exit()
             if len(up) > 0 and len(up) == 1 :
                 print "collect_region_limit_result_files    up limit results file: %s"%up[0]
                 r.up_limit_results_file = up[0]
             else :
-                print "collect_region_limit_result_files    ERROR up limit results file (%s%s*Up_limit_results.txt) not found"%(lim_results_dir, in_lim_dir)
+                print "collect_region_limit_result_files    ERROR up limit results file (%s*Up_limit_results.txt) not found"%region_dir
                 #sys.exit()
+            if len(ul) == 1 :
+                print "collect_region_limit_result_files    upper limit results file: %s"%ul[0]
+                r.upperlimit_results_file = ul[0]
             if len(dn) > 0 and len(dn) == 1 :
                 print "collect_region_limit_result_files    down limit results file: %s"%dn[0]
                 r.dn_limit_results_file = dn[0]
             else :
-                print "collect_region_limit_result_files    ERROR down limit results file (%s%s*Down_limit_results.txt) not found"%(lim_results_dir, in_lim_dir)
+                print "collect_region_limit_result_files    ERROR down limit results file (%s*Down_limit_results.txt) not found"%region_dir
                 #sys.exit()
         else :
             print "collect_region_limit_result_files    You must provide a signal channel!"
@@ -88,105 +237,224 @@ class GridConfiguration() :
         for reg in self.regions :
             self.collect_region_limit_result_files(reg)
 
+    def read_limit_results_table(self, filename, fields=None, keep=False) :
+        '''
+        Read a limit results file into a (lines x fields) float64 array,
+        with the columns ordered as in fields (default: self.limit_results_fields).
+        With keep the table is held on to and handed out (once) to the next
+        call for the same, unchanged, file instead of reading it again.
+        '''
+        if fields is None : fields = self.limit_results_fields
+        stat = os.stat(filename)
+        key = (filename, tuple(fields), stat.st_size, stat.st_mtime)
+        table = self.results_tables.pop(key, None)
+        if table is None :
+            try :
+                table = load_limit_results(filename, fields, use_cache=self.use_results_cache)
+            except ValueError, e :
+                if not self.exit_on_bad_results : raise
+                print "read_limit_results_table    ERROR %s. Exiting."%e
+                sys.exit()
+        if keep : self.results_tables[key] = table
+        return table
+
     def assign_grid(self) :
-        columns = "mX mY CLs CLsexp  clsu1s  clsd1s  ObsSig  ExpSig  ExpSigUp1s  ExpSigDn1s"
-        fields = columns.split(" ")
-        mXidx = fields.index("mX")
-        mYidx = fields.index("mY")
+        self.signal_index = {}
+        self.contour_triangulation = None
+        mXidx = self.limit_results_fields.index("mX")
+        mYidx = self.limit_results_fields.index("mY")
         nom_file = self.regions[0].nominal_limit_results_file
-        lines = open(nom_file).readlines()
-        for line in lines[1:] : # first line is the header
-            line = line.strip()
-            if not line : continue
-            cols = line.split()
-            #cols = line.split("\t")
-            mX = float(cols[mXidx])
-            mY = float(cols[mYidx])
-            s = Signal(mX, mY)
-            self.signals.append(s)
+        table = self.read_limit_results_table(nom_file, keep=True)
+        mXs, mYs = [], []
+        n_duplicates = 0
+        for mX, mY in zip(table[:, mXidx].tolist(), table[:, mYidx].tolist()) :
+            if (mX, mY) in self.signal_index :
+                n_duplicates += 1
+                continue
+            self.signal_index[(mX, mY)] = len(mXs)
+            mXs.append(mX)
+            mYs.append(mY)
+
+        self.signal_grid = SignalGrid(mXs, mYs, [r.name for r in self.regions])
+        self.signals = [Signal(self.signal_grid, i) for i in range(len(mXs))]
 
         print "assign_grid    %s total grid points"%len(self.signals)
+        if n_duplicates :
+            print "assign_grid    WARNING %d duplicate grid points in %s were ignored"%(n_duplicates, nom_file)
 
-    def fill_raw_results(self) :
-        columns = "mX mY CLs CLsexp clsu1s clsd1s ObsSig ExpSig ExpSigUp1s ExpSigDn1s" 
-        fields = columns.split(" ")
-        mXidx           = fields.index("mX")
-        mYidx           = fields.index("mY")
-        CLsidx          = fields.index("CLs")
-        CLsexpidx       = fields.index("CLsexp")
-        CLsUp1sidx      = fields.index("clsu1s")
-        CLsDn1sidx      = fields.index("clsd1s")
-        obsSigidx       = fields.index("ObsSig")
-        expSigidx       = fields.index("ExpSig")
-        expSigUp1sidx   = fields.index("ExpSigUp1s")
-        expSigDn1sidx   = fields.index("ExpSigDn1s")
-
-        # fill the "nominal" raw results
-        for r in self.regions :
-            print "fill_raw_results    %s"%r.name
+    def fill_results_from_file(self, filename, fields=None) :
+        '''
+        Read a limit results file (with columns fields, by default
+        self.limit_results_fields) and match its lines to the grid
+        index built by assign_grid. Returns the grid rows and the
+        (rows x fields) array of the matched lines, along with the
+        number of unmatched and duplicate lines encountered. A point
+        appearing more than once takes the values of its last line
+        (e.g. results appended to the file later on).
+        '''
+        if fields is None : fields = self.limit_results_fields
+        mXidx = fields.index("mX")
+        mYidx = fields.index("mY")
+        table = self.read_limit_results_table(filename, fields)
+        grid = self.signal_grid
+        if table.shape[0] == grid.n_points() and (table[:, mXidx] == grid.mX).all() and (table[:, mYidx] == grid.mY).all() :
+            # same points in the same order as the grid (e.g. the file assign_grid was built from)
+            return np.arange(table.shape[0], dtype=np.int64), table, 0, 0
+        # grid row --> last line holding it
+        line_of_row = {}
+        n_unmatched, n_duplicates = 0, 0
+        for iline, key in enumerate(zip(table[:, mXidx].tolist(), table[:, mYidx].tolist())) :
+            row = self.signal_index.get(key)
+            if row is None :
+                n_unmatched += 1
+                continue
+            if row in line_of_row :
+                n_duplicates += 1
+            line_of_row[row] = iline
+        rows = sorted(line_of_row.keys())
+        lines = [line_of_row[row] for row in rows]
+        return np.array(rows, dtype=np.int64), table[lines], n_unmatched, n_duplicates
+
+    def fill_region_results(self, r, systs=["Nominal", "Up", "Down"], problems=None) :
+        '''
+        Fill the results of region r from its limit results files
+        of the given systematics, the (n unmatched, n duplicate)
+        points of each file are added to problems
+        '''
+        if problems is None : problems = {}
+        fields = self.limit_results_fields
+        grid = self.signal_grid
+
+        print "fill_raw_results    %s"%r.name
+        to_fill = []
+        if "Nominal" in systs :
             if r.nominal_limit_results_file != "" :
-                nom_file = r.nominal_limit_results_file
-                lines = open(nom_file).readlines()
-                for line in lines[1:] :
-                    line = line.strip()
-                    if not line : continue
-                    cols = line.split()
-                    #cols = line.split("\t")
-                    mX = float(cols[mXidx])
-                    mY = float(cols[mYidx])
-                    for s in self.signals :
-                        if s.mX == mX and s.mY == mY :
-                            # raw CLs
-                            s.observedCLs[r.name]       = float(cols[CLsidx])
-                            s.expectedCLs[r.name]       = float(cols[CLsexpidx])
-                            s.expectedCLsUp1s[r.name]   = float(cols[CLsUp1sidx])
-                            s.expectedCLsDn1s[r.name]   = float(cols[CLsDn1sidx])
-                            # significance
-                            s.observedSig[r.name]       = float(cols[obsSigidx])
-                            s.expectedSig[r.name]       = float(cols[expSigidx])
-                            s.expectedSigUp1s[r.name]   = float(cols[expSigUp1sidx])
-                            s.expectedSigDn1s[r.name]   = float(cols[expSigDn1sidx])
+                to_fill.append((r.nominal_limit_results_file, NOMINAL_RESULTS))
             else :
                 print "fill_raw_results    ERROR nominal limit results file is \"\""
                 sys.exit()
 
+        if "Up" in systs :
             if r.up_limit_results_file != "" :
-                up_file = r.up_limit_results_file
-                lines = open(up_file).readlines()
-                for line in lines[1:] :
-                    line = line.strip()
-                    if not line : continue
-                    #cols = line.split("\t")
-                    cols = line.split()
-                    mX = float(cols[mXidx])
-                    mY = float(cols[mYidx])
-                    for s in self.signals :
-                        if s.mX == mX and s.mY == mY :
-                            # up obs CLs
-                            s.observedCLsUp1s[r.name]   = float(cols[CLsidx])
-                            # up obs Sig
-                            s.observedSigUp1s[r.name]   = float(cols[obsSigidx])
-
+                to_fill.append((r.up_limit_results_file, UP_RESULTS))
             else :
                 print "fill_raw_results    ERROR up limits results file is \"\""
                 #sys.exit()
 
+        if "Down" in systs :
             if r.dn_limit_results_file != "" :
-                dn_file = r.dn_limit_results_file
-                lines = open(dn_file).readlines()
-                for line in lines[1:] :
-                    line = line.strip()
-                    if not line : continue
-                    cols = line.split()
-                    #cols = line.split("\t")
-                    mX = float(cols[mXidx])
-                    mY = float(cols[mYidx])
-                    for s in self.signals :
-                        if s.mX == mX and s.mY == mY :
-                            # down obs CLs
-                            s.observedCLsDn1s[r.name]   = float(cols[CLsidx])
-                            # down obs Sig
-                            s.observedSigDn1s[r.name]   = float(cols[obsSigidx])
+                to_fill.append((r.dn_limit_results_file, DOWN_RESULTS))
             else :
                 print "fill_raw_results    ERROR down limit results file is \"\""
                 #sys.exit()
+
+        for filename, quantities in to_fill :
+            rows, table, n_unmatched, n_duplicates = self.fill_results_from_file(filename)
+            for quantity, field in quantities :
+                grid.fill(quantity, r.name, rows, table[:, fields.index(field)])
+            problems[(r.name, filename)] = (n_unmatched, n_duplicates)
+
+    def fill_raw_results(self) :
+        # { (region, file) : (n unmatched, n duplicate) }
+        problems = {}
+
+        for r in self.regions :
+            self.fill_region_results(r, problems=problems)
+
+        self.results_tables = {}
+        self.print_fill_summary(problems)
+
+    def fill_upperlimit_results(self) :
+        '''
+        Fill the upper limits on mu_SIG of the regions that have an
+        upper limit results file (see collect_region_limit_result_files)
+        '''
+        problems = {}
+        for r in self.regions :
+            self.fill_region_upperlimit_results(r, problems)
+        if problems : self.print_fill_summary(problems)
+
+    def fill_region_upperlimit_results(self, r, problems=None) :
+        if r.upperlimit_results_file == "" : return
+        if problems is None : problems = {}
+        grid = self.signal_grid
+        print "fill_upperlimit_results    %s"%r.name
+        rows, table, n_unmatched, n_duplicates = self.fill_results_from_file(r.upperlimit_results_file, UPPERLIMIT_FIELDS)
+        for quantity, field in UPPERLIMIT_RESULTS :
+            grid.fill(quantity, r.name, rows, table[:, UPPERLIMIT_FIELDS.index(field)])
+        problems[(r.name, r.upperlimit_results_file)] = (n_unmatched, n_duplicates)
+
+    def get_results_files(self) :
+        '''
+        Return [ (filename, region name, systematic) ] of the limit
+        results files collected for the regions (see
+        collect_region_limit_result_files), systematic being one of
+        Nominal, Up, Down or UL (upper limit results)
+        '''
+        files = []
+        for r in self.regions :
+            for syst, attribute in RESULTS_FILE_ATTRIBUTES :
+                filename = getattr(r, attribute)
+                if filename != "" : files.append((filename, r.name, syst))
+        return files
+
+    def reload_results(self, changed) :
+        '''
+        Read again the results of the changed [ (region name, systematic) ]
+        files (see get_results_files) and return the names of the regions
+        whose results were reloaded. If the file the grid is built from
+        changed (e.g. new points came in), the grid is built again and
+        every region is reloaded.
+        '''
+        if (self.regions[0].name, "Nominal") in changed :
+            print "reload_results    %s changed, building the grid again"%self.regions[0].nominal_limit_results_file
+            self.assign_grid()
+            self.fill_raw_results()
+            self.fill_upperlimit_results()
+            return [r.name for r in self.regions]
+
+        problems = {}
+        reloaded = []
+        for r in self.regions :
+            systs = [syst for name, syst in changed if name == r.name]
+            if not systs : continue
+            raw_systs = [s for s in systs if s != "UL"]
+            if raw_systs : self.fill_region_results(r, raw_systs, problems)
+            if "UL" in systs : self.fill_region_upperlimit_results(r, problems)
+            reloaded.append(r.name)
+        self.results_tables = {}
+        if problems : self.print_fill_summary(problems)
+        return reloaded
+
+    def get_reference_xsec(self, masses) :
+        '''
+        Signal reference cross-sections [pb] at the given masses,
+        interpolated from the self.xsec_file table (loaded once).
+        All NaN, with a warning, if no table is given.
+        '''
+        if self.xsec_file == "" :
+            print "get_reference_xsec    WARNING no cross-section table set (conf.xsec_file is empty), the excluded cross-sections cannot be computed"
+            print "get_reference_xsec    WARNING set conf.xsec_file to a \"mass [GeV]  xsec [pb]\" table in the configuration"
+            return np.full(np.shape(masses), np.nan)
+        if self.xsec_table is None :
+            try :
+                self.xsec_table = load_xsec_table(self.xsec_file)
+            except (IOError, ValueError), e :
+                print "get_reference_xsec    ERROR %s. Exiting."%e
+                sys.exit()
+            print "get_reference_xsec    loaded %d mass points from %s"%(self.xsec_table[0].shape[0], self.xsec_file)
+        return interpolate_xsec(self.xsec_table[0], self.xsec_table[1], masses)
+
+    def print_fill_summary(self, problems) :
+        '''
+        Report (once) the points in the limit results files that
+        could not be matched to the grid or that appeared more
+        than once in the same file
+        '''
+        bad = [(key, counts) for key, counts in sorted(problems.items()) if counts[0] or counts[1]]
+        if not bad :
+            print "fill_raw_results    all points matched to the grid (%d files)"%len(problems)
+            return
+        print "fill_raw_results    WARNING summary of unmatched/duplicate points"
+        for (reg, filename), (n_unmatched, n_duplicates) in bad :
+            print "fill_raw_results     > %s %s : %d unmatched (ignored), %d duplicate (last line used)"%(reg, filename, n_unmatched, n_duplicates)
@@ -0,0 +1,66 @@
+#
+# tools for reading the HistFitter harvest list files
+#
+
+import json
+
+def iter_json_array(data_file, chunk_size=1<<16) :
+    '''
+    Yield the records of a JSON array (e.g. the *_harvest_list.json
+    produced by CollectAndWriteHypoTestResults) one at a time,
+    reading data_file in chunks of chunk_size characters so that
+    only the record being parsed is held in memory
+    '''
+    decoder = json.JSONDecoder()
+    buf, pos = "", 0
+    eof = False
+    started = False
+    while True :
+        # skip whitespace (and the commas between the records)
+        while pos < len(buf) and (buf[pos].isspace() or (started and buf[pos] == ",")) :
+            pos += 1
+        if pos == len(buf) :
+            if eof :
+                raise ValueError("iter_json_array    unexpected end of file (missing ']')")
+            chunk = data_file.read(chunk_size)
+            if not chunk : eof = True
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+
+        if not started :
+            if buf[pos] != "[" :
+                raise ValueError("iter_json_array    expected a JSON array, found '%s'"%buf[pos])
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == "]" :
+            return
+
+        try :
+            record, end = decoder.raw_decode(buf, pos)
+        except ValueError :
+            if eof : raise
+            end = -1
+        # a record ending exactly at the end of the buffer may be truncated
+        # (e.g. a number), so only accept it if more data follows
+        if end < 0 or (end == len(buf) and not eof) :
+            chunk = data_file.read(chunk_size)
+            if not chunk : eof = True
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield record
+        pos = end
+
+def iter_batches(records, batch_size) :
+    '''
+    Group the records of an iterable into lists of (at most)
+    batch_size records
+    '''
+    batch = []
+    for record in records :
+        batch.append(record)
+        if len(batch) == batch_size :
+            yield batch
+            batch = []
+    if batch :
+        yield batch
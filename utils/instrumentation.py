@@ -0,0 +1,195 @@
+#
+# opt-in timing/memory instrumentation of the pipeline stages
+#
+#   from limitplotter.utils.instrumentation import stage, instrumentation
+#   instrumentation.enable(profile_stages=["fill_raw_results"])
+#   with stage("fill_raw_results") :
+#       conf.fill_raw_results()
+#   instrumentation.print_summary()
+#   instrumentation.write_trace("trace.json")
+#
+# When not enabled, stage() does nothing.
+#
+
+import os
+import sys
+import json
+import time
+import resource
+import functools
+
+# stored in each trace file, to be changed along with their layout
+TRACE_VERSION = 1
+
+def cpu_time() :
+    '''
+    User + system CPU time (s) of this process and of its
+    children that have been waited for (e.g. worker pools)
+    '''
+    t = os.times()
+    return t[0] + t[1] + t[2] + t[3]
+
+def peak_rss_mb() :
+    '''
+    Peak resident set size (MB) of this process so far
+    '''
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on OS X, kilobytes on linux
+    if sys.platform == "darwin" : return maxrss / (1024.0 * 1024.0)
+    return maxrss / 1024.0
+
+class StageContext() :
+    '''
+    Context manager recording one stage in an Instrumentation
+    '''
+    def __init__(self, instr, name) :
+        self.instr = instr
+        self.name = name
+        self.profiler = None
+
+    def __enter__(self) :
+        instr = self.instr
+        instr.stack.append(self.name)
+        self.path = "/".join(instr.stack)
+        if self.name in instr.profile_stages or self.path in instr.profile_stages :
+            import cProfile
+            self.profiler = cProfile.Profile()
+        self.start_wall = time.time()
+        self.start_cpu = cpu_time()
+        self.start_rss = peak_rss_mb()
+        if self.profiler : self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb) :
+        if self.profiler : self.profiler.disable()
+        instr = self.instr
+        record = { "stage"          : self.path,
+                   "start"          : self.start_wall - instr.start,
+                   "wall"           : time.time() - self.start_wall,
+                   "cpu"            : cpu_time() - self.start_cpu,
+                   "peak_rss_mb"    : peak_rss_mb(),
+                   "rss_growth_mb"  : peak_rss_mb() - self.start_rss,
+                   "failed"         : exc_type is not None }
+        instr.records.append(record)
+        instr.stack.pop()
+        if self.profiler : instr.dump_profile(self.path, self.profiler)
+        return False
+
+class NullContext() :
+    def __enter__(self) : return self
+    def __exit__(self, exc_type, exc_value, tb) : return False
+
+class Instrumentation() :
+    '''
+    Records the wall time, CPU time and peak RSS of the stages
+    run inside stage(name). Nested stages are recorded as
+    "outer/inner". Stages listed in profile_stages (by name or
+    by "outer/inner" path) are also run under cProfile, their
+    statistics are written to profile_dir/<stage>_<n>.prof and
+    the top functions are printed.
+    '''
+    def __init__(self) :
+        self.enabled = False
+        self.records = []
+        self.stack = []
+        self.profile_stages = set()
+        self.profile_dir = "./profiles/"
+        self.n_profiles = 0
+        self.start = time.time()
+
+    def enable(self, profile_stages=[], profile_dir="./profiles/") :
+        self.enabled = True
+        self.profile_stages = set(profile_stages)
+        self.profile_dir = profile_dir
+        self.start = time.time()
+
+    def reset(self) :
+        '''
+        Forget the records so far, e.g. in a forked worker process
+        '''
+        self.records = []
+        self.stack = []
+        self.start = time.time()
+
+    def stage(self, name) :
+        if not self.enabled : return NullContext()
+        return StageContext(self, name)
+
+    def dump_profile(self, path, profiler) :
+        import pstats
+        if not os.path.isdir(self.profile_dir) : os.makedirs(self.profile_dir)
+        self.n_profiles += 1
+        filename = os.path.join(self.profile_dir, "%s_%d.prof"%(path.replace("/", "__").replace(" ", "_"), self.n_profiles))
+        profiler.dump_stats(filename)
+        print "instrumentation    cProfile statistics of stage %s written to %s"%(path, filename)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+
+    def summary(self) :
+        '''
+        Records grouped by stage, in the order the stages were
+        first entered: [ (stage, calls, wall, cpu, peak rss) ]
+        '''
+        stages, order = {}, []
+        for rec in sorted(self.records, key=lambda rec : rec["start"]) :
+            if rec["stage"] not in stages :
+                stages[rec["stage"]] = [0, 0.0, 0.0, 0.0]
+                order.append(rec["stage"])
+            s = stages[rec["stage"]]
+            s[0] += 1
+            s[1] += rec["wall"]
+            s[2] += rec["cpu"]
+            s[3] = max(s[3], rec["peak_rss_mb"])
+        return [tuple([name] + stages[name]) for name in order]
+
+    def print_summary(self, title="stage summary") :
+        if not self.enabled : return
+        print 90*"="
+        print "  %s (total %.2f s, peak RSS %.1f MB)"%(title, time.time() - self.start, peak_rss_mb())
+        print 90*"-"
+        print "  %-50s %6s %10s %10s %10s"%("stage", "calls", "wall [s]", "cpu [s]", "RSS [MB]")
+        print 90*"-"
+        for name, calls, wall, cpu, rss in self.summary() :
+            depth = name.count("/")
+            label = "  " * depth + name.split("/")[-1]
+            print "  %-50s %6d %10.3f %10.3f %10.1f"%(label, calls, wall, cpu, rss)
+        print 90*"="
+
+    def write_trace(self, filename, **info) :
+        '''
+        Write the records (one per stage call) as a JSON trace,
+        along with any extra info given
+        '''
+        if not self.enabled : return
+        trace = { "version" : TRACE_VERSION,
+                  "created" : time.strftime("%Y-%m-%d %H:%M:%S"),
+                  "argv"    : sys.argv,
+                  "pid"     : os.getpid(),
+                  "total"   : time.time() - self.start,
+                  "info"    : info,
+                  "stages"  : self.records }
+        with open(filename, "w") as ofile :
+            json.dump(trace, ofile, indent=2)
+        print "instrumentation    trace written to %s"%filename
+
+# the instrumentation used by the limitplotter scripts
+instrumentation = Instrumentation()
+
+def stage(name) :
+    '''
+    Context manager recording the stage name (see Instrumentation)
+    '''
+    return instrumentation.stage(name)
+
+def instrumented(name=None) :
+    '''
+    Decorator recording every call of the function as the stage
+    name (default: the function name)
+    '''
+    def decorate(func) :
+        stage_name = name or func.__name__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) :
+            with stage(stage_name) :
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
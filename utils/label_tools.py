@@ -0,0 +1,74 @@
+#
+# selection of the per-point labels drawn on the limit plots
+#
+
+import numpy as np
+
+# how the labels are selected (see select_labels)
+LABEL_MODES = ["all", "overlap", "spacing"]
+
+def in_box(x, y, xlow, xhigh, ylow, yhigh) :
+    '''
+    Mask of the points inside of the box [xlow, xhigh] x [ylow, yhigh]
+    '''
+    return (x >= xlow) & (x <= xhigh) & (y >= ylow) & (y <= yhigh)
+
+def greedy_select(x, y, width, height, order) :
+    '''
+    Go through the points in the given order and keep a point if
+    no point kept so far is closer than width in x and height in y.
+    The kept points are stored in a spatial hash of (width x height)
+    cells, so each point is only compared to the kept points of its
+    3x3 neighbouring cells.
+    Returns the indices of the kept points.
+    '''
+    cell_x = np.floor(x / width).astype(np.int64).tolist()
+    cell_y = np.floor(y / height).astype(np.int64).tolist()
+    xs, ys = x.tolist(), y.tolist()
+    cells = {}
+    kept = []
+    for i in order :
+        cx, cy = cell_x[i], cell_y[i]
+        free = True
+        for nx in (cx - 1, cx, cx + 1) :
+            for ny in (cy - 1, cy, cy + 1) :
+                for j in cells.get((nx, ny), ()) :
+                    if abs(xs[i] - xs[j]) < width and abs(ys[i] - ys[j]) < height :
+                        free = False
+                        break
+                if not free : break
+            if not free : break
+        if free :
+            cells.setdefault((cx, cy), []).append(i)
+            kept.append(i)
+    return np.array(kept, dtype=np.int64)
+
+def select_labels(x, y, frame, mode="overlap", label_size=(0.0, 0.0), spacing=(0.0, 0.0), exclusion_boxes=[]) :
+    '''
+    Indices of the points (x, y) whose label should be drawn.
+    Points outside of the frame (xlow, xhigh, ylow, yhigh) or inside
+    of one of the exclusion_boxes (same layout, e.g. the legend) are
+    dropped. Then, depending on mode:
+        - "all"     : every remaining point
+        - "overlap" : drop the labels that would overlap an already
+                      kept one (label_size = (width, height) of a
+                      label centered on its point)
+        - "spacing" : keep points at least spacing = (dx, dy) apart
+    The points are considered in (x, y) order so that the selection
+    does not depend on the order of the grid.
+    '''
+    if mode not in LABEL_MODES :
+        raise ValueError("select_labels    unknown label mode %s (available: %s)"%(mode, ", ".join(LABEL_MODES)))
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    visible = in_box(x, y, *frame)
+    for box in exclusion_boxes :
+        visible &= ~in_box(x, y, *box)
+    idx = np.nonzero(visible)[0]
+    if mode == "all" or idx.shape[0] == 0 : return idx
+
+    width, height = label_size if mode == "overlap" else spacing
+    if width <= 0 or height <= 0 : return idx
+    xv, yv = x[idx], y[idx]
+    order = np.lexsort((yv, xv)).tolist()
+    return idx[greedy_select(xv, yv, width, height, order)]
@@ -0,0 +1,64 @@
+#
+# deferred import of ROOT
+#
+# PyROOT takes seconds to start, so modules that only need it
+# for drawing or merging import this proxy instead: ROOT is
+# imported (and configured) the first time one of its
+# attributes is used.
+#
+#   from limitplotter.utils.lazy_root import ROOT
+#   ROOT.on_load(lambda root : root.gStyle.SetOptStat(False))
+#
+
+import sys
+
+class LazyROOT(object) :
+    '''
+    Stand-in for the ROOT module that imports it on first
+    attribute access. Functions registered with on_load are
+    called with the module right after it is imported (or
+    immediately, if it already is).
+    '''
+    def __init__(self) :
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_hooks", [])
+
+    def on_load(self, hook) :
+        if self._module is not None :
+            hook(self._module)
+        else :
+            self._hooks.append(hook)
+
+    def is_loaded(self) :
+        return self._module is not None
+
+    def load(self) :
+        '''
+        Import ROOT (once) and run the on_load hooks, returns the module
+        '''
+        if self._module is None :
+            import ROOT as root
+            root.PyConfig.IgnoreCommandLineOptions = True
+            root.gROOT.SetBatch(True)
+            object.__setattr__(self, "_module", root)
+            hooks = self._hooks
+            object.__setattr__(self, "_hooks", [])
+            for hook in hooks :
+                hook(root)
+        return self._module
+
+    def __getattr__(self, name) :
+        if name.startswith("__") : raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __setattr__(self, name, value) :
+        setattr(self.load(), name, value)
+
+ROOT = LazyROOT()
+
+def root_imported() :
+    '''
+    True if the real ROOT module has been imported (by this
+    proxy or by anyone else)
+    '''
+    return "ROOT" in sys.modules
@@ -5,19 +5,33 @@
 # July 2016
 #
 
-
-import ROOT as r
 import sys
-import array
-
-r.TH1F.__init__._creates        = False
-r.TH2F.__init__._creates        = False
-r.TCanvas.__init__._creates     = False
-r.TGraph.__init__._creates      = False
-r.TPad.__init__._creates        = False
-r.TLine.__init__._creates       = False
-r.TLegend.__init__._creates     = False
-r.TLatex.__init__._creates      = False
+import re
+
+import numpy as np
+
+import os
+sys.path.append(os.environ['LIMPLOTDIR'])
+
+#limitplotter
+from limitplotter.utils.lazy_root import ROOT as r
+from limitplotter.utils.signal_grid import best_quantity
+from limitplotter.utils.contour_engine import GridTriangulation, contour_level
+from limitplotter.utils.contour_cache import ContourCache, contour_key
+from limitplotter.utils.reference_contours import ReferenceContourCache, get_source_signature
+from limitplotter.utils.instrumentation import stage, instrumented
+from limitplotter.utils.label_tools import select_labels, LABEL_MODES
+
+def set_creates_false(root) :
+    root.TH1F.__init__._creates        = False
+    root.TH2F.__init__._creates        = False
+    root.TCanvas.__init__._creates     = False
+    root.TGraph.__init__._creates      = False
+    root.TPad.__init__._creates        = False
+    root.TLine.__init__._creates       = False
+    root.TLegend.__init__._creates     = False
+    root.TLatex.__init__._creates      = False
+r.on_load(set_creates_false)
 
 ''' --------------------- '''
 '''  Labels and colors    '''
@@ -33,6 +47,21 @@ c_Expected      = "#28373c"
 # -----------------------------
 #  basic text writing
 # -----------------------------
+def root_constant(value) :
+    '''
+    Return the ROOT constant (color, marker style, ...) given either
+    as a number or by name, optionally with an offset (e.g. "kRed",
+    "kOrange-3"). None is returned as is.
+    '''
+    if value is None or not isinstance(value, basestring) : return value
+    match = re.match(r"^\s*(\w+)\s*(?:([+-])\s*(\d+))?\s*$", value)
+    if not match or not hasattr(r, match.group(1)) :
+        raise ValueError("root_constant    unknown ROOT constant %s"%value)
+    constant = int(getattr(r, match.group(1)))
+    if match.group(2) == "+" : constant += int(match.group(3))
+    elif match.group(2) == "-" : constant -= int(match.group(3))
+    return constant
+
 def draw_text(x, y, color, text, size=0.04, angle=0.0) :
     l = r.TLatex()
     l.SetTextSize(size)
@@ -43,6 +72,54 @@ def draw_text(x, y, color, text, size=0.04, angle=0.0) :
     l.SetTextAngle(angle)
     l.DrawLatex(x,y,text)
 
+# -----------------------------
+#  per-point labels
+# -----------------------------
+def ndc_to_data(conf, xndc, yndc) :
+    '''
+    Convert NDC coordinates of the current pad into the frame
+    (axes) coordinates, assuming the frame spans conf.xlow-xhigh
+    and conf.ylow-yhigh between the pad margins
+    '''
+    lm, rm = r.gPad.GetLeftMargin(), r.gPad.GetRightMargin()
+    bm, tm = r.gPad.GetBottomMargin(), r.gPad.GetTopMargin()
+    x = conf.xlow + (xndc - lm) / (1.0 - lm - rm) * (conf.xhigh - conf.xlow)
+    y = conf.ylow + (yndc - bm) / (1.0 - bm - tm) * (conf.yhigh - conf.ylow)
+    return x, y
+
+def draw_point_labels(conf, tex, x, y, values, fmt="%.2f") :
+    '''
+    Draw fmt%values[i] at (x[i], y[i]) with the TLatex tex, only
+    for the points selected by label_tools.select_labels with the
+    conf.label_mode, label_spacing and label_exclusion_boxes settings,
+    so that the number of labels grows with the visible area rather
+    than with the number of points. Returns the number of labels drawn.
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    if values.shape[0] == 0 : return 0
+
+    # size of a label in frame coordinates (text size is a fraction
+    # of the pad height, a character is about 0.55 of it wide)
+    lm, rm = r.gPad.GetLeftMargin(), r.gPad.GetRightMargin()
+    bm, tm = r.gPad.GetBottomMargin(), r.gPad.GetTopMargin()
+    aspect = float(r.gPad.GetWh()) / float(r.gPad.GetWw())
+    n_chars = max(len(fmt%values.min()), len(fmt%values.max()))
+    width = 0.55 * tex.GetTextSize() * n_chars * aspect / (1.0 - lm - rm) * (conf.xhigh - conf.xlow)
+    height = tex.GetTextSize() / (1.0 - bm - tm) * (conf.yhigh - conf.ylow)
+
+    boxes = []
+    for x1, y1, x2, y2 in conf.label_exclusion_boxes :
+        xl, yl = ndc_to_data(conf, x1, y1)
+        xh, yh = ndc_to_data(conf, x2, y2)
+        boxes.append((xl, xh, yl, yh))
+
+    shown = select_labels(x, y, (conf.xlow, conf.xhigh, conf.ylow, conf.yhigh), mode=conf.label_mode,
+                            label_size=(width, height), spacing=conf.label_spacing, exclusion_boxes=boxes)
+    for i in shown.tolist() :
+        tex.DrawLatex(float(x[i]), float(y[i]), fmt%values[i])
+    print "draw_point_labels    drawing %d of %d labels (mode: %s)"%(shown.shape[0], values.shape[0], conf.label_mode)
+    return shown.shape[0]
+
 # -----------------------------
 #  top left label
 # -----------------------------
@@ -175,47 +252,110 @@ def legend_band_entry(legend, name, fill_color, fill_style, line_color, line_sty
 ''' ---------------------- '''
 '''     TGraph Methods     '''
 ''' ---------------------- '''
+
+# contour type --> significance quantity in the SignalGrid
+CONTOUR_QUANTITIES = {  "obs"   : "observedSig",
+                        "obsUp" : "observedSigUp1s",
+                        "obsDn" : "observedSigDn1s",
+                        "exp"   : "expectedSig",
+                        "expUp" : "expectedSigUp1s",
+                        "expDn" : "expectedSigDn1s" }
+
+def get_contour_significance(conf, reg_="", type="exp", pwc=False) :
+    '''
+    Return the (n_points,) array of significances that the 'type'
+    contour is drawn from, with missing and negative values set to 0
+    '''
+    grid = conf.signal_grid
+    quantity = CONTOUR_QUANTITIES[type]
+
+    if pwc :
+        if (grid.bestRegion < 0).all() :
+            print "make_contour    ERROR no best region per point, call find_best_SR_per_point first"
+            sys.exit()
+        signif = np.array(getattr(grid, best_quantity(quantity)))
+        missing = grid.missing[best_quantity(quantity)]
+        if missing.any() :
+            print "make_contour    Did not find best-region value for type %s for %d points (set to 0)"%(type, int(missing.sum()))
+    else :
+        if reg_ == "" :
+            print "make_contour    ERROR you must provide a region"
+            sys.exit()
+        signif = np.array(grid.values(quantity, reg_))
+        missing = grid.missing_values(quantity, reg_)
+        if missing.any() :
+            print "make_contour    Did not find value for type %s and region %s for %d points (set to 0)"%(type, reg_, int(missing.sum()))
+    signif[signif < 0] = 0
+    return signif
+
+@instrumented()
+def find_best_SR_per_point(conf, quantity="expectedSig") :
+    '''
+    Select for every grid point the region with the largest
+    'quantity' and fill the best* (PWC) quantities of the grid
+    with its values (see SignalGrid.find_best_regions)
+    '''
+    grid = conf.signal_grid
+    n_found = grid.find_best_regions(quantity)
+    print "find_best_SR_per_point    best region by %s found for %d of %d points"%(quantity, n_found, grid.n_points())
+    counts = grid.best_region_counts()
+    for name in grid.region_names :
+        print "find_best_SR_per_point     > %-20s best at %d points"%(name, counts[name])
+
 def make_contour(conf, reg_="", type="exp", pwc=False) :
     '''
-    Make a 95% CL contour (TGraph) from the input signals
+    Make a 95% CL contour (TGraph) from the input signals, using
+    the engine set in conf.contour_engine ("root" or "numpy")
+    '''
+    if conf.contour_engine == "numpy" :
+        xy = contour_points(conf, reg_=reg_, type=type, pwc=pwc)
+        if xy is None : return None
+        return arrays_to_graph(*xy)
+    return make_root_contour(conf, reg_=reg_, type=type, pwc=pwc)
+
+def get_grid_triangulation(conf) :
+    '''
+    Return the GridTriangulation of the signal grid for the contour
+    histogram binning, built on first use and then shared by all of
+    the contours drawn from the same grid
     '''
-    signals = conf.signals
+    grid = conf.signal_grid
+    binning = (conf.contour_nbins, conf.xlow, conf.xhigh, conf.contour_nbins, conf.ylow, conf.yhigh)
+    tri = conf.contour_triangulation
+    if tri is None or tri.binning != binning or tri.n_points != grid.n_points() \
+            or not (np.array_equal(tri.x, grid.mX[tri.unique_points]) and np.array_equal(tri.y, grid.mY[tri.unique_points])) :
+        print "get_grid_triangulation    triangulating %d grid points"%grid.n_points()
+        tri = GridTriangulation(grid.mX, grid.mY, *binning)
+        conf.contour_triangulation = tri
+    return tri
+
+def make_numpy_contours(conf, reg_="", types=["exp"], pwc=False) :
+    '''
+    Find every 95% CL contour line of each of the requested contour
+    types with the ROOT-free engine, interpolating all of them over
+    one shared triangulation (see contour_engine.GridTriangulation).
+    Returns { type : list of (x, y) arrays, longest first }.
+    '''
+    fields = [get_contour_significance(conf, reg_=reg_, type=t, pwc=pwc) for t in types]
+    pvalue = 0.05
+    level = contour_level(pvalue)
+    lines = get_grid_triangulation(conf).find_contours(fields, level, smoothing=conf.contour_smoothing)
+    return dict(zip(types, lines))
 
-    g = r.TGraph2D(1)
-    g.Clear()
+def make_root_contour(conf, reg_="", type="exp", pwc=False) :
+    '''
+    Make a 95% CL contour (TGraph) from the input signals with
+    TGraph2D and TH2::Draw("CONT LIST")
+    '''
+    grid = conf.signal_grid
+    signif = get_contour_significance(conf, reg_=reg_, type=type, pwc=pwc)
+
+    g = r.TGraph2D(grid.n_points(), np.ascontiguousarray(grid.mX), np.ascontiguousarray(grid.mY), signif)
     g.SetTitle("g_"+type)
-    for s in signals :
-        signif, x, y = 0.0, float(s.mX), float(s.mY)
-        if pwc :
-            if   type == "obs"   : signif = s.bestObservedSig
-            elif type == "obsUp" : signif = s.bestObservedSigUp1s
-            elif type == "obsDn" : signif = s.bestObservedSigDn1s
-            elif type == "exp"   : signif = s.bestExpectedSig
-            elif type == "expUp" : signif = s.bestExpectedSigUp1s
-            elif type == "expDn" : signif = s.bestExpectedSigDn1s
-        else :
-            if reg_ == "" :
-                print "make_contour    ERROR you must provide a region"
-                sys.exit()
-            try :
-                if   type == "obs"   : signif = s.observedSig[reg_]
-                elif type == "obsUp" : signif = s.observedSigUp1s[reg_]
-                elif type == "obsDn" : signif = s.observedSigDn1s[reg_]
-                elif type == "exp"   : signif = s.expectedSig[reg_]
-                elif type == "expUp" : signif = s.expectedSigUp1s[reg_]
-                elif type == "expDn" : signif = s.expectedSigDn1s[reg_]
-            except :
-                print "Did not find value for type %s and region %s (%.2f,%.2f)"%(type, reg_, float(s.mX), float(s.mY))
-                pass
-
-        #print signif
-        print "%s - (%.1f,%.1f) : %.1f"%(type, x, y, float(signif))
-        if signif < 0 : signif = 0
-        g.SetPoint(g.GetN(), x, y, float(signif))
 
     hist = None
    #hist = r.TH2F("tmp_"+type, "tmp_"+type, 50, conf.xlow, conf.xhigh, 50, conf.ylow, conf.yhigh)
-    hist = r.TH2F("tmp_"+type, "tmp_"+type, 500, conf.xlow, conf.xhigh, 500, conf.ylow, conf.yhigh)
+    hist = r.TH2F("tmp_"+type, "tmp_"+type, conf.contour_nbins, conf.xlow, conf.xhigh, conf.contour_nbins, conf.ylow, conf.yhigh)
     g.SetHistogram(hist)
     pvalue = 0.05
     level = r.TMath.NormQuantile(1.0-pvalue)
@@ -228,7 +368,7 @@ def make_contour(conf, reg_="", type="exp", pwc=False) :
     h.SetContourLevel(0, level)
     c = r.TCanvas('tmp_can_'+type, '')
     c.cd()
-    h.Smooth()
+    if conf.contour_smoothing : h.Smooth()
     h.Draw('CONT LIST')
     c.Update()
     contours = r.gROOT.GetListOfSpecials().FindObject('contours')
@@ -238,7 +378,246 @@ def make_contour(conf, reg_="", type="exp", pwc=False) :
         h.Delete()
         return g
 
+def graph_views(g) :
+    '''
+    Return float64 array views (no copy) of the x and y points of
+    a TGraph, only valid as long as the TGraph is not modified
+    '''
+    n = int(g.GetN())
+    if n == 0 : return np.zeros(0), np.zeros(0)
+    x, y = g.GetX(), g.GetY()
+    if hasattr(x, "SetSize") :
+        # PyROOT buffers do not know their length
+        x.SetSize(n)
+        y.SetSize(n)
+    return np.frombuffer(x, dtype=np.float64, count=n), np.frombuffer(y, dtype=np.float64, count=n)
+
+def graph_to_arrays(g) :
+    '''
+    Return copies of the x and y points of a TGraph as
+    float64 arrays
+    '''
+    x, y = graph_views(g)
+    return x.copy(), y.copy()
 
+def arrays_to_graph(x, y) :
+    '''
+    Build a TGraph from arrays of x and y points
+    '''
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    y = np.ascontiguousarray(y, dtype=np.float64)
+    return r.TGraph(len(x), x, y)
+
+def contour_points(conf, reg_="", type="exp", pwc=False) :
+    '''
+    Compute the 95% CL contour (see make_contour) and return its
+    points as (x, y) arrays, or None if there is no contour.
+    For the "numpy" engine this is the longest of the contour lines.
+    '''
+    if conf.contour_engine == "numpy" :
+        lines = make_numpy_contours(conf, reg_=reg_, types=[type], pwc=pwc)[type]
+        if not lines : return None
+        return lines[0]
+    g = make_root_contour(conf, reg_=reg_, type=type, pwc=pwc)
+    if not g : return None
+    return graph_to_arrays(g)
+
+# configuration seen by the contour worker processes (inherited when forking)
+contour_worker_conf = None
+
+def contour_worker(args) :
+    reg_, type, pwc = args
+    return contour_points(contour_worker_conf, reg_=reg_, type=type, pwc=pwc)
+
+def compute_contour_points(conf, reg_="", types=[], pwc=False) :
+    '''
+    Compute the 95% CL contour points of each of the requested
+    contour types. The "numpy" engine computes them all in one
+    batch over a shared triangulation. For the "root" engine, with
+    conf.n_contour_workers > 1 the contours are computed in a pool
+    of worker processes and only their points are sent back.
+    Returns a list of (x, y) arrays (or None), one per type.
+    '''
+    global contour_worker_conf
+    tasks = [(reg_, t, pwc) for t in types]
+    n_workers = min(int(conf.n_contour_workers), len(tasks))
+    if conf.contour_engine == "numpy" :
+        # all of the types in one batch over a single triangulation
+        with stage("make_contour %s (numpy batch)"%",".join(types)) :
+            lines = make_numpy_contours(conf, reg_=reg_, types=types, pwc=pwc)
+        points = [lines[t][0] if lines[t] else None for t in types]
+    elif n_workers > 1 :
+        import multiprocessing
+        print "make_contours    computing %d contours with %d workers"%(len(tasks), n_workers)
+        contour_worker_conf = conf
+        with stage("make_contour %s (%d workers)"%(",".join(types), n_workers)) :
+            pool = multiprocessing.Pool(n_workers)
+            try :
+                points = pool.map(contour_worker, tasks)
+            finally :
+                pool.close()
+                pool.join()
+                contour_worker_conf = None
+    else :
+        points = []
+        for reg, t, p in tasks :
+            with stage("make_contour %s"%t) :
+                points.append(contour_points(conf, reg_=reg, type=t, pwc=p))
+    return points
+
+def get_contour_cache(conf, reg_="", pwc=False) :
+    '''
+    Return the ContourCache holding the contours of region reg_
+    (one file per region in conf.contour_cache_dir)
+    '''
+    name = "PWC" if pwc else reg_
+    filename = os.path.join(conf.contour_cache_dir, "%s_%s_%s_contours.npz"%(name, conf.channel, conf.grid))
+    if filename not in conf.contour_caches :
+        conf.contour_caches[filename] = ContourCache(filename)
+    return conf.contour_caches[filename]
+
+def get_contour_key(conf, reg_="", type="exp", pwc=False) :
+    '''
+    Key of a contour in the ContourCache (see contour_cache.contour_key)
+    '''
+    grid = conf.signal_grid
+    signif = get_contour_significance(conf, reg_=reg_, type=type, pwc=pwc)
+    binning = (conf.contour_nbins, conf.xlow, conf.xhigh, conf.contour_nbins, conf.ylow, conf.yhigh)
+    return contour_key(grid.mX, grid.mY, signif, binning, conf.contour_smoothing, contour_level(0.05), conf.contour_engine)
+
+def extract_reference_graphs(filename, names) :
+    '''
+    Read the graphs called names from the ROOT file filename and
+    return { name : (x, y) or None (not found or not a TGraph) },
+    or None if the file could not be opened
+    '''
+    graphs = {}
+    rfile = r.TFile.Open(filename)
+    if not rfile or rfile.IsZombie() :
+        print "extract_reference_graphs    WARNING unable to open %s"%filename
+        return None
+    for name in names :
+        g = rfile.Get(name)
+        if not g or not g.InheritsFrom("TGraph") :
+            print "extract_reference_graphs    WARNING graph %s not found in %s"%(name, filename)
+            graphs[name] = None
+            continue
+        graphs[name] = graph_to_arrays(g)
+    rfile.Close()
+    return graphs
+
+@instrumented()
+def get_reference_contours(conf, filename, names) :
+    '''
+    Return { name : TGraph or None } of the previously published
+    contours called names in the ROOT file filename. The points are
+    kept in memory for the following plots and, with
+    conf.use_reference_cache, in a local cache (conf.reference_cache_dir)
+    so that the source file is only opened again once it changes.
+    A missing source file, or one that cannot be opened, gives a
+    warning and None graphs (unless there is a cached copy of it);
+    nothing is cached in that case so that it is tried again next time.
+    '''
+    names = sorted(set(names))
+    if filename == "" : return dict((name, None) for name in names)
+    signature = get_source_signature(filename)
+    key = (filename, tuple(names), None if signature is None else tuple(signature))
+
+    points = conf.reference_contours.get(key)
+    cache = ReferenceContourCache(conf.reference_cache_dir)
+    if points is None and conf.use_reference_cache :
+        points = cache.load(filename, names, signature)
+        if points is not None and signature is None :
+            print "get_reference_contours    WARNING %s not found, using the cached copy %s"%(filename, cache.cache_name(filename))
+    if points is None :
+        if signature is None :
+            print "get_reference_contours    WARNING reference file %s not found, it will not be drawn"%filename
+            return dict((name, None) for name in names)
+        print "get_reference_contours    extracting %s from %s"%(", ".join(names), filename)
+        points = extract_reference_graphs(filename, names)
+        if points is None :
+            points = cache.load(filename, names, None) if conf.use_reference_cache else None
+            if points is None :
+                print "get_reference_contours    WARNING unable to read %s, it will not be drawn"%filename
+                return dict((name, None) for name in names)
+            print "get_reference_contours    WARNING unable to read %s, using the cached copy %s"%(filename, cache.cache_name(filename))
+        else :
+            if conf.use_reference_cache : cache.save(filename, signature, points)
+            conf.reference_contours[key] = points
+    else :
+        conf.reference_contours[key] = points
+
+    graphs = {}
+    for name in names :
+        graphs[name] = arrays_to_graph(*points[name]) if points[name] is not None else None
+    return graphs
+
+@instrumented()
+def make_contours(conf, reg_="", types=[], pwc=False) :
+    '''
+    Make the 95% CL contours (TGraph) for each of the requested
+    contour types (see compute_contour_points). In all cases the
+    TGraphs are built from the contour points so that the results
+    are identical. With conf.use_contour_cache the contour points
+    are stored on disk and reused as long as the significances,
+    grid points, binning, smoothing, CL level and engine are the same.
+    Returns { type : TGraph (or None) }.
+    '''
+    found = {}
+    if conf.use_contour_cache :
+        cache = get_contour_cache(conf, reg_, pwc)
+        keys = dict((t, get_contour_key(conf, reg_=reg_, type=t, pwc=pwc)) for t in types)
+        for t in types :
+            hit, xy = cache.get(keys[t])
+            if hit : found[t] = xy
+        print "make_contours    %d of %d contours found in %s"%(len(found), len(types), cache.filename)
+
+    todo = [t for t in types if t not in found]
+    if todo :
+        found.update(zip(todo, compute_contour_points(conf, reg_=reg_, types=todo, pwc=pwc)))
+        if conf.use_contour_cache :
+            for t in todo :
+                cache.put(keys[t], found[t])
+            cache.save()
+    points = [found[t] for t in types]
+
+    graphs = {}
+    for t, xy in zip(types, points) :
+        graphs[t] = arrays_to_graph(*xy) if xy is not None else None
+    return graphs
+
+
+def resample_by_arc_length(x, y, n) :
+    '''
+    Resample the line (x, y) to n points equally spaced in arc length
+    (from its first to its last point)
+    '''
+    steps = np.hypot(np.diff(x), np.diff(y))
+    s = np.concatenate([[0.0], np.cumsum(steps)])
+    if s[-1] <= 0 :
+        return np.full(n, x[0]), np.full(n, y[0])
+    t = np.linspace(0.0, s[-1], n)
+    return np.interp(t, s, x), np.interp(t, s, y)
+
+def band_polygon(x_up, y_up, x_down, y_down) :
+    '''
+    Closed polygon between the up and down lines: both lines are
+    resampled to the same number of points (equally spaced in arc
+    length), the down line is oriented as the up one, and the polygon
+    is the up line followed by the reversed down line.
+    Returns the (x, y) float64 arrays of the polygon.
+    '''
+    n = max(len(x_up), len(x_down), 2)
+    xu, yu = resample_by_arc_length(x_up, y_up, n)
+    xd, yd = resample_by_arc_length(x_down, y_down, n)
+    # trace the down line in the same direction as the up line
+    same = np.hypot(xu[0] - xd[0], yu[0] - yd[0]) + np.hypot(xu[-1] - xd[-1], yu[-1] - yd[-1])
+    flipped = np.hypot(xu[0] - xd[-1], yu[0] - yd[-1]) + np.hypot(xu[-1] - xd[0], yu[-1] - yd[0])
+    if flipped < same :
+        xd, yd = xd[::-1], yd[::-1]
+    return np.concatenate([xu, xd[::-1]]), np.concatenate([yu, yd[::-1]])
+
+@instrumented()
 def make_exclusion_band(conf, nom, up, down) :
     '''
     Draw the exclusion band
@@ -246,106 +625,19 @@ def make_exclusion_band(conf, nom, up, down) :
         - nom:   TGraph contour for the nominal expected significance
         - up :   TGraph contour for the +1sigma uncertainty expected significance
         - down:  TGraph contour for the -1sigma uncertainty expected significance
+    The band is the polygon between the up and down contours (see
+    band_polygon), built from array views of the TGraph points.
     '''
-    nbins   = int(max(nom.GetN(), up.GetN(), down.GetN()))
-    n_nom   = int(nom.GetN())
-    n_up    = int(up.GetN())
-    n_down  = int(down.GetN())
-
-    # containers for the x-y values for the 
-    # three contours that will be fed into
-    # the final contours as an array of ROOT doubles
-    x_nom, y_nom    = [], []
-    x_up, y_up      = [], []
-    x_down, y_down  = [], []
-
-    nbins += 1
-
-    # fill nominal points
-    for i in range(0, n_nom) :
-        X, Y = r.Double(0), r.Double(0)
-        nom.GetPoint(i, X, Y)
-        x_nom.append(X)
-        y_nom.append(Y)
-    # check that nominal array has the required number of points
-    if n_nom < nbins :
-        for i in range(n_nom, nbins) :
-            x_nom.append(x_nom[n_nom-1])
-            y_nom.append(y_nom[n_nom-1])
-    
-    # fill the up-variation points
-    for i in range(0, n_up) :
-        X, Y = r.Double(0), r.Double(0)
-        up.GetPoint(i, X, Y)
-        x_up.append(X)
-        y_up.append(Y)
-    #x_up.append(470)
-    #y_up.append(310)
-        
-    # check that the up array has the required number of points
-    if n_up < nbins :
-        for i in range(n_up, nbins) :
-            x_up.append(x_up[n_up-1])
-            y_up.append(y_up[n_up-1])
-    
-    # fill the down-variation points
-    for i in range(0, n_down) :
-        X, Y = r.Double(0), r.Double(0)
-        down.GetPoint(i, X, Y)
-        x_down.append(X)
-        y_down.append(Y)
-
-    #x_down.append(467)
-    #y_down.append(310)
-
-    # check that the down array has the required number of points
-    if n_down < nbins :
-        for i in range(n_down, nbins) :
-            x_down.append(x_down[n_down-1])
-            y_down.append(y_down[n_down-1])
-    
-    # concatenate the up and down arrays to make a complete
-    # array for a single TGraph for the outer bounds of the band
-    x, y = [], []
-    x += x_up
-    x += x_down
-    y += y_up
-    y += y_down
-
-    # make the values into an array of doubles so that the
-    # TGraph receives the Double_t* 
-    x_nom_arr  = array.array('d', x_nom)
-    y_nom_arr  = array.array('d', y_nom)
-    x_up_arr   = array.array('d', x_up)
-    y_up_arr   = array.array('d', y_up)
-    x_down_arr = array.array('d', x_down)
-    y_down_arr = array.array('d', y_down)
-    x_arr      = array.array('d', x)
-    y_arr      = array.array('d', y)
-    
-    gr = r.TGraph(nbins, x_nom_arr, y_nom_arr)
-    gr_down = r.TGraph(nbins, x_down_arr, y_down_arr)
-    gr_up = r.TGraph(nbins, x_up_arr, y_down_arr)
+    x_nom, y_nom    = graph_views(nom)
+    x_up, y_up      = graph_views(up)
+    x_down, y_down  = graph_views(down)
+    if len(x_nom) == 0 or len(x_up) == 0 or len(x_down) == 0 :
+        print "make_exclusion_band    ERROR empty contour (nominal: %d, up: %d, down: %d points)"%(len(x_nom), len(x_up), len(x_down))
+        return
 
+    gr = arrays_to_graph(x_nom, y_nom)
+    gr_shade = arrays_to_graph(*band_polygon(x_up, y_up, x_down, y_down))
 
-    #gr_shade = r.TGraph(nbins, x_down_arr, y_down_arr)
-
-    print "BY HAND SETTING BAND GRAPH TO CONNECT UPPER AND LOWER GRAPHS"
-    x_up_tmp = [x_down_arr[-1]]
-    y_up_tmp = [y_down_arr[-1]]
-
-    x_up_tmp += x_up_arr
-    y_up_tmp += y_up_arr
-    x_up_arr = x_up_tmp
-    y_up_arr = y_up_tmp
-    gr_shade = r.TGraph(nbins)
-    
-    for i in range(0, nbins) :
-        # set the points for the "upper semi-circle" of the band
-        gr_shade.SetPoint(i, x_up_arr[i], y_up_arr[i])
-        # set the points for the "lower semi-circle" of the band
-        gr_shade.SetPoint(nbins+i, x_down_arr[nbins-i-1], y_down_arr[nbins-i-1])
-    
     c = conf.limit_canvas
     c.cd() 
     # now draw
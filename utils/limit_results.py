@@ -0,0 +1,165 @@
+#
+# reading of the limit_results text files, with a binary
+# sidecar cache of the parsed results
+#
+
+import os
+import sys
+import hashlib
+sys.path.append(os.environ['LIMPLOTDIR'])
+
+import numpy as np
+
+#limitplotter
+from limitplotter.utils.file_tools import atomic_write
+
+# column layout of the limit results files (see prepare_limit_results.humanize_list_files)
+LIMIT_RESULTS_FIELDS = ["mX", "mY", "CLs", "CLsexp", "clsu1s", "clsd1s", "ObsSig", "ExpSig", "ExpSigUp1s", "ExpSigDn1s"]
+
+# bump whenever the layout of the cache files changes
+CACHE_VERSION = 2
+
+def get_cache_name(filename) :
+    '''
+    Name of the binary cache sidecar of a limit results file
+    '''
+    return filename + ".cache.npz"
+
+def get_column_order(header, fields, filename="") :
+    '''
+    Return the index in the header (the list of column names of a
+    file) of each of the fields. Raises a ValueError if the header
+    has duplicate names or lacks any of the fields.
+    '''
+    duplicates = sorted(set(h for h in header if header.count(h) > 1))
+    if duplicates :
+        raise ValueError("get_column_order    duplicate columns %s in the header of %s (header: %s)"%(", ".join(duplicates), filename, " ".join(header)))
+    missing = [f for f in fields if f not in header]
+    if missing :
+        raise ValueError("get_column_order    columns %s not found in the header of %s (header: %s)"%(", ".join(missing), filename, " ".join(header)))
+    return [header.index(f) for f in fields]
+
+def find_bad_line(body, n_columns, filename="") :
+    '''
+    Raise a ValueError pointing to the first line of the body (the
+    file without its header) that does not hold n_columns numbers
+    '''
+    for iline, line in enumerate(body.splitlines()) :
+        cols = line.split()
+        if not cols : continue
+        if len(cols) != n_columns :
+            raise ValueError("find_bad_line    line %d of %s has %d columns, the header has %d"%(iline + 2, filename, len(cols), n_columns))
+        try :
+            [float(c) for c in cols]
+        except ValueError :
+            raise ValueError("find_bad_line    line %d of %s has non-numeric values (%s)"%(iline + 2, filename, line.strip()))
+    raise ValueError("find_bad_line    unable to parse %s"%filename)
+
+def count_columns(body) :
+    '''
+    Number of whitespace separated columns on each line of the body
+    (0 for blank lines), counted on the bytes of the whole body at once
+    '''
+    chars = np.frombuffer(body, dtype=np.uint8)
+    if chars.shape[0] == 0 : return np.zeros(0, dtype=np.int64)
+    blank = chars <= 32 # space, tab, newline, carriage return
+    starts = np.flatnonzero(~blank[1:] & blank[:-1]) + 1
+    if not blank[0] : starts = np.concatenate([[0], starts])
+    bounds = np.concatenate([[0], np.flatnonzero(chars == 10) + 1, [chars.shape[0]]])
+    return np.diff(np.searchsorted(starts, bounds))
+
+def parse_limit_results(text, fields=LIMIT_RESULTS_FIELDS, filename="") :
+    '''
+    Parse the content of a limit results file into a (lines x fields)
+    float64 array, the columns being picked by name from the header
+    (first line) of the file. The number of columns of every line is
+    checked against the header (see count_columns) and the whole body
+    is converted in a single np.fromstring call; it is only gone
+    through line by line to report where the problem is if it does
+    not hold a full table.
+
+    The speed is bound by the string to float conversion itself (70%
+    of the time, the column check takes most of the rest): this is
+    only 3-3.5x faster than the line by line loop it replaced on 100k
+    lines (0.22 s against 0.65 s) and about 2x on 10k lines (see the
+    parse_limit_results stages of benchmarks/run_benchmarks.py), well
+    short of the 10x aimed for.
+    '''
+    newline = text.find("\n")
+    if newline < 0 : newline = len(text)
+    header = text[:newline].split()
+    order = get_column_order(header, fields, filename)
+    n_columns = len(header)
+
+    body = text[newline + 1:]
+    columns = count_columns(body)
+    columns = columns[columns > 0] # blank lines are fine
+    if (columns != n_columns).any() :
+        find_bad_line(body, n_columns, filename)
+    values = np.fromstring(body, dtype=np.float64, sep=" ")
+    if values.shape[0] != columns.shape[0] * n_columns :
+        # non-numeric values
+        find_bad_line(body, n_columns, filename)
+    values = values.reshape(-1, n_columns)
+    if order == range(n_columns) : return values
+    return values[:, order]
+
+def read_cache(cache_name) :
+    '''
+    Return the content of a cache file as a dict, or None if
+    it does not exist or cannot be read
+    '''
+    if not os.path.isfile(cache_name) : return None
+    try :
+        with np.load(cache_name) as cache :
+            content = dict((key, cache[key]) for key in cache.files)
+    except Exception, e :
+        print "read_cache    WARNING unable to read cache %s (%s)"%(cache_name, e)
+        return None
+    if int(content.get("version", -1)) != CACHE_VERSION : return None
+    return content
+
+def write_cache(cache_name, table, fields, size, mtime, sha1) :
+    '''
+    Write the parsed table (columns fields) and the stat/hash of its source file
+    '''
+    try :
+        with atomic_write(cache_name, "wb") as tmp :
+            np.savez(tmp, version=CACHE_VERSION, table=table, fields=np.array(fields),
+                        size=size, mtime=mtime, sha1=sha1)
+    except (IOError, OSError), e :
+        print "write_cache    WARNING unable to write cache %s (%s)"%(cache_name, e)
+
+def load_limit_results(filename, fields=LIMIT_RESULTS_FIELDS, use_cache=True) :
+    '''
+    Return the (lines x fields) float64 array of a limit results
+    file (see parse_limit_results). With use_cache the parsed array
+    is stored in a sidecar file (see get_cache_name) and loaded from
+    there on later calls. The cache is rebuilt if the size, mtime or
+    sha1 of the source file no longer match the ones it was built
+    from, or if it holds other fields.
+    '''
+    fields = list(fields)
+    if not use_cache :
+        return parse_limit_results(open(filename, "rb").read(), fields, filename)
+
+    stat = os.stat(filename)
+    cache_name = get_cache_name(filename)
+    cache = read_cache(cache_name)
+    if cache is not None and cache["fields"].tolist() != fields : cache = None
+
+    if cache is not None :
+        if int(cache["size"]) == stat.st_size and float(cache["mtime"]) == stat.st_mtime :
+            return cache["table"]
+
+    text = open(filename, "rb").read()
+    sha1 = hashlib.sha1(text).hexdigest()
+
+    if cache is not None and str(cache["sha1"]) == sha1 :
+        # only touched, refresh the stat info
+        table = cache["table"]
+    else :
+        print "load_limit_results    parsing %s"%filename
+        table = parse_limit_results(text, fields, filename)
+    write_cache(cache_name, table, fields, stat.st_size, stat.st_mtime, sha1)
+    return table
@@ -5,7 +5,12 @@
 # July 2016
 #
 
-import ROOT
+import os
+import sys
+sys.path.append(os.environ['LIMPLOTDIR'])
+
+#limitplotter
+from limitplotter.utils.signal_grid import REGION_QUANTITIES, UPPERLIMIT_QUANTITIES, BEST_QUANTITIES
 
 
 class Region() :
@@ -17,74 +22,85 @@ class Region() :
         self.nominal_limit_results_file = ""
         self.up_limit_results_file = ""
         self.dn_limit_results_file = ""
+        self.upperlimit_results_file = ""
 
     def Print(self) :
         print "Region:  %s"%self.name
 
-class Signal() :
-    def __init__(self, mX_, mY_) :
-        self.mX = mX_
-        self.mY = mY_
-
-
-        ####################################
-        ## CLs
-        ####################################
-        self.observedCLs                = {}    ### < { region : CLs }
-        self.expectedCLs                = {}    ### < { region : CLs }
-        self.expectedCLsUp1s            = {}    ### < { region : CLs }
-        self.expectedCLsDn1s            = {}    ### < { region : CLs }
-
-        ###################################
-        ## Significance
-        ###################################
-        self.observedSig                = {}    ### < { region : sig }
-        self.expectedSig                = {}    ### < { region : sig }
-        self.expectedSigUp1s            = {}    ### < { region : sig }
-        self.expectedSigDn1s            = {}    ### < { region : sig }
-
-        ###################################
-        ## observed CLs (up/down) with
-        ## signal xsec uncertainy variations
-        ###################################
-        self.observedCLsUp1s            = {}    ### < { region : CLs }
-        self.observedCLsDn1s            = {}    ### < { region : CLs }
-
-        ###################################
-        ## observed significance (up/down) with
-        ## signal xsec uncertainy variations
-        ###################################
-        self.observedSigUp1s            = {}    ### < { region : sig }
-        self.observedSigDn1s            = {}    ### < { region : sig }
-
-
-        #####################################
-        ## if doing PWC store the besties
-        #####################################
-        self.bestRegion = ""                    ### < region with largest significance
-
-        # CLs
-        self.bestObservedCLs        = 0.0       ### < observed CLs for point in best region
-        self.bestExpectedCLs        = 0.0       ### < expected CLs for point in best region
-        self.bestExpectedCLsUp1s    = 0.0       ### < expected CLs +1 sigma for point in best region
-        self.bestExpectedCLsDn1s    = 0.0       ### < expected CLs -1 sigma for point in best region
-
-        # significance
-        self.bestObservedSig        = 0.0       ### < observed significnace for point in best region
-        self.bestExpectedSig        = 0.0       ### < expected significance for point in best region
-        self.bestExpectedSigUp1s    = 0.0       ### < expected significance +1 sigma for point in best region
-        self.bestExpectedSigDn1s    = 0.0       ### < expected significance -1 sigma for point in best region
-
-        # observed CLs with signal xsec variation
-        self.bestObservedCLsUp1s    = 0.0       ### < observed CLs sigma_theory +1
-        self.bestObservedCLsDn1s    = 0.0       ### < observed CLs sigma_theory -1
-
-        # observed significnace with signal xsec variation
-        self.bestObservedSigUp1s    = 0.0       ### < observed significnace sigma_theory +1
-        self.bestObservedSigDn1s    = 0.0       ### < observed significance sigma_theory -1
-    
+class RegionValues() :
+    '''
+    Dict-like { region : value } accessor of one quantity
+    of one point in the SignalGrid
+    '''
+    def __init__(self, grid_, quantity_, index_) :
+        self.grid = grid_
+        self.quantity = quantity_
+        self.index = index_
+
+    def __getitem__(self, region_name) :
+        if region_name not in self :
+            raise KeyError(region_name)
+        return float(self.grid.values(self.quantity, region_name)[self.index])
+
+    def __setitem__(self, region_name, value) :
+        self.grid.fill(self.quantity, region_name, self.index, value)
+
+    def __contains__(self, region_name) :
+        return region_name in self.grid.region_columns and \
+            not self.grid.missing_values(self.quantity, region_name)[self.index]
+
+    def keys(self) :
+        return [name for name in self.grid.region_names if name in self]
+
+    def items(self) :
+        return [(name, self[name]) for name in self.keys()]
+
+    def __iter__(self) :
+        return iter(self.keys())
+
+    def __len__(self) :
+        return len(self.keys())
+
+def region_values_property(quantity) :
+    return property(lambda self : RegionValues(self.grid, quantity, self.index))
+
+def best_value_property(quantity) :
+    def get_value(self) :
+        return float(getattr(self.grid, quantity)[self.index])
+    def set_value(self, value) :
+        self.grid.fill_best(quantity, self.index, value)
+    return property(get_value, set_value)
+
+class Signal(object) :
+    '''
+    View of a single point of the SignalGrid. The per-region
+    quantities (observedCLs, expectedSig, ...) behave as
+    { region : value } dicts and the best* quantities as scalars,
+    all reading from (and writing to) the grid arrays.
+    '''
+    def __init__(self, grid_, index_) :
+        self.grid = grid_
+        self.index = index_
+
+    @property
+    def mX(self) :
+        return float(self.grid.mX[self.index])
+
+    @property
+    def mY(self) :
+        return float(self.grid.mY[self.index])
+
+    @property
+    def bestRegion(self) :
+        ''' region with largest significance ("" if not set) '''
+        col = self.grid.bestRegion[self.index]
+        if col < 0 : return ""
+        return self.grid.region_names[col]
+
     def Print(self) :
         print "Signal: (%.1f,%.1f)"%(float(self.mX), float(self.mY))
 
-
-        
+for quantity in REGION_QUANTITIES + UPPERLIMIT_QUANTITIES :
+    setattr(Signal, quantity, region_values_property(quantity))
+for quantity in BEST_QUANTITIES :
+    setattr(Signal, quantity, best_value_property(quantity))
@@ -0,0 +1,72 @@
+#
+# tools for reading the HistFitter fit logs
+#
+
+import os
+import re
+
+# columns of the upper limit results files (see prepare_limit_results.gather_upperlimit_results)
+UPPERLIMIT_FIELDS = ["mX", "mY", "obsUL", "obsULErr", "expUL", "expULUp1s", "expULDn1s"]
+
+# lines printed by HypoTestTool::AnalyzeResult (HistFitter/src/HypoTestTool.cxx)
+#   The computed upper limit is: 2.31 +/- 0.08
+#   expected limit (median) 1.92
+#   expected limit (-1 sig) 1.37
+#   expected limit (+1 sig) 2.71
+_NUMBER = r"([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|[-+]?inf|nan)"
+UPPERLIMIT_PATTERNS = [ ("obsUL",       re.compile(r"The computed upper limit is:\s*%s(?:\s*\+/-\s*%s)?"%(_NUMBER, _NUMBER))),
+                        ("expUL",       re.compile(r"expected limit \(median\)\s*%s"%_NUMBER)),
+                        ("expULDn1s",   re.compile(r"expected limit \(-1 sig\)\s*%s"%_NUMBER)),
+                        ("expULUp1s",   re.compile(r"expected limit \(\+1 sig\)\s*%s"%_NUMBER)) ]
+
+def get_log_masses(filename, grid) :
+    '''
+    Return the (mX, mY) of the signal point of a log, taken from
+    the two numbers following the grid name in its filename
+    (e.g. SRwt_sfdf_bWN_300_150_limitOnMu.log --> (300.0, 150.0)),
+    or None if there are none
+    '''
+    match = re.search(r"%s_(\d+(?:\.\d+)?)_(\d+(?:\.\d+)?)"%re.escape(grid), os.path.basename(filename))
+    if not match : return None
+    return float(match.group(1)), float(match.group(2))
+
+def parse_upperlimit_lines(lines) :
+    '''
+    Extract the observed (and its error) and expected (median,
+    +-1 sigma) mu_SIG upper limits from the lines of a log. The
+    last value printed wins if a log holds several. Returns
+    { field : value } of the fields found.
+    '''
+    values = {}
+    for line in lines :
+        # cheap test first, most lines are not limit lines
+        if "limit" not in line : continue
+        for field, pattern in UPPERLIMIT_PATTERNS :
+            match = pattern.search(line)
+            if not match : continue
+            values[field] = float(match.group(1))
+            if field == "obsUL" :
+                values["obsULErr"] = float(match.group(2)) if match.group(2) is not None else 0.0
+            break
+    return values
+
+def scan_upperlimit_log(args) :
+    '''
+    Read a log line by line and return (filename, [size, mtime], values),
+    with values as in parse_upperlimit_lines, or None if the log is
+    missing any of the limits. The [size, mtime] is None if the log
+    could not be read. args = (filename, grid).
+    '''
+    filename, grid = args
+    try :
+        st = os.stat(filename)
+        with open(filename) as log :
+            values = parse_upperlimit_lines(log)
+    except (IOError, OSError), e :
+        print "scan_upperlimit_log    WARNING unable to read %s (%s)"%(filename, e)
+        return filename, None, None
+    masses = get_log_masses(filename, grid)
+    if masses is None or any(f not in values for f in UPPERLIMIT_FIELDS[2:]) :
+        return filename, [st.st_size, st.st_mtime], None
+    values["mX"], values["mY"] = masses
+    return filename, [st.st_size, st.st_mtime], values
@@ -0,0 +1,96 @@
+#
+# parallel merging (hadd) of ROOT files
+#
+
+import os
+import sys
+import multiprocessing
+
+sys.path.append(os.environ['LIMPLOTDIR'])
+
+#limitplotter
+from limitplotter.utils.lazy_root import ROOT
+
+def is_up_to_date(target, inputs) :
+    '''
+    True if the target file exists and is newer than every input
+    '''
+    if not os.path.isfile(target) : return False
+    target_mtime = os.path.getmtime(target)
+    return all(os.path.getmtime(f) < target_mtime for f in inputs)
+
+def merge_files(args) :
+    '''
+    Merge the input files into the output file with TFileMerger
+    (what hadd does). args = (output, inputs). Returns True on success.
+    '''
+    output, inputs = args
+    merger = ROOT.TFileMerger(False)
+    merger.SetPrintLevel(0)
+    if not merger.OutputFile(output, "RECREATE") :
+        print "merge_files    ERROR unable to open output file %s"%output
+        return False
+    for f in inputs :
+        if not merger.AddFile(f, False) :
+            print "merge_files    ERROR unable to add input file %s"%f
+            return False
+    return bool(merger.Merge())
+
+def split_chunks(files, n_chunks) :
+    '''
+    Split the files into n_chunks contiguous groups of (nearly) equal size
+    '''
+    n = len(files)
+    bounds = [(n * i) // n_chunks for i in range(n_chunks + 1)]
+    return [files[bounds[i]:bounds[i + 1]] for i in range(n_chunks) if bounds[i + 1] > bounds[i]]
+
+def tree_merge(inputs, target, n_workers=1, fan_in=16) :
+    '''
+    Merge the input files into target as a tree: at each level the
+    current files are merged in groups of at most fan_in files by
+    a pool of n_workers processes, until at most fan_in files remain
+    and are merged into the target. The intermediate files are
+    written next to the target and removed at the end.
+    Returns True on success.
+    '''
+    inputs = sorted(inputs)
+    if not inputs :
+        print "tree_merge    ERROR no input files for %s"%target
+        return False
+    fan_in = max(2, int(fan_in))
+    n_workers = max(1, int(n_workers))
+    target_dir, target_name = os.path.split(target)
+
+    pool = multiprocessing.Pool(n_workers) if n_workers > 1 else None
+    temporaries = []
+    ok = True
+    try :
+        current = inputs
+        level = 0
+        while len(current) > fan_in :
+            # enough groups to keep every worker busy, none larger than fan_in
+            n_chunks = max((len(current) + fan_in - 1) // fan_in, min(n_workers, len(current) // 2))
+            chunks = split_chunks(current, n_chunks)
+            outputs = [os.path.join(target_dir, ".tmp_merge_%d_%d_%s"%(level, i, target_name)) for i in range(len(chunks))]
+            print "tree_merge    level %d : merging %d files into %d"%(level, len(current), len(outputs))
+            jobs = zip(outputs, chunks)
+            results = pool.map(merge_files, jobs) if pool else [merge_files(job) for job in jobs]
+            temporaries += outputs
+            if not all(results) :
+                ok = False
+                break
+            current = outputs
+            level += 1
+        if ok :
+            print "tree_merge    merging %d files into %s"%(len(current), target)
+            ok = merge_files((target, current))
+    finally :
+        if pool :
+            pool.close()
+            pool.join()
+        for f in temporaries :
+            if os.path.exists(f) : os.remove(f)
+
+    if not ok :
+        print "tree_merge    ERROR merging into %s failed"%target
+    return ok
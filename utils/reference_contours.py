@@ -0,0 +1,92 @@
+#
+# local cache of the previously published (reference) contours
+#
+# The reference results live in ROOT files on shared storage
+# and only a few graphs are needed from each of them, so their
+# points are extracted once and stored in a small .npz file per
+# source file, valid as long as the source keeps its size and mtime.
+#
+
+import os
+import sys
+import hashlib
+sys.path.append(os.environ['LIMPLOTDIR'])
+
+import numpy as np
+
+#limitplotter
+from limitplotter.utils.file_tools import atomic_write
+
+# cache files written with another version are ignored
+CACHE_VERSION = 1
+
+def get_source_signature(filename) :
+    '''
+    [size, mtime] of a reference file, or None if it cannot be found
+    '''
+    try :
+        st = os.stat(filename)
+    except OSError :
+        return None
+    return [st.st_size, st.st_mtime]
+
+class ReferenceContourCache() :
+    '''
+    Graph points of reference ROOT files, one .npz file per source
+    file in cache_dir, named after the source basename and a hash of
+    its absolute path. Each graph is stored as its (x, y) arrays, or
+    as not found in the source.
+    '''
+    def __init__(self, cache_dir) :
+        self.cache_dir = cache_dir
+
+    def cache_name(self, source) :
+        base = os.path.splitext(os.path.basename(source))[0]
+        path_hash = hashlib.sha1(os.path.abspath(source).encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.cache_dir, "%s_%s.npz"%(base, path_hash))
+
+    def load(self, source, names, signature) :
+        '''
+        Return { name : (x, y) or None } for the requested graph names,
+        or None if the cache does not hold all of them or was built
+        from a source with another signature. With signature None (the
+        source is not reachable) any cached copy is used.
+        '''
+        cache_name = self.cache_name(source)
+        if not os.path.isfile(cache_name) : return None
+        try :
+            with np.load(cache_name) as cache :
+                if int(cache["version"]) != CACHE_VERSION : return None
+                if signature is not None and [int(cache["size"]), float(cache["mtime"])] != signature : return None
+                cached = [str(n) for n in cache["names"]]
+                if any(name not in cached for name in names) : return None
+                found = cache["found"]
+                graphs = {}
+                for name in names :
+                    i = cached.index(name)
+                    graphs[name] = (cache["x_%d"%i], cache["y_%d"%i]) if found[i] else None
+        except Exception, e :
+            print "ReferenceContourCache    WARNING unable to read %s (%s)"%(cache_name, e)
+            return None
+        return graphs
+
+    def save(self, source, signature, graphs) :
+        '''
+        Store { name : (x, y) or None } extracted from source
+        '''
+        names = sorted(graphs.keys())
+        arrays = { "version" : CACHE_VERSION,
+                   "source"  : os.path.abspath(source),
+                   "size"    : signature[0],
+                   "mtime"   : signature[1],
+                   "names"   : np.array(names),
+                   "found"   : np.array([graphs[n] is not None for n in names]) }
+        for i, name in enumerate(names) :
+            if graphs[name] is not None :
+                arrays["x_%d"%i], arrays["y_%d"%i] = graphs[name]
+        cache_name = self.cache_name(source)
+        try :
+            with atomic_write(cache_name, "wb") as tmp :
+                np.savez_compressed(tmp, **arrays)
+        except (IOError, OSError), e :
+            print "ReferenceContourCache    WARNING unable to write %s (%s)"%(cache_name, e)
@@ -0,0 +1,143 @@
+#
+# Columnar container for the signal grid limit results
+#
+
+import numpy as np
+
+# per-region quantities, each stored as a (points x regions) float64 array
+REGION_QUANTITIES = [
+    # CLs
+    "observedCLs",          ### < observed CLs
+    "expectedCLs",          ### < expected CLs
+    "expectedCLsUp1s",      ### < expected CLs +1 sigma
+    "expectedCLsDn1s",      ### < expected CLs -1 sigma
+    # significance
+    "observedSig",          ### < observed significance
+    "expectedSig",          ### < expected significance
+    "expectedSigUp1s",      ### < expected significance +1 sigma
+    "expectedSigDn1s",      ### < expected significance -1 sigma
+    # observed CLs/significance with signal xsec variations
+    "observedCLsUp1s",      ### < observed CLs sigma_theory +1
+    "observedCLsDn1s",      ### < observed CLs sigma_theory -1
+    "observedSigUp1s",      ### < observed significance sigma_theory +1
+    "observedSigDn1s",      ### < observed significance sigma_theory -1
+]
+
+# per-region upper limits on mu_SIG (see prepare_limit_results.gather_upperlimit_results),
+# stored as the REGION_QUANTITIES but with no best* counterpart
+UPPERLIMIT_QUANTITIES = [
+    "observedULMu",         ### < observed upper limit on mu_SIG
+    "expectedULMu",         ### < expected upper limit on mu_SIG
+    "expectedULMuUp1s",     ### < expected upper limit on mu_SIG +1 sigma
+    "expectedULMuDn1s",     ### < expected upper limit on mu_SIG -1 sigma
+]
+
+def best_quantity(quantity) :
+    '''
+    Name of the "best region" (PWC) counterpart of a per-region
+    quantity, e.g. expectedSig --> bestExpectedSig
+    '''
+    return "best" + quantity[0].upper() + quantity[1:]
+
+# the per-point "best region" (PWC) quantities, each a (points,) array
+BEST_QUANTITIES = [best_quantity(q) for q in REGION_QUANTITIES]
+
+class SignalGrid() :
+    '''
+    Store of the limit results for every grid point and region.
+
+    Every quantity in REGION_QUANTITIES (and UPPERLIMIT_QUANTITIES)
+    is a float64 array of shape
+    (n_points, n_regions), accessible as an attribute of the same
+    name (e.g. grid.expectedSig[:, grid.region_column("SRwt")]).
+    Entries that were never filled are flagged in the boolean
+    array of the same shape in self.missing[quantity] and hold 0.0.
+
+    The best* quantities (BEST_QUANTITIES) are (n_points,) arrays
+    holding, for each point, the value in the region selected by
+    find_best_regions (stored in self.bestRegion as a region column).
+    '''
+    def __init__(self, mX_, mY_, region_names_) :
+        self.mX = np.asarray(mX_, dtype=np.float64)
+        self.mY = np.asarray(mY_, dtype=np.float64)
+        self.region_names = list(region_names_)
+        self.region_columns = dict((name, i) for i, name in enumerate(self.region_names))
+
+        shape = (self.n_points(), len(self.region_names))
+        self.missing = {}
+        for q in REGION_QUANTITIES + UPPERLIMIT_QUANTITIES :
+            setattr(self, q, np.zeros(shape, dtype=np.float64))
+            self.missing[q] = np.ones(shape, dtype=bool)
+
+        # PWC: column of the region with the largest significance (-1 if not set)
+        self.bestRegion = np.full(shape[0], -1, dtype=np.int64)
+        for q in BEST_QUANTITIES :
+            setattr(self, q, np.zeros(shape[0], dtype=np.float64))
+            self.missing[q] = np.ones(shape[0], dtype=bool)
+
+    def n_points(self) :
+        return self.mX.shape[0]
+
+    def region_column(self, region_name) :
+        return self.region_columns[region_name]
+
+    def fill(self, quantity, region_name, rows, values) :
+        '''
+        Set the values of 'quantity' for region 'region_name' at
+        the grid rows 'rows'
+        '''
+        col = self.region_column(region_name)
+        getattr(self, quantity)[rows, col] = values
+        self.missing[quantity][rows, col] = False
+
+    def fill_best(self, quantity, rows, values) :
+        '''
+        Set the values of the best* 'quantity' at the grid rows 'rows'
+        '''
+        getattr(self, quantity)[rows] = values
+        self.missing[quantity][rows] = False
+
+    def values(self, quantity, region_name) :
+        '''
+        Return the (n_points,) view of 'quantity' for 'region_name'
+        '''
+        return getattr(self, quantity)[:, self.region_column(region_name)]
+
+    def missing_values(self, quantity, region_name) :
+        '''
+        Return the (n_points,) mask of the points with no value of
+        'quantity' for 'region_name'
+        '''
+        return self.missing[quantity][:, self.region_column(region_name)]
+
+    def find_best_regions(self, quantity="expectedSig") :
+        '''
+        For every point select the region with the largest value of
+        'quantity' (missing or NaN values never win, ties go to the
+        first region) and copy the values of every quantity in that
+        region into the best* arrays. Points with no value in any
+        region get bestRegion -1 and missing best* values.
+        Returns the number of points with a best region.
+        '''
+        if not self.region_names : return 0
+        vals = getattr(self, quantity)
+        vals = np.where(self.missing[quantity] | np.isnan(vals), -np.inf, vals)
+        rows = np.arange(self.n_points())
+        best = np.argmax(vals, axis=1)
+        found = np.isfinite(vals[rows, best])
+
+        self.bestRegion[:] = np.where(found, best, -1)
+        for q in REGION_QUANTITIES :
+            bq = best_quantity(q)
+            missing = ~found | self.missing[q][rows, best]
+            getattr(self, bq)[:] = np.where(missing, 0.0, getattr(self, q)[rows, best])
+            self.missing[bq][:] = missing
+        return int(found.sum())
+
+    def best_region_counts(self) :
+        '''
+        Number of points for which each region is the best one,
+        { region : count }
+        '''
+        counts = np.bincount(self.bestRegion[self.bestRegion >= 0], minlength=len(self.region_names))
+        return dict((name, int(counts[i])) for i, name in enumerate(self.region_names))
@@ -5,7 +5,14 @@
 # July 2016
 #
 
-import ROOT as r
+import os
+import sys
+sys.path.append(os.environ['LIMPLOTDIR'])
+
+import numpy as np
+
+#limitplotter
+from limitplotter.utils.lazy_root import ROOT as r
 
 def get_sigma_from_pvalue(pvalue) :
     '''
@@ -25,3 +32,112 @@ def get_sigma_from_pvalue(pvalue) :
     else :
         nsigma = -1
     return nsigma
+
+def norm_quantile(p) :
+    '''
+    Quantile of the standard normal distribution (inverse of its
+    lower-tail cumulative distribution) for an array of probabilities.
+    Array version of TMath::NormQuantile( Double_t p ), using the
+    same algorithm (Wichura, AS241, accurate to about 1e-16).
+    Returns 0 for p outside of (0,1), as TMath::NormQuantile does.
+    '''
+    p = np.asarray(p, dtype=np.float64)
+    q = p - 0.5
+    out = np.zeros(p.shape, dtype=np.float64)
+    valid = (p > 0.0) & (p < 1.0)
+
+    # central region, |q| <= 0.425
+    central = valid & (np.abs(q) <= 0.425)
+    qc = q[central]
+    rc = 0.180625 - qc * qc
+    out[central] = qc * (((((((rc * 2509.0809287301226727 +
+            33430.575583588128105) * rc + 67265.770927008700853) * rc +
+            45921.953931549871457) * rc + 13731.693765509461125) * rc +
+            1971.5909503065514427) * rc + 133.14166789178437745) * rc +
+            3.387132872796366608) / (((((((rc * 5226.495278852545925 +
+            28729.085735721942674) * rc + 39307.89580009271061) * rc +
+            21213.794301586595867) * rc + 5394.1960214247511077) * rc +
+            687.1870074920579083) * rc + 42.313330701600911252) * rc + 1.0)
+
+    # tails
+    tail = valid & ~central
+    pt, qt = p[tail], q[tail]
+    rt = np.sqrt(-np.log(np.where(qt < 0, pt, 1.0 - pt)))
+    vt = np.zeros(rt.shape, dtype=np.float64)
+
+    near = rt <= 5.0
+    rn = rt[near] - 1.6
+    vt[near] = (((((((rn * 7.7454501427834140764e-4 +
+            0.0227238449892691845833) * rn + 0.24178072517745061177) * rn +
+            1.27045825245236838258) * rn + 3.64784832476320460504) * rn +
+            5.7694972214606914055) * rn + 4.6303378461565452959) * rn +
+            1.42343711074968357734) / (((((((rn * 1.05075007164441684324e-9 +
+            5.475938084995344946e-4) * rn + 0.0151986665636164571966) * rn +
+            0.14810397642748007459) * rn + 0.68976733498510000455) * rn +
+            1.6763848301838038494) * rn + 2.05319162663775882187) * rn + 1.0)
+
+    far = ~near
+    rf = rt[far] - 5.0
+    vt[far] = (((((((rf * 2.01033439929228813265e-7 +
+            2.71155556874348757815e-5) * rf + 0.0012426609473880784386) * rf +
+            0.026532189526576123093) * rf + 0.29656057182850489123) * rf +
+            1.7848265399172913358) * rf + 5.4637849111641143699) * rf +
+            6.6579046435011037772) / (((((((rf * 2.04426310338993978564e-15 +
+            1.4215117583164458887e-7) * rf + 1.8463183175100546818e-5) * rf +
+            7.868691311456132591e-4) * rf + 0.0148753612908506148525) * rf +
+            0.13692988092273580531) * rf + 0.59983220655588793769) * rf + 1.0)
+
+    out[tail] = np.where(qt < 0, -vt, vt)
+    return out
+
+def get_sigma_from_pvalues(pvalues) :
+    '''
+    Array version of get_sigma_from_pvalue: convert p-values into
+    standard deviations ('nsigma') with the semantics of
+    HistFitter/src/StatTools::GetSigma( Double_t p ), i.e.
+        p > 1-1e-16      : -7.4
+        p < 1e-16        :  7.4
+        p > 1e-16        :  TMath::ErfInverse( 1 - 2p ) * sqrt(2)
+        p > 0            :  asymptotic approximation
+        otherwise (nan)  : -1
+    ErfInverse(q)*sqrt(2) is evaluated as the normal quantile of
+    (1+q)/2, starting from the same rounded q = 1 - 2p as GetSigma.
+    '''
+    p = np.asarray(pvalues, dtype=np.float64)
+    nsigma = np.full(p.shape, -1.0, dtype=np.float64)
+
+    high = p > (1.0 - 1e-16)
+    low = ~high & (p < 1e-16)
+    nsigma[high] = -7.4
+    nsigma[low] = 7.4
+
+    erf_branch = ~high & ~low & (p > 1e-16)
+    q = 1.0 - 2.0 * p[erf_branch]
+    # use the tail on the side of q to keep the full precision
+    # (+ 0.0 turns the -0.0 of p = 0.5 into 0.0, as GetSigma returns)
+    nsigma[erf_branch] = np.where(q >= 0, -norm_quantile(0.5 * (1.0 - q)), norm_quantile(0.5 * (1.0 + q))) + 0.0
+
+    # use approximation, ok for sigma > 1.5
+    asymptotic = ~high & ~low & ~erf_branch & (p > 0)
+    u = -2.0 * np.log(p[asymptotic] * np.sqrt(2.0 * np.pi))
+    nsigma[asymptotic] = np.sqrt(u - np.log(u))
+
+    return nsigma
+
+
+###############################################################
+if __name__ == "__main__" :
+    # check get_sigma_from_pvalues against HistFitter's StatTools::GetSigma
+    # over a dense p-value sweep (needs libSusyFitter.so in your path)
+    r.gSystem.Load("libSusyFitter.so")
+    pvalues = np.concatenate([ np.logspace(-20, -1, 20000),
+                               np.linspace(0.0, 1.0, 20001),
+                               1.0 - np.logspace(-20, -1, 20000),
+                               [1e-16, 1.0 - 1e-16, -0.5, 1.5] ])
+    vectorized = get_sigma_from_pvalues(pvalues)
+    reference = np.array([r.StatTools.GetSigma(float(p)) for p in pvalues])
+    max_diff = np.abs(vectorized - reference).max()
+    print "stat_tools    max |get_sigma_from_pvalues - StatTools::GetSigma| = %.3e over %d p-values"%(max_diff, pvalues.shape[0])
+    if not max_diff < 1e-12 :
+        print "stat_tools    ERROR disagreement larger than 1e-12"
+        sys.exit(1)
@@ -0,0 +1,68 @@
+#
+# polling of the limit results files for the draw_limits watch mode
+#
+
+import os
+import time
+
+def get_signatures(filenames) :
+    '''
+    { filename : (size, mtime) or None (file not found) }
+    '''
+    signatures = {}
+    for filename in filenames :
+        try :
+            st = os.stat(filename)
+            signatures[filename] = (st.st_size, st.st_mtime)
+        except OSError :
+            signatures[filename] = None
+    return signatures
+
+class ChangeWatcher() :
+    '''
+    Tells which of the watched files changed (size or mtime) since
+    they were last reported. Changes are only reported once none of
+    the files has changed for debounce seconds, so that files still
+    being written (or several files landing one after the other) give
+    a single report. Files that disappear are reported once they are
+    back.
+    '''
+    def __init__(self, filenames, debounce=10.0) :
+        self.filenames = list(filenames)
+        self.debounce = debounce
+        self.reported = get_signatures(self.filenames)
+        self.last_seen = dict(self.reported)
+        self.stable_since = time.time()
+
+    def add(self, filename) :
+        '''
+        Watch one more file, reported (as new) once it is stable
+        '''
+        if filename in self.filenames : return
+        self.filenames.append(filename)
+        self.reported[filename] = None
+        self.last_seen[filename] = None
+
+    def retry(self, filenames) :
+        '''
+        Report the files again on the next poll (e.g. they could not be read)
+        '''
+        for filename in filenames :
+            self.reported[filename] = None
+
+    def poll(self, now=None) :
+        '''
+        Return the files changed since the last report, once they
+        have been stable for debounce seconds (else [])
+        '''
+        if now is None : now = time.time()
+        current = get_signatures(self.filenames)
+        if current != self.last_seen :
+            self.last_seen = current
+            self.stable_since = now
+            return []
+        changed = [f for f in self.filenames if current[f] is not None and current[f] != self.reported[f]]
+        if not changed or now - self.stable_since < self.debounce : return []
+        for f in changed :
+            self.reported[f] = current[f]
+        return changed
@@ -0,0 +1,36 @@
+#
+# signal reference cross-sections
+#
+
+import os
+
+import numpy as np
+
+def load_xsec_table(filename) :
+    '''
+    Read a cross-section table: one "mass xsec [...]" line per
+    mass point (mass in GeV, xsec in pb, any further columns are
+    ignored), '#' starts a comment. Returns the (mass, xsec)
+    float64 arrays sorted by mass.
+    '''
+    if not os.path.isfile(filename) :
+        raise IOError("load_xsec_table    cross-section table %s not found"%filename)
+    table = np.loadtxt(filename, comments="#", ndmin=2)
+    if table.shape[0] < 2 or table.shape[1] < 2 :
+        raise ValueError("load_xsec_table    %s must have at least two mass points and two columns (mass, xsec)"%filename)
+    order = np.argsort(table[:, 0], kind="mergesort")
+    mass, xsec = table[order, 0], table[order, 1]
+    if (np.diff(mass) == 0).any() :
+        raise ValueError("load_xsec_table    %s has duplicate mass points"%filename)
+    if (xsec <= 0).any() :
+        raise ValueError("load_xsec_table    %s has non-positive cross-sections"%filename)
+    return mass, xsec
+
+def interpolate_xsec(mass, xsec, masses) :
+    '''
+    Cross-sections at the given masses, interpolated linearly in
+    log(xsec) between the points of the table (mass, xsec).
+    Masses outside of the table get NaN (no extrapolation).
+    '''
+    masses = np.asarray(masses, dtype=np.float64)
+    return np.exp(np.interp(masses, mass, np.log(xsec), left=np.nan, right=np.nan))